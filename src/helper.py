@@ -4,6 +4,12 @@ from pathlib import Path
 
 import streamlit as st
 
+# cache TTLs, see the cache stats in r99 for tuning
+# activities and the caches derived of them
+CACHE_TTL_ACTIVITIES = "2h"
+CACHE_TTL_GEAR = "60m"
+CACHE_TTL_CITY_SEARCH = "15m"
+
 
 @st.cache_data()
 def get_env() -> str:
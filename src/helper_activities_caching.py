@@ -2,20 +2,33 @@
 
 # ruff: noqa: PLR2004
 
+import datetime as dt
 import math
+import threading
+from dataclasses import dataclass, field
 from pathlib import Path
 
 import pandas as pd
 import streamlit as st
 
-from helper import get_env
+from helper import CACHE_TTL_ACTIVITIES, CACHE_TTL_CITY_SEARCH, get_env
 from helper_api import DIR_CACHE, fetch_all_activities, fetch_gear_data
+from helper_cache_stats import track_cache_usage
 from helper_logging import get_logger_from_filename, track_function_usage
+from helper_metrics import measure_phase
 from helper_pandas import reorder_cols
+from helper_tracing import span
 
 _LOGGER = get_logger_from_filename(__file__)
 
 
+# same as ttl of cache_all_activities_and_gears_in_year_range()
+ACTIVITY_PATCHES_TTL = pd.Timedelta(CACHE_TTL_ACTIVITIES)
+_PATCHES_LOCK = threading.Lock()
+
+# per row geo helpers: time every 100th call only
+HOT_SAMPLE_EVERY = 100
+
 DIR_SERVER = "/var/www/virtual/entorb/data-web-pages/strava"
 DIR_LOCAL = "./data"
 
@@ -81,12 +94,17 @@ def get_known_locations_file_path() -> Path:  # noqa: D103
 
 
 @track_function_usage
-def get_act_desc_cache_file_path() -> Path:  # noqa: D103
-    user_id = st.session_state["USER_ID"]
+def get_act_desc_cache_file_path(user_id: int) -> Path:
+    """Legacy JSON file of descriptions, migrated to get_act_desc_db_path()."""
     return get_data_dir() / "act-desc" / f"{user_id}.json"
 
 
 @track_function_usage
+def get_act_desc_db_path() -> Path:  # noqa: D103
+    return get_data_dir() / "act-desc" / "descriptions.sqlite"
+
+
+@track_function_usage(sample_every=HOT_SAMPLE_EVERY)
 def geo_distance_haversine(
     start: tuple[float, float], end: tuple[float, float]
 ) -> float:
@@ -115,7 +133,7 @@ def geo_distance_haversine(
     return r * c
 
 
-@track_function_usage
+@track_function_usage(sample_every=HOT_SAMPLE_EVERY)
 def reduce_geo_precision(loc: tuple[float, float], digits: int) -> tuple[float, float]:  # noqa: D103
     lat = round(loc[0], digits)
     lon = round(loc[1], digits)
@@ -124,6 +142,7 @@ def reduce_geo_precision(loc: tuple[float, float], digits: int) -> tuple[float,
 
 # no caching here, as no user_id in parameters, and since session_state.years may change
 @track_function_usage
+@measure_phase("cache load")
 def cache_all_activities_and_gears() -> tuple[pd.DataFrame, pd.DataFrame]:
     """
     Set st.session_state["years"] and call cache_all_activities_and_gears_year().
@@ -173,9 +192,151 @@ def cache_all_activities_and_gears() -> tuple[pd.DataFrame, pd.DataFrame]:
             st.error("No activity data found, please record/upload data at strava.com.")
             st.stop()
         df_gear = pd.concat(dfs_gear) if dfs_gear else pd.DataFrame()
+    # show writes to Strava right away, without re-fetching
+    df = apply_activity_patches(user_id, df)
+    # patch the calendar feed file, if the user has one
+    # imported here, as helper_ics imports this module
+    from helper_ics import update_ics_feed  # noqa: PLC0415
+
+    update_ics_feed(user_id, df)
     return df, df_gear
 
 
+@st.cache_resource
+def get_activities_data_versions() -> dict[int, int]:
+    """Create cached dict of activity data version per user."""
+    return {}
+
+
+@track_function_usage
+def bump_activities_data_version(user_id: int) -> None:
+    """Increase the activity data version of a user, invalidating derived caches."""
+    d = get_activities_data_versions()
+    d[user_id] = d.get(user_id, 0) + 1
+
+
+@dataclass
+class ActivityPatches:
+    """
+    Writes to Strava of a user, applied to the cached activities.
+
+    Each write has its time, as it expires with the activity cache entries that
+    were fetched before it.
+    """
+
+    commute_ids: dict[int, dt.datetime] = field(default_factory=dict)
+    new_activities: list[tuple[dt.datetime, dict]] = field(default_factory=list)
+
+    def expire(self, now: dt.datetime) -> bool:
+        """Remove writes older than the activity cache, return if any."""
+        n = len(self.commute_ids) + len(self.new_activities)
+        self.commute_ids = {
+            i: t for i, t in self.commute_ids.items() if now - t <= ACTIVITY_PATCHES_TTL
+        }
+        self.new_activities = [
+            (t, a) for t, a in self.new_activities if now - t <= ACTIVITY_PATCHES_TTL
+        ]
+        return len(self.commute_ids) + len(self.new_activities) < n
+
+
+@st.cache_resource
+def get_activity_patches() -> dict[int, ActivityPatches]:
+    """Create cached dict of activity patches per user."""
+    return {}
+
+
+def _get_or_create_patches(user_id: int) -> ActivityPatches:
+    patches = get_activity_patches()
+    p = patches.get(user_id)
+    if p is None:
+        p = ActivityPatches()
+        patches[user_id] = p
+    return p
+
+
+@track_function_usage
+def patch_activities_commute(user_id: int, activity_ids: list[int]) -> None:
+    """Mark activities as commute in the cached activities, after writing them."""
+    now = dt.datetime.now(tz=dt.UTC)
+    with _PATCHES_LOCK:
+        _get_or_create_patches(user_id).commute_ids.update(
+            dict.fromkeys(activity_ids, now)
+        )
+    bump_activities_data_version(user_id)
+
+
+@track_function_usage
+def patch_activities_new(user_id: int, activities: list[dict]) -> None:
+    """Add created activities (API responses) to the cached activities."""
+    now = dt.datetime.now(tz=dt.UTC)
+    with _PATCHES_LOCK:
+        _get_or_create_patches(user_id).new_activities.extend(
+            (now, a) for a in activities
+        )
+    bump_activities_data_version(user_id)
+
+
+@track_function_usage
+def apply_activity_patches(user_id: int, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply the writes of a user to the cached activities.
+
+    Each patch expires with the activity cache, as data fetched after the write
+    includes it.
+    Applying is idempotent, activities that are already there are not added.
+    """
+    with _PATCHES_LOCK:
+        p = get_activity_patches().get(user_id)
+        if p is None or df.empty:
+            return df
+        if p.expire(dt.datetime.now(tz=dt.UTC)):
+            bump_activities_data_version(user_id)
+        if not p.commute_ids and not p.new_activities:
+            del get_activity_patches()[user_id]
+            return df
+        commute_ids = list(p.commute_ids)
+        new_activities = [a for _t, a in p.new_activities]
+
+    commute_ids = [i for i in commute_ids if i in df.index]
+    if commute_ids:
+        df.loc[commute_ids, "commute"] = True
+
+    new_activities = [a for a in new_activities if a.get("id") not in df.index]
+    if new_activities:
+        gear_names = dict(zip(df["gear_id"], df["x_gear_name"], strict=True))
+        for a in new_activities:
+            if a.get("gear"):
+                gear_names[a["gear"]["id"]] = a["gear"]["name"]
+        df_new = enrich_activities(
+            new_activities, user_id=user_id, gear_names=gear_names
+        )[0]
+        # only loaded years and known columns, all-NA ones are filled by concat
+        df_new = df_new[df_new["x_year"] >= df["x_year"].min()]
+        df_new = df_new[df_new.columns.intersection(df.columns)].dropna(
+            axis=1, how="all"
+        )
+        if not df_new.empty:
+            df = pd.concat([df, df_new]).sort_values(
+                "start_date_local", ascending=False
+            )
+    return df
+
+
+@track_function_usage
+def get_activities_cache_key() -> tuple[int, int, int]:
+    """
+    Return (user_id, years, data version) for caching data derived from activities.
+
+    Call after cache_all_activities_and_gears(), as that might bump the version.
+    """
+    user_id = st.session_state["USER_ID"]
+    return (
+        user_id,
+        st.session_state.get("years", 0),
+        get_activities_data_versions().get(user_id, 0),
+    )
+
+
 @track_function_usage
 def refresh_activities_cache() -> None:
     """
@@ -185,6 +346,11 @@ def refresh_activities_cache() -> None:
     expensive to re-fetch due to API rate limits).
     """
     cache_all_activities_and_gears_in_year_range.clear()
+    # re-fetched data includes all writes
+    get_activity_patches().clear()
+    # derived views are keyed by data version, clearing just frees memory
+    cache_activities_stats_df.clear()
+    cache_activities_display_df.clear()
     # in DEV the activity-list pages are also cached to disk, remove them too
     if get_env() == "DEV":
         for p in DIR_CACHE.glob("activities-page-*.json"):
@@ -193,8 +359,8 @@ def refresh_activities_cache() -> None:
 
 # this cache is for 2h, while all others are only for 15min
 # caching requires user_id is given as parameter!!!
-@st.cache_data(
-    ttl="2h", show_spinner="Fetching your activities"
+@track_cache_usage(
+    st.cache_data(ttl=CACHE_TTL_ACTIVITIES, show_spinner="Fetching your activities")
 )  # add persist="disk" if we run into memory issues
 @track_function_usage
 def cache_all_activities_and_gears_in_year_range(
@@ -212,8 +378,26 @@ def cache_all_activities_and_gears_in_year_range(
     - Gears, using id as index, ordered by index
     """
     _LOGGER.info("cache_all_activities_and_gears_year for user_id=%s", user_id)
+    # only executed on cache miss, so derived caches need to be recalculated
+    bump_activities_data_version(user_id)
+
+    return enrich_activities(
+        fetch_all_activities(year_start=year_start, year_end=year_end),
+        user_id=user_id,
+    )
+
+
+@track_function_usage
+@measure_phase("enrichment")
+def enrich_activities(
+    activities: list[dict], user_id: int, gear_names: dict[str, str] | None = None
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Convert activity dicts of the Strava API to DataFrames of activities and gears.
 
-    df = pd.DataFrame(fetch_all_activities(year_start=year_start, year_end=year_end))
+    gear_names: gear id -> name, if given no gear data is fetched
+    """
+    df = pd.DataFrame(activities)
 
     # ensure all expected columns are there, even if df is empty
     cont = Path("activity_columns.txt").read_text().strip().split()
@@ -267,24 +451,29 @@ def cache_all_activities_and_gears_in_year_range(
 
     df = df.sort_values("start_date_local", ascending=False)
 
-    df = caching_calc_additional_fields(df)
+    with span("enrichment: additional fields"):
+        df = caching_calc_additional_fields(df)
 
     # gear
-    gear_ids = df["gear_id"].dropna().unique()
-    d_id_name = {}
-    lst_gear = []
-    for gear_id in gear_ids:
-        d_gear = fetch_gear_data(gear_id=gear_id, user_id=user_id)
-        lst_gear.append(d_gear)
-        d_id_name[gear_id] = d_gear["name"]
-    if lst_gear:
-        df_gear = pd.DataFrame(lst_gear).set_index("id").sort_index()
+    if gear_names is not None:
+        d_id_name = gear_names
+    else:
+        gear_ids = df["gear_id"].dropna().unique()
+        d_id_name = {}
+        lst_gear = []
+        for gear_id in gear_ids:
+            d_gear = fetch_gear_data(gear_id=gear_id, user_id=user_id)
+            lst_gear.append(d_gear)
+            d_id_name[gear_id] = d_gear["name"]
+        if lst_gear:
+            df_gear = pd.DataFrame(lst_gear).set_index("id").sort_index()
 
     # convert gear_id to name
     df["x_gear_name"] = df["gear_id"].map(d_id_name)
 
     # geo calculations
-    df = caching_geo_calc(df)
+    with span("enrichment: geo calc"):
+        df = caching_geo_calc(df)
 
     df = reorder_cols(df, COL_ORDER_ACTIVITIES)
     return df, df_gear
@@ -440,7 +629,7 @@ def get_known_locations(*, users_only: bool = False) -> list[tuple[float, float,
     return lst_known_locations
 
 
-@track_function_usage
+@track_function_usage(sample_every=HOT_SAMPLE_EVERY)
 def check_is_known_location(
     latlng: tuple[float, float], known_locations: list[tuple[float, float, str]]
 ) -> str | None:
@@ -480,7 +669,7 @@ def read_city_db() -> list[tuple[float, float, str]]:
     return lst
 
 
-@st.cache_resource
+@track_cache_usage(st.cache_resource)
 @track_function_usage
 def cities_into_1deg_geo_boxes() -> (  # noqa: C901
     dict[tuple[float, float], list[tuple[float, float, str]]]
@@ -525,7 +714,7 @@ def cities_into_1deg_geo_boxes() -> (  # noqa: C901
     return boxes
 
 
-@st.cache_data(ttl="15m")
+@track_cache_usage(st.cache_data(ttl=CACHE_TTL_CITY_SEARCH))
 @track_function_usage
 def search_closest_city(latlng: tuple[float, float]) -> str | None:
     """Search in 1x1 deg box of cities for closest city."""
@@ -606,3 +795,81 @@ def reduce_and_rename_activity_df_for_stats(df: pd.DataFrame) -> pd.DataFrame:
     df["Speed_km/h-max"] = df["Speed_km/h-avg"]
     df["Heartrate-max"] = df["Heartrate-avg"]
     return df
+
+
+# derived views of the activity DataFrame, shared across pages and reruns
+# cache_resource: no copy per access, so callers must not modify them
+@st.cache_resource(ttl=CACHE_TTL_ACTIVITIES, max_entries=100)
+@track_function_usage
+def cache_activities_stats_df(
+    cache_key: tuple[int, int, int], _df: pd.DataFrame
+) -> pd.DataFrame:
+    """Cache reduce_and_rename_activity_df_for_stats() per activities cache key."""
+    _LOGGER.info("cache_activities_stats_df for %s", cache_key)
+    return reduce_and_rename_activity_df_for_stats(_df)
+
+
+@track_function_usage
+def get_activities_stats_df(df: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Get the stats DataFrame of the current user, see cache_activities_stats_df().
+
+    df: activities of cache_all_activities_and_gears(), if already loaded, to
+    not load a copy again
+    Do not modify the returned DataFrame.
+    """
+    if df is None:
+        df = cache_all_activities_and_gears()[0]
+    return cache_activities_stats_df(get_activities_cache_key(), _df=df)
+
+
+@track_function_usage
+def get_display_col_names(cols: list[str]) -> dict[str, str]:
+    """Map column names to display names, e.g. drop "x_" prefix."""
+    col_names = {}
+    for col in cols:
+        if col.startswith("x_"):
+            col_names[col] = col[2:]
+        elif col.startswith("average_"):
+            col_names[col] = col[8:] + "_av"
+        else:
+            col_names[col] = col  # unchanged
+    col_names["average_heartrate"] = "HR_av"
+    col_names["average_watts"] = "W_av"
+    col_names["device_watts"] = "W_device"
+    col_names["display_hide_heartrate_option"] = "HR_hide"
+    col_names["heartrate_opt_out"] = "HR_opt_out"
+    col_names["location_country"] = "country"
+    col_names["max_heartrate"] = "HR_max"
+    col_names["max_watts"] = "W_max"
+    col_names["total_elevation_gain"] = "elev_gain"
+    col_names["weighted_average_watts"] = "W_weight_avg"
+    col_names["x_gear_name"] = "gear"
+    col_names["x_min"] = "minutes"
+    col_names["x_nearest_city_start"] = "nearest_city"
+    return {k: v for k, v in col_names.items() if k in cols}
+
+
+@st.cache_resource(ttl=CACHE_TTL_ACTIVITIES, max_entries=100)
+@track_function_usage
+def cache_activities_display_df(
+    cache_key: tuple[int, int, int], _df: pd.DataFrame
+) -> pd.DataFrame:
+    """Cache activity DataFrame renamed for display per activities cache key."""
+    _LOGGER.info("cache_activities_display_df for %s", cache_key)
+    return _df.rename(
+        columns=get_display_col_names(_df.columns.to_list()), errors="raise"
+    )
+
+
+@track_function_usage
+def get_activities_display_df(df: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Get activity DataFrame of the current user, renamed for display.
+
+    df: as for get_activities_stats_df()
+    Do not modify the returned DataFrame.
+    """
+    if df is None:
+        df = cache_all_activities_and_gears()[0]
+    return cache_activities_display_df(get_activities_cache_key(), _df=df)
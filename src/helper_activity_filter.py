@@ -0,0 +1,165 @@
+"""Helper: Filter engine for the activity list, using cached boolean masks."""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from helper import CACHE_TTL_ACTIVITIES
+from helper_activities_caching import get_activities_cache_key
+from helper_logging import get_logger_from_filename, track_function_usage
+
+_LOGGER = get_logger_from_filename(__file__)
+
+# numerical columns for range filters
+FILTER_COLS = ("x_year", "x_min", "x_km", "total_elevation_gain")
+# number of filter results to keep, for all users
+FILTER_CACHE_SIZE = 200
+
+
+@dataclass(frozen=True)
+class FilterIndex:
+    """
+    Precomputed lookup structures of an activity DataFrame.
+
+    - type_masks: boolean mask (bitmap) per activity type
+    - col_values: column values, NaN for missing
+    - order: positions sorting the non-NaN column values
+    - sorted_values: the sorted non-NaN column values
+    """
+
+    cache_key: tuple[int, int, int]
+    type_masks: dict[str, np.ndarray]
+    col_values: dict[str, np.ndarray]
+    order: dict[str, np.ndarray]
+    sorted_values: dict[str, np.ndarray]
+
+    @property
+    def size(self) -> int:
+        """Number of activities."""
+        return len(self.col_values[FILTER_COLS[0]])
+
+
+@track_function_usage
+def build_filter_index(
+    df: pd.DataFrame, cache_key: tuple[int, int, int]
+) -> FilterIndex:
+    """Build FilterIndex for activity DataFrame."""
+    codes, types = pd.factorize(df["type"])
+    type_masks = {t: codes == i for i, t in enumerate(types)}
+    col_values = {}
+    order = {}
+    sorted_values = {}
+    for col in FILTER_COLS:
+        arr = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+        num_valid = int((~np.isnan(arr)).sum())
+        col_values[col] = arr
+        # NaN are sorted last, so cut them off
+        order[col] = np.argsort(arr, kind="stable")[:num_valid]
+        sorted_values[col] = arr[order[col]]
+    for d in (type_masks, col_values, order, sorted_values):
+        for arr in d.values():
+            arr.setflags(write=False)
+    return FilterIndex(cache_key, type_masks, col_values, order, sorted_values)
+
+
+@st.cache_resource(ttl=CACHE_TTL_ACTIVITIES, max_entries=100)
+@track_function_usage
+def cache_filter_index(
+    cache_key: tuple[int, int, int], _df: pd.DataFrame
+) -> FilterIndex:
+    """Cache the FilterIndex per activities cache key."""
+    return build_filter_index(_df, cache_key=cache_key)
+
+
+@track_function_usage
+def get_filter_index(df: pd.DataFrame) -> FilterIndex:
+    """Get cached FilterIndex for the (unfiltered) activity DataFrame."""
+    return cache_filter_index(get_activities_cache_key(), _df=df)
+
+
+@track_function_usage
+def range_mask(
+    fi: FilterIndex,
+    col: str,
+    lower: float,
+    upper: float | None = None,
+    *,
+    lower_inclusive: bool = False,
+) -> np.ndarray:
+    """
+    Get mask of rows with lower < value (<= upper), via binary search.
+    """
+    sorted_values = fi.sorted_values[col]
+    side = "left" if lower_inclusive else "right"
+    first = np.searchsorted(sorted_values, lower, side=side)
+    last = (
+        len(sorted_values)
+        if upper is None
+        else np.searchsorted(sorted_values, upper, side="right")
+    )
+    mask = np.zeros(fi.size, dtype=bool)
+    mask[fi.order[col][first:last]] = True
+    return mask
+
+
+@st.cache_resource(max_entries=FILTER_CACHE_SIZE)
+@track_function_usage
+def cache_filter_mask(
+    cache_key: tuple[int, int, int], filters: tuple, _fi: FilterIndex
+) -> np.ndarray:
+    """Combine filters to a boolean mask, cached per filter tuple."""
+    _ = cache_key  # part of the cache key only
+    sel_type, sel_year, min_minutes, min_km, min_elev = filters
+    mask = np.ones(_fi.size, dtype=bool)
+    if sel_type:
+        mask &= _fi.type_masks.get(sel_type, np.zeros(_fi.size, dtype=bool))
+    if sel_year:
+        mask &= range_mask(
+            _fi, "x_year", sel_year[0], sel_year[1], lower_inclusive=True
+        )
+    for col, value in (
+        ("x_min", min_minutes),
+        ("x_km", min_km),
+        ("total_elevation_gain", min_elev),
+    ):
+        if value:
+            mask &= range_mask(_fi, col, value)
+    mask.setflags(write=False)
+    return mask
+
+
+@track_function_usage
+def filter_mask(  # noqa: PLR0913
+    fi: FilterIndex,
+    *,
+    sel_type: str | None = None,
+    sel_year: tuple[int, int] | None = None,
+    min_minutes: int = 0,
+    min_km: int = 0,
+    min_elev: int = 0,
+) -> np.ndarray:
+    """
+    Get boolean mask of activities matching all filters.
+
+    Numerical filters (minutes, km, elev) are exclusive, year range is inclusive.
+    """
+    filters = (
+        sel_type,
+        tuple(sel_year) if sel_year else None,
+        min_minutes,
+        min_km,
+        min_elev,
+    )
+    return cache_filter_mask(fi.cache_key, filters, _fi=fi)
+
+
+@track_function_usage
+def masked_min_max(fi: FilterIndex, col: str, mask: np.ndarray) -> tuple[float, float]:
+    """Get min and max of column values in mask, NaN if there are none."""
+    arr = fi.col_values[col][mask]
+    arr = arr[~np.isnan(arr)]
+    if len(arr) == 0:
+        return np.nan, np.nan
+    return float(arr.min()), float(arr.max())
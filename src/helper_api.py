@@ -2,13 +2,18 @@
 
 import datetime as dt
 import json
+from dataclasses import dataclass
 from pathlib import Path
+from urllib.parse import urlsplit
 
 import requests
 import streamlit as st
 
-from helper import get_env
+from helper import CACHE_TTL_GEAR, get_env
+from helper_cache_stats import track_cache_usage
 from helper_logging import get_logger_from_filename, track_function_usage
+from helper_metrics import measure_phase
+from helper_tracing import set_span_attrs
 
 _LOGGER = get_logger_from_filename(__file__)
 
@@ -25,6 +30,54 @@ class StravaRateLimitError(Exception):
     """Raised when the Strava API rate limit (HTTP 429) is hit."""
 
 
+@dataclass
+class RateBudget:
+    """
+    Strava API rate limit usage of this app, from the latest response headers.
+
+    Limits and usage are (15-min, daily), 0 limit means unknown.
+    """
+
+    limit: tuple[int, int] = (0, 0)
+    usage: tuple[int, int] = (0, 0)
+    updated: dt.datetime | None = None
+
+    def remaining(self, now: dt.datetime) -> int | None:
+        """Remaining requests in the current 15-min window, None if unknown."""
+        if self.updated is None or self.limit[0] == 0:
+            return None
+        window_start = now.replace(
+            minute=now.minute - now.minute % 15, second=0, microsecond=0
+        )
+        usage = self.usage[0] if self.updated >= window_start else 0
+        return min(self.limit[0] - usage, self.limit[1] - self.usage[1])
+
+
+@st.cache_resource
+def get_rate_budget() -> RateBudget:
+    """Create cached rate budget, shared by all sessions, as limits are per app."""
+    return RateBudget()
+
+
+def _update_rate_budget(resp: requests.Response | None) -> None:
+    """Update rate budget from X-RateLimit-* headers of a response."""
+    if resp is None:
+        return
+    limit = resp.headers.get("X-RateLimit-Limit")
+    usage = resp.headers.get("X-RateLimit-Usage")
+    if not limit or not usage:
+        return
+    try:
+        limit_short, limit_daily = (int(x) for x in limit.split(",")[:2])
+        usage_short, usage_daily = (int(x) for x in usage.split(",")[:2])
+    except ValueError:
+        return
+    budget = get_rate_budget()
+    budget.limit = (limit_short, limit_daily)
+    budget.usage = (usage_short, usage_daily)
+    budget.updated = dt.datetime.now(tz=dt.UTC)
+
+
 @track_function_usage
 def api_post_oauth(code: str) -> dict:
     """Post the code from the oauth2 redirect to retrieve token."""
@@ -75,17 +128,25 @@ def api_post_deauthorize() -> None:
 
 
 # not caching raw data
-@track_function_usage
-def _api_get(path: str) -> dict | list:
-    """Get data from Strava API, used by fetch_* functions."""
+@track_function_usage(latency=True)
+@measure_phase("strava api")
+def _api_get(path: str, token: str | None = None) -> dict | list:
+    """
+    Get data from Strava API, used by fetch_* functions.
+
+    token: for usage outside of the session (background threads)
+    """
     path = f"{URL_BASE}/{path}"
     _LOGGER.info("API GET %s", path)
 
-    headers = {"Authorization": f"Bearer {st.session_state['TOKEN']}"}
+    token = token or st.session_state["TOKEN"]
+    headers = {"Authorization": f"Bearer {token}"}
 
     for attempt in range(API_RETRIES):  # Try once, then retry once if it fails
         try:
             resp = requests.get(path, headers=headers, timeout=(3, 30))
+            _update_rate_budget(resp)
+            _trace_response(resp, attempts=attempt + 1)
             # Raise HTTPError if HTTP request returns an unsuccessful status code
             resp.raise_for_status()
             return resp.json()
@@ -101,30 +162,71 @@ def _api_get(path: str) -> dict | list:
     return []  # unreachable, but makes ruff happy
 
 
-@track_function_usage
-def _api_post(path: str, params: dict) -> dict:
-    """Post data to Strava API, used by post_* functions."""
+def _trace_response(resp: requests.Response, attempts: int = 1) -> None:
+    """Add request and response info to the span of the API call."""
+    set_span_attrs(
+        method=resp.request.method,
+        # without query, as it might contain activity data
+        path=urlsplit(resp.url).path,
+        status=resp.status_code,
+        bytes=len(resp.content),
+        attempts=attempts,
+    )
+
+
+def _raise_api_error(e: requests.RequestException) -> None:
+    """Re-raise exception, as StravaRateLimitError on HTTP 429."""
+    resp = getattr(e, "response", None)
+    if resp is not None and resp.status_code == HTTP_TOO_MANY_REQUESTS:
+        raise StravaRateLimitError from e
+    raise e
+
+
+@track_function_usage(latency=True)
+@measure_phase("strava api")
+def _api_post(
+    path: str, params: dict, *, token: str | None = None, raise_errors: bool = False
+) -> dict:
+    """
+    Post data to Strava API, used by post_* functions.
+
+    raise_errors: raise instead of print, e.g. for collecting them in bulk writes
+    """
     url = f"{URL_BASE}/{path}"
     _LOGGER.info("API POST %s", url)
-    headers = {"Authorization": f"Bearer {st.session_state['TOKEN']}"}
+    token = token or st.session_state["TOKEN"]
+    headers = {"Authorization": f"Bearer {token}"}
     try:
         resp = requests.post(url, params=params, headers=headers, timeout=(3, 30))
+        _update_rate_budget(resp)
+        _trace_response(resp)
         resp.raise_for_status()
         return resp.json()
     except requests.RequestException as e:
+        if raise_errors:
+            _raise_api_error(e)
         print(e)
     return {}
 
 
-def _api_put(path: str, data: dict) -> dict | list:
-    """Put/Update."""
+@track_function_usage(latency=True)
+@measure_phase("strava api")
+def _api_put(
+    path: str, data: dict, *, token: str | None = None, raise_errors: bool = False
+) -> dict | list:
+    """Put/Update, raise_errors as for _api_post()."""
     url = f"{URL_BASE}/{path}"
-    headers = {"Authorization": f"Bearer {st.session_state['TOKEN']}"}
+    token = token or st.session_state["TOKEN"]
+    headers = {"Authorization": f"Bearer {token}"}
     try:
         resp = requests.put(url=url, data=data, headers=headers, timeout=(3, 30))
+        _update_rate_budget(resp)
+        _trace_response(resp)
         resp.raise_for_status()
         return resp.json()
     except requests.RequestException as e:
+        if raise_errors:
+            _raise_api_error(e)
         print(e)
     return {}
 
@@ -139,8 +241,11 @@ def post_activity(  # noqa: PLR0913 PLR0917
     commute: int | None = None,
     gear_id: str | None = None,
     elev_gain: int | None = None,
+    *,
+    token: str | None = None,
+    raise_errors: bool = False,
 ) -> dict:
-    """Create a new activity."""
+    """Create a new activity, token and raise_errors as for _api_post()."""
     date = date.replace(" ", "T") + "Z"
     date = date.replace("T00:00:00Z", "T00:00:01Z")
     params = {
@@ -156,13 +261,17 @@ def post_activity(  # noqa: PLR0913 PLR0917
         "elev_gain": elev_gain or None,
     }
     params = {k: v for k, v in params.items() if v is not None}
-    return _api_post("activities", params)
+    return _api_post("activities", params, token=token, raise_errors=raise_errors)
 
 
-def set_commute(activity_id: int) -> int:
-    """Set commute flag for activity."""
-    path = "/activities/" + str(activity_id)
-    resp_dict = _api_put(path=path, data={"commute": True})
+def set_commute(
+    activity_id: int, *, token: str | None = None, raise_errors: bool = False
+) -> int:
+    """Set commute flag for activity, token and raise_errors as for _api_post()."""
+    path = f"activities/{activity_id}"
+    resp_dict = _api_put(
+        path=path, data={"commute": True}, token=token, raise_errors=raise_errors
+    )
     assert type(resp_dict) is dict
     return activity_id
     # print(resp_dict["id"], resp_dict["name"])
@@ -279,7 +388,7 @@ def fetch_all_activities(year_start: int, year_end: int) -> list[dict]:
     return lst_all_activities
 
 
-@st.cache_data(ttl="60m")
+@track_cache_usage(st.cache_data(ttl=CACHE_TTL_GEAR))
 @track_function_usage
 def fetch_gear_data(gear_id: int, user_id: int) -> dict:
     """
@@ -300,22 +409,20 @@ def fetch_gear_data(gear_id: int, user_id: int) -> dict:
     return d
 
 
-@st.cache_data(ttl="60m")
+# no st caching, as called from background threads, see helper_descriptions.py
 @track_function_usage
-def fetch_activity_description(activity_id: int, user_id: int) -> str:
+def fetch_activity_description(activity_id: int, token: str) -> str:
     """
     Fetch detailed activity data and return its description.
 
     One API call per activity, so use sparingly.
-    user_id is only included to double-ensure the caching is per user.
     """
-    _ = user_id  # not used
     cache_file = f"activity-{activity_id}.json"
     d = None
     if get_env() == "DEV":
         d = read_cache_file(cache_file)
     if not d:
-        d = _api_get(path=f"activities/{activity_id}")
+        d = _api_get(path=f"activities/{activity_id}", token=token)
         if get_env() == "DEV":
             write_cache_file(cache_file, d=d)
     assert isinstance(d, dict)
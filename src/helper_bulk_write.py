@@ -0,0 +1,162 @@
+"""Helper: Concurrent bulk writes to Strava, with per-item results."""
+
+import datetime as dt
+import time
+from collections.abc import Callable, Hashable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+import pandas as pd
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from helper_api import StravaRateLimitError, get_rate_budget
+from helper_logging import get_logger_from_filename, track_function_usage
+from helper_tracing import traced
+
+_LOGGER = get_logger_from_filename(__file__)
+
+# concurrent API calls of one bulk write
+BULK_WORKERS = 4
+# retries of transient errors (connection errors, timeouts, HTTP 5xx),
+# for non-idempotent writes only of errors before the request was sent
+BULK_RETRIES = 2
+BULK_RETRY_DELAY = 1.0
+# requests of the 15-min budget to keep for reading
+RATE_BUDGET_RESERVE = 20
+HTTP_SERVER_ERROR = 500
+
+
+@dataclass
+class WriteResult:
+    """Result of writing one item, error is empty on success."""
+
+    key: Hashable
+    result: object = None
+    error: str = ""
+    attempts: int = 0
+    rate_limited: bool = False
+
+    @property
+    def ok(self) -> bool:
+        """Successfully written."""
+        return not self.error
+
+
+def _is_not_sent(e: Exception) -> bool:
+    """Check if the connection failed, so the request did not reach the server."""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0] if e.args else None, "reason", None)
+    return isinstance(e, requests.ConnectionError) and isinstance(
+        reason, NewConnectionError
+    )
+
+
+def _is_transient(e: Exception, *, idempotent: bool) -> bool:
+    if not idempotent:
+        # e.g. a create that timed out might be stored already
+        return _is_not_sent(e)
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    resp = getattr(e, "response", None)
+    return resp is not None and resp.status_code >= HTTP_SERVER_ERROR
+
+
+def _error_text(e: Exception) -> str:
+    if isinstance(e, StravaRateLimitError):
+        return "Strava API rate limit reached"
+    return f"{type(e).__name__}: {e}"
+
+
+def _write_with_retry(
+    key: Hashable, fn: Callable[[], object], *, idempotent: bool
+) -> WriteResult:
+    """Call fn, retrying transient errors."""
+    res = WriteResult(key)
+    for attempt in range(1, BULK_RETRIES + 2):
+        res.attempts = attempt
+        try:
+            res.result = fn()
+            res.error = ""
+        except Exception as e:  # noqa: BLE001
+            res.error = _error_text(e)
+            res.rate_limited = isinstance(e, StravaRateLimitError)
+            if not _is_transient(e, idempotent=idempotent) or attempt > BULK_RETRIES:
+                _LOGGER.warning("bulk write of %s failed: %s", key, res.error)
+                break
+            time.sleep(BULK_RETRY_DELAY * attempt)
+        else:
+            break
+    return res
+
+
+@track_function_usage
+def bulk_write(
+    items: dict[Hashable, Callable[[], object]],
+    on_progress: Callable[[int, int], None] | None = None,
+    workers: int = BULK_WORKERS,
+    *,
+    idempotent: bool = True,
+) -> list[WriteResult]:
+    """
+    Call the write functions of items concurrently, returning a result per item.
+
+    Exceptions are collected as error texts, transient ones retried.
+    idempotent=False for creates: retried only if the request was not sent, so a
+    timed out create, that Strava stored anyway, is not created twice.
+    Stops submitting when the rate limit is hit or the 15-min budget is used up,
+    remaining items are returned with an error, so they can be retried later.
+    on_progress(done, total) is called from the calling (script) thread.
+    """
+    total = len(items)
+    results: dict[Hashable, WriteResult] = {}
+    pending = list(items.items())
+    running: dict[Future, Hashable] = {}
+    stop_reason = ""
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk") as pool:
+        while pending or running:
+            while pending and len(running) < workers and not stop_reason:
+                remaining = get_rate_budget().remaining(dt.datetime.now(tz=dt.UTC))
+                if (
+                    remaining is not None
+                    and remaining - len(running) <= RATE_BUDGET_RESERVE
+                ):
+                    stop_reason = "Strava API rate budget used up"
+                    break
+                key, fn = pending.pop(0)
+                # API calls of the workers are spans of the calling page run
+                running[
+                    pool.submit(
+                        traced(_write_with_retry), key, fn, idempotent=idempotent
+                    )
+                ] = key
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                res = future.result()
+                results[running.pop(future)] = res
+                if res.rate_limited:
+                    stop_reason = res.error
+            if on_progress:
+                on_progress(len(results), total)
+    for key, _fn in pending:
+        results[key] = WriteResult(key, error=f"{stop_reason}, try again later")
+    if on_progress:
+        on_progress(total, total)
+    # keep order of items
+    return [results[key] for key in items]
+
+
+@track_function_usage
+def results_df(results: list[WriteResult]) -> pd.DataFrame:
+    """Convert results to DataFrame for display, index is the item key."""
+    return pd.DataFrame(
+        {
+            "OK": [r.ok for r in results],
+            "Attempts": [r.attempts for r in results],
+            "Error": [r.error for r in results],
+        },
+        index=[r.key for r in results],
+    )
@@ -0,0 +1,188 @@
+"""Helper: Hit/miss statistics of st.cache_data/st.cache_resource functions."""
+
+import inspect
+import sys
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import wraps
+from time import perf_counter_ns
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from helper_logging import get_logger_from_filename
+from helper_tracing import span
+
+_LOGGER = get_logger_from_filename(__file__)
+
+# computed keys per function, to detect re-computation after expiry/eviction
+MAX_KNOWN_KEYS = 10_000
+
+_CACHE_LOCK = threading.Lock()
+_cache_stats: dict[tuple[str, int | None], "CacheStats"] = {}
+_known_keys: dict[str, set[int]] = {}
+
+
+@dataclass
+class CacheStats:
+    """
+    Usage of a cached function by a user.
+
+    evictions: misses of keys computed before, so expired (ttl) or evicted
+    (max_entries) in the meantime
+    size_bytes: estimated size of the latest computed entry
+    """
+
+    calls: int = 0
+    misses: int = 0
+    evictions: int = 0
+    compute_ns: int = 0
+    size_bytes: int = 0
+
+    @property
+    def hits(self) -> int:
+        """Calls served from cache."""
+        return self.calls - self.misses
+
+
+def estimate_size(obj: object, depth: int = 3) -> int:
+    """Estimate memory of obj in bytes, DataFrames deep, containers recursive."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(deep=True).sum())  # type: ignore[union-attr]
+    size = sys.getsizeof(obj)
+    if depth == 0:
+        return size
+    if isinstance(obj, dict):
+        size += sum(
+            estimate_size(k, depth - 1) + estimate_size(v, depth - 1)
+            for k, v in obj.items()
+        )
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(estimate_size(v, depth - 1) for v in obj)
+    return size
+
+
+def _current_user_id() -> int | None:
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    return st.session_state.get("USER_ID")
+
+
+def record_cache_access(
+    name: str,
+    user_id: int | None,
+    *,
+    calls: int = 0,
+    misses: int = 0,
+    compute_ns: int = 0,
+) -> None:
+    """Add calls and misses, e.g. of caches not using track_cache_usage."""
+    with _CACHE_LOCK:
+        stats = _cache_stats.setdefault((name, user_id), CacheStats())
+        stats.calls += calls
+        stats.misses += misses
+        stats.compute_ns += compute_ns
+
+
+def _record_miss(
+    name: str, user_id: int | None, key: int, compute_ns: int, size_bytes: int
+) -> None:
+    with _CACHE_LOCK:
+        stats = _cache_stats.setdefault((name, user_id), CacheStats())
+        stats.misses += 1
+        stats.compute_ns += compute_ns
+        stats.size_bytes = size_bytes
+        keys = _known_keys.setdefault(name, set())
+        if key in keys:
+            stats.evictions += 1
+        elif len(keys) < MAX_KNOWN_KEYS:
+            keys.add(key)
+
+
+def track_cache_usage(cache: Callable[[Callable], Callable]) -> Callable:
+    """
+    Use instead of the st.cache_* decorator, to record hits and misses.
+
+    @track_cache_usage(st.cache_data(ttl=CACHE_TTL_GEAR))
+    Stats are per function and user, from the user_id parameter if there is one,
+    else from the session.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        name = func.__name__
+        sig = inspect.signature(func)
+        params = list(sig.parameters)
+        user_pos = params.index("user_id") if "user_id" in params else None
+
+        def user_of(args: tuple, kwargs: dict) -> int | None:
+            if user_pos is None:
+                return _current_user_id()
+            if "user_id" in kwargs:
+                return kwargs["user_id"]  # type: ignore[return-value]
+            return args[user_pos] if len(args) > user_pos else None
+
+        @wraps(func)
+        def compute(*args: object, **kwargs: object) -> object:
+            # called by st.cache_* on miss only
+            start = perf_counter_ns()
+            with span(f"cache miss: {name}"):
+                result = func(*args, **kwargs)
+            elapsed = perf_counter_ns() - start
+            # same as Streamlit, parameters starting with _ are not part of the key
+            bound = sig.bind(*args, **kwargs)
+            key = hash(
+                repr([(k, v) for k, v in bound.arguments.items() if k[0] != "_"])
+            )
+            _record_miss(
+                name, user_of(args, kwargs), key, elapsed, estimate_size(result)
+            )
+            return result
+
+        cached = cache(compute)
+
+        @wraps(func)
+        def wrapper(*args: object, **kwargs: object) -> object:
+            user_id = user_of(args, kwargs)
+            with _CACHE_LOCK:
+                _cache_stats.setdefault((name, user_id), CacheStats()).calls += 1
+            return cached(*args, **kwargs)
+
+        wrapper.clear = cached.clear  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
+
+
+def get_cache_stats() -> pd.DataFrame:
+    """Get cache stats per function and user, as DataFrame."""
+    with _CACHE_LOCK:
+        rows = [
+            {
+                "function": name,
+                "user": user_id,
+                "calls": s.calls,
+                "hits": s.hits,
+                "misses": s.misses,
+                "evictions": s.evictions,
+                "compute_time": s.compute_ns / 1e9,
+                "size_bytes": s.size_bytes,
+            }
+            for (name, user_id), s in _cache_stats.items()
+        ]
+    df = pd.DataFrame(
+        rows,
+        columns=[
+            "function",
+            "user",
+            "calls",
+            "hits",
+            "misses",
+            "evictions",
+            "compute_time",
+            "size_bytes",
+        ],
+    )
+    df["user"] = df["user"].astype("Int64")
+    return df
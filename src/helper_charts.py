@@ -0,0 +1,65 @@
+"""Helper: Minimal chart data and cached Vega-Lite specs."""
+
+import altair as alt
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from helper_logging import get_logger_from_filename, track_function_usage
+
+_LOGGER = get_logger_from_filename(__file__)
+
+# name of the dataset the chart specs refer to
+DATASET = "data"
+
+
+@track_function_usage
+def chart_data(df: pd.DataFrame, fields: list[str]) -> pd.DataFrame:
+    """
+    Project DataFrame to the encoded fields only.
+
+    Dates are converted to numeric timestamps (ms since epoch, UTC), so use utc
+    time units in the encoding, e.g. "utcyearmonth(date):T".
+    """
+    df = df.loc[:, fields].reset_index(drop=True)
+    for col in fields:
+        if col == "date" or pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col]).astype("datetime64[ms]").astype("int64")
+    return df
+
+
+@track_function_usage
+def arrow_bytes(df: pd.DataFrame) -> bytes:
+    """Serialize DataFrame to Arrow IPC stream, as Streamlit sends chart data."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.RecordBatchStreamWriter(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+@track_function_usage
+def base_chart(**kwargs: object) -> alt.Chart:
+    """Altair chart referring to the named dataset instead of embedding data."""
+    return alt.Chart(alt.NamedData(DATASET), **kwargs)  # type: ignore[arg-type]
+
+
+@track_function_usage
+def chart_spec(chart: alt.Chart, df: pd.DataFrame) -> dict:
+    """
+    Convert chart of base_chart() to Vega-Lite spec, with df as Arrow dataset.
+
+    The result is ready to be cached and passed to show_chart() without any
+    further serialization.
+    """
+    spec = chart.to_dict()
+    # remove Altair default theme sizes, Streamlit sets the width
+    spec.pop("config", None)
+    spec["datasets"] = {DATASET: arrow_bytes(df)}
+    return spec
+
+
+@track_function_usage
+def show_chart(spec: dict) -> None:
+    """Display a cached Vega-Lite spec of chart_spec()."""
+    st.vega_lite_chart(spec=spec, width="stretch")
@@ -0,0 +1,219 @@
+"""Helper: Dense daily index of activities, for active days, streaks and load."""
+
+import datetime as dt
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from helper import CACHE_TTL_ACTIVITIES
+from helper_activities_caching import get_activities_cache_key
+from helper_logging import get_logger_from_filename, track_function_usage
+from helper_ui_components import list_sports
+
+_LOGGER = get_logger_from_filename(__file__)
+
+# 3rd dimension of DailyIndex.data
+MEASURES = ("Count", "Minutes", "Kilometer", "Elevation")
+# columns of the stats DataFrame to sum up per day, see
+# reduce_and_rename_activity_df_for_stats()
+MEASURE_SOURCE_COLS = {
+    "Minutes": "Hour-sum",
+    "Kilometer": "Kilometer-sum",
+    "Elevation": "Elevation-sum",
+}
+
+
+@dataclass(frozen=True)
+class DailyIndex:
+    """
+    Dense array of per day sums of activities.
+
+    data has the shape days x sports x measures, day 0 is first_day.
+    """
+
+    first_day: dt.date
+    sports: tuple[str, ...]
+    data: np.ndarray
+
+    @property
+    def days(self) -> pd.DatetimeIndex:
+        """Dates of the 1st dimension."""
+        return pd.date_range(self.first_day, periods=self.data.shape[0], freq="D")
+
+    def day_no(self, date: dt.date) -> int:
+        """Position of a date in the 1st dimension."""
+        return (date - self.first_day).days
+
+
+@track_function_usage
+def build_daily_index(df: pd.DataFrame, last_day: dt.date) -> DailyIndex:
+    """
+    Build DailyIndex from stats DataFrame, from Jan 1st of first activity to last_day.
+
+    Uses a single bincount per measure instead of grouping by date.
+    """
+    sports = tuple(list_sports(df))
+    if df.empty:
+        return DailyIndex(last_day, sports, np.zeros((1, 0, len(MEASURES))))
+
+    dates = pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[D]")
+    # start at Jan 1st, so that every year is complete for year-to-date lookups
+    first = dates.min().astype("datetime64[Y]").astype("datetime64[D]")
+    last = max(np.datetime64(last_day, "D"), dates.max())
+    num_days = int((last - first).astype(int)) + 1
+
+    day_no = (dates - first).astype(np.int64)
+    sport_no = pd.Categorical(df["type"], categories=sports).codes.astype(np.int64)
+    flat = day_no * len(sports) + sport_no
+    size = num_days * len(sports)
+
+    values = np.zeros((num_days, len(sports), len(MEASURES)))
+    values[:, :, 0] = np.bincount(flat, minlength=size).reshape(num_days, -1)
+    for i, measure in enumerate(MEASURES[1:], start=1):
+        weights = df[MEASURE_SOURCE_COLS[measure]].fillna(0).to_numpy(dtype=float)
+        if measure == "Minutes":
+            weights = weights * 60  # Hour-sum -> minutes
+        values[:, :, i] = np.bincount(flat, weights=weights, minlength=size).reshape(
+            num_days, -1
+        )
+    return DailyIndex(pd.Timestamp(first).date(), sports, values)
+
+
+@st.cache_resource(ttl=CACHE_TTL_ACTIVITIES, max_entries=100)
+@track_function_usage
+def cache_daily_index(
+    cache_key: tuple[int, int, int], last_day: dt.date, _df: pd.DataFrame
+) -> DailyIndex:
+    """
+    Cache the DailyIndex per user, loaded years and activity data version.
+
+    cache_resource: shared without copy, so callers must not modify it.
+    """
+    _LOGGER.info("cache_daily_index for %s", cache_key)
+    return build_daily_index(_df, last_day=last_day)
+
+
+@track_function_usage
+def get_daily_index(df: pd.DataFrame) -> DailyIndex:
+    """
+    Get cached DailyIndex for the stats DataFrame of the current user, till today.
+    """
+    return cache_daily_index(
+        get_activities_cache_key(),
+        last_day=dt.datetime.now(tz=dt.UTC).date(),
+        _df=df,
+    )
+
+
+@track_function_usage
+def daily_values(
+    idx: DailyIndex, measure: str, sports: list[str] | None = None
+) -> np.ndarray:
+    """Sum up a measure per day over the selected sports (None = all)."""
+    m = MEASURES.index(measure)
+    if not sports:
+        return idx.data[:, :, m].sum(axis=1)
+    cols = [i for i, s in enumerate(idx.sports) if s in sports]
+    return idx.data[:, cols, m].sum(axis=1)
+
+
+@track_function_usage
+def active_days_per_year(idx: DailyIndex, sports: list[str] | None = None) -> pd.Series:
+    """Count active days per year, via cumulative sum at the year boundaries."""
+    active = daily_values(idx, "Count", sports) > 0
+    cumsum = np.concatenate(([0], np.cumsum(active)))
+    years = idx.days.year.to_numpy()
+    # positions of first day of each year and end of array
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(years)) + 1, [len(years)]))
+    return pd.Series(
+        np.diff(cumsum[bounds]), index=years[bounds[:-1]], name="Active Days"
+    )
+
+
+@track_function_usage
+def streaks(idx: DailyIndex, sports: list[str] | None = None) -> tuple[int, int]:
+    """
+    Return current and longest streak of consecutive active days.
+
+    The current streak ends at the last day, or the day before, as the last day
+    (today) might not be over yet.
+    """
+    active = (daily_values(idx, "Count", sports) > 0).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], active, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)  # exclusive
+    if len(starts) == 0:
+        return 0, 0
+    lengths = ends - starts
+    current = int(lengths[-1]) if ends[-1] >= len(active) - 1 else 0
+    return current, int(lengths.max())
+
+
+@track_function_usage
+def rolling_sum(
+    idx: DailyIndex, measure: str, window: int, sports: list[str] | None = None
+) -> pd.Series:
+    """Sum up a measure over the last window days, via cumulative sum."""
+    cumsum = np.concatenate(([0.0], np.cumsum(daily_values(idx, measure, sports))))
+    shifted = np.concatenate((np.zeros(window), cumsum[:-window]))[: len(cumsum)]
+    return pd.Series((cumsum - shifted)[1:], index=idx.days, name=measure)
+
+
+@track_function_usage
+def ewma(
+    idx: DailyIndex, measure: str, span: int, sports: list[str] | None = None
+) -> pd.Series:
+    """Calc exponentially weighted moving average of a daily measure."""
+    s = pd.Series(daily_values(idx, measure, sports), index=idx.days, name=measure)
+    return s.ewm(span=span, adjust=False).mean()
+
+
+@track_function_usage
+def sports_in_range(idx: DailyIndex, start: dt.date, end: dt.date) -> list[str]:
+    """List sports having activities in [start, end]."""
+    first = max(0, idx.day_no(start))
+    last = max(0, idx.day_no(end) + 1)
+    counts = idx.data[first:last, :, 0].sum(axis=0)
+    return [s for s, cnt in zip(idx.sports, counts, strict=True) if cnt > 0]
+
+
+@track_function_usage
+def year_to_date(idx: DailyIndex, sports: list[str] | None = None) -> pd.DataFrame:
+    """
+    Calc cumulative values per year and day of year, for all years at once.
+
+    Returns DataFrame with index (year, day_of_year) and columns
+    Count, Active Days, Hours, Kilometer, Elevation
+    """
+    days = idx.days
+    df = pd.DataFrame(
+        {
+            "year": days.year,
+            "day_of_year": days.dayofyear,
+            "Count": daily_values(idx, "Count", sports),
+            "Hours": daily_values(idx, "Minutes", sports) / 60,
+            "Kilometer": daily_values(idx, "Kilometer", sports),
+            "Elevation": daily_values(idx, "Elevation", sports),
+        }
+    )
+    df.insert(3, "Active Days", (df["Count"] > 0).astype(int))
+    df = df.set_index(["year", "day_of_year"])
+    return df.groupby(level="year").cumsum()
+
+
+@track_function_usage
+def year_to_date_at(df_ytd: pd.DataFrame, day_of_year: int) -> pd.DataFrame:
+    """
+    Select the year-to-date values of each year at the same day of year.
+
+    For years ending before day_of_year (non-leap years, current year), the last
+    day is used.
+    """
+    doy = df_ytd.index.get_level_values("day_of_year")
+    last_doy = (
+        doy.to_series().groupby(df_ytd.index.get_level_values("year")).transform("max")
+    )
+    mask = doy == np.minimum(day_of_year, last_doy.to_numpy())
+    return df_ytd.loc[mask].droplevel("day_of_year")
@@ -0,0 +1,306 @@
+"""Helper: Activity descriptions, fetched by a background job per user."""
+
+import datetime as dt
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass, field
+
+import streamlit as st
+
+from helper_activities_caching import (
+    get_act_desc_cache_file_path,
+    get_act_desc_db_path,
+)
+from helper_api import StravaRateLimitError, fetch_activity_description
+from helper_cache_stats import record_cache_access
+from helper_logging import get_logger_from_filename, track_function_usage
+from helper_tracing import start_trace, traced
+
+_LOGGER = get_logger_from_filename(__file__)
+
+# concurrent API calls, for all users
+DESC_WORKERS = 4
+# descriptions are re-fetched after 3 months
+DESC_RETENTION_DAYS = 90
+# descriptions fetched per batch, progress is saved after each batch
+DESC_BATCH_SIZE = 20
+
+_JOBS_LOCK = threading.Lock()
+
+
+def next_rate_limit_reset(now: dt.datetime) -> dt.datetime:
+    """
+    Return the next time Strava's 15-min rate-limit window resets.
+
+    Strava's short-term limit resets at :00/:15/:30/:45; a few seconds of buffer
+    are added to account for clock skew.
+    """
+    base = now.replace(second=0, microsecond=0)
+    minutes_to_next = 15 - (now.minute % 15)
+    return base + dt.timedelta(minutes=minutes_to_next, seconds=5)
+
+
+@track_function_usage
+def connect_descriptions_db() -> sqlite3.Connection:
+    """
+    Connect to the description store, creating it if needed.
+
+    WAL mode allows concurrent readers while one thread (or tab) writes.
+    """
+    p = get_act_desc_db_path()
+    p.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(p, timeout=10)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS descriptions (
+            user_id INTEGER NOT NULL,
+            activity_id INTEGER NOT NULL,
+            description TEXT NOT NULL,
+            fetched_at INTEGER NOT NULL,
+            PRIMARY KEY (user_id, activity_id)
+        )
+        """
+    )
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_fetched_at ON descriptions (fetched_at)"
+    )
+    return con
+
+
+def _expiry_timestamp() -> int:
+    return int(time.time()) - DESC_RETENTION_DAYS * 86400
+
+
+@track_function_usage
+def migrate_description_file(con: sqlite3.Connection, user_id: int) -> None:
+    """Import legacy JSON file of a user into the store and delete it."""
+    p = get_act_desc_cache_file_path(user_id)
+    if not p.exists():
+        return
+    fetched_at = int(p.stat().st_mtime)
+    d = json.loads(p.read_text())
+    with con:
+        con.executemany(
+            """
+            INSERT INTO descriptions VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id, activity_id) DO NOTHING
+            """,
+            [(user_id, int(k), v, fetched_at) for k, v in d.items()],
+        )
+    p.unlink()
+    _LOGGER.info("migrated %d descriptions of %s", len(d), user_id)
+
+
+@track_function_usage
+def load_descriptions(user_id: int) -> dict[int, str]:
+    """Load cached descriptions of a user, ignoring expired ones."""
+    with closing(connect_descriptions_db()) as con:
+        migrate_description_file(con, user_id)
+        rows = con.execute(
+            """
+            SELECT activity_id, description FROM descriptions
+            WHERE user_id = ? AND fetched_at >= ?
+            """,
+            (user_id, _expiry_timestamp()),
+        ).fetchall()
+    return dict(rows)
+
+
+@track_function_usage
+def save_descriptions(user_id: int, descriptions: dict[int, str]) -> None:
+    """Insert or update descriptions of a user."""
+    fetched_at = int(time.time())
+    with closing(connect_descriptions_db()) as con, con:
+        con.executemany(
+            """
+            INSERT INTO descriptions VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id, activity_id) DO UPDATE
+            SET description = excluded.description, fetched_at = excluded.fetched_at
+            """,
+            [(user_id, k, v, fetched_at) for k, v in descriptions.items()],
+        )
+
+
+@track_function_usage
+def sweep_descriptions() -> int:
+    """Delete descriptions older than 3 months, returns number of deleted ones."""
+    with closing(connect_descriptions_db()) as con, con:
+        cur = con.execute(
+            "DELETE FROM descriptions WHERE fetched_at < ?", (_expiry_timestamp(),)
+        )
+    _LOGGER.info("swept %d expired descriptions", cur.rowcount)
+    return cur.rowcount
+
+
+@st.cache_resource(ttl="1d")
+def run_description_maintenance() -> dt.datetime:
+    """Sweep expired descriptions, at most once a day per process."""
+    sweep_descriptions()
+    return dt.datetime.now(tz=dt.UTC)
+
+
+@dataclass
+class DescriptionJob:
+    """
+    Background fetching of missing activity descriptions of a user.
+
+    status: running, rate_limited (resumes at resume_at), done, failed
+    """
+
+    user_id: int
+    token: str
+    pending: list[int] = field(default_factory=list)
+    failed: set[int] = field(default_factory=set)
+    status: str = "running"
+    resume_at: dt.datetime | None = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+@st.cache_resource
+def get_description_jobs() -> dict[int, DescriptionJob]:
+    """Create cached dict of description job per user."""
+    return {}
+
+
+@st.cache_resource
+def get_description_executor() -> ThreadPoolExecutor:
+    """Create thread pool for the API calls of all description jobs."""
+    return ThreadPoolExecutor(max_workers=DESC_WORKERS, thread_name_prefix="desc")
+
+
+@track_function_usage
+def run_description_job(
+    job: DescriptionJob,
+    fetch: Callable[[int, str], str] = fetch_activity_description,
+    sleep: Callable[[float], None] = time.sleep,
+) -> None:
+    """
+    Fetch the pending descriptions in batches, until none are left.
+
+    On rate limit, sleep until the next Strava reset and continue.
+    On unexpected errors the status is set to failed.
+    """
+    executor = get_description_executor()
+    try:
+        while True:
+            with job.lock:
+                batch = job.pending[:DESC_BATCH_SIZE]
+                if not batch:
+                    job.status = "done"
+                    job.resume_at = None
+                    return
+                job.status = "running"
+                token = job.token
+            start = time.perf_counter_ns()
+            descriptions = {}
+            failed = set()
+            rate_limited = False
+            # one trace per batch, as a job might run for hours
+            with start_trace("description batch", job.user_id):
+                futures = {i: executor.submit(traced(fetch), i, token) for i in batch}
+                for activity_id, future in futures.items():
+                    try:
+                        descriptions[activity_id] = future.result()
+                    except StravaRateLimitError:
+                        rate_limited = True
+                    except Exception:
+                        _LOGGER.exception(
+                            "fetching description of %s failed", activity_id
+                        )
+                        failed.add(activity_id)
+            if descriptions:
+                save_descriptions(job.user_id, descriptions)
+            record_cache_access(
+                "fetch_activity_description",
+                job.user_id,
+                calls=len(descriptions) + len(failed),
+                misses=len(descriptions) + len(failed),
+                compute_ns=time.perf_counter_ns() - start,
+            )
+            resume_at = None
+            with job.lock:
+                job.pending = [
+                    i for i in job.pending if i not in descriptions and i not in failed
+                ]
+                job.failed |= failed
+                if rate_limited:
+                    job.status = "rate_limited"
+                    job.resume_at = next_rate_limit_reset(dt.datetime.now(tz=dt.UTC))
+                    resume_at = job.resume_at
+            if resume_at is not None:
+                _LOGGER.info("description job of %s paused", job.user_id)
+                sleep((resume_at - dt.datetime.now(tz=dt.UTC)).total_seconds())
+    except Exception:
+        # e.g. a locked or full SQLite store, restarted by start_description_job
+        _LOGGER.exception("description job of %s failed", job.user_id)
+        with job.lock:
+            job.status = "failed"
+            job.resume_at = None
+
+
+@track_function_usage
+def start_description_job(user_id: int, token: str, ids: list[int]) -> DescriptionJob:
+    """
+    Queue ids for fetching, starting the background job of the user if needed.
+
+    Ids that failed before are not retried.
+    """
+    jobs = get_description_jobs()
+    with _JOBS_LOCK:
+        job = jobs.get(user_id)
+        start = False
+        if job is None or job.status in {"done", "failed"}:
+            job = DescriptionJob(
+                user_id, token, failed=job.failed if job is not None else set()
+            )
+            jobs[user_id] = job
+            start = True
+        with job.lock:
+            job.token = token  # might have been refreshed
+            known = set(job.pending) | job.failed
+            job.pending.extend(i for i in ids if i not in known)
+    if start:
+        threading.Thread(
+            target=run_description_job,
+            args=(job,),
+            name=f"desc-job-{user_id}",
+            daemon=True,
+        ).start()
+    return job
+
+
+@st.fragment(run_every="5s")
+def description_job_status(job: DescriptionJob, ids: list[int]) -> None:
+    """Show progress of the background job, rerun the page when it is done."""
+    with job.lock:
+        status = job.status
+        resume_at = job.resume_at
+        pending = set(job.pending)
+    remaining = sum(1 for i in ids if i in pending)
+    total = len(ids)
+    if status == "done" or remaining == 0:
+        # attach the fetched descriptions
+        st.rerun()
+    now = dt.datetime.now(tz=dt.UTC)
+    if status == "failed":
+        st.error(
+            f"Fetching descriptions failed: {total - remaining} of {total} fetched. "
+            "Reload the page to retry."
+        )
+    elif status == "rate_limited" and resume_at is not None and now < resume_at:
+        mins, secs = divmod(int((resume_at - now).total_seconds()), 60)
+        st.warning(
+            f"Strava API rate limit reached: {total - remaining} of {total} "
+            f"descriptions fetched. Continuing automatically in {mins:02d}:{secs:02d}."
+        )
+    else:
+        st.progress(
+            (total - remaining) / total,
+            text=f"{total - remaining} of {total} descriptions fetched in background.",
+        )
@@ -0,0 +1,204 @@
+"""Helper: File exports, cached and optionally pre-built in background."""
+
+import datetime as dt
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.feather as pa_feather
+import pyarrow.parquet as pq
+import streamlit as st
+import xlsxwriter
+
+from helper_logging import get_logger_from_filename, track_function_usage
+
+_LOGGER = get_logger_from_filename(__file__)
+
+# number of export files to keep, for all users
+EXPORT_CACHE_SIZE = 20
+# exports of at least this number of rows are pre-built in background
+PREBUILD_MIN_ROWS = 1000
+EXPORT_WORKERS = 2
+# rows per record batch of streamed CSV
+CSV_BATCH_SIZE = 10_000
+
+
+@dataclass
+class ExportCache:
+    """Bounded LRU cache of export jobs, keyed by (user, data version, filter)."""
+
+    executor: ThreadPoolExecutor
+    max_entries: int = EXPORT_CACHE_SIZE
+    jobs: OrderedDict[Hashable, Future] = field(default_factory=OrderedDict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def submit(self, key: Hashable, fn: Callable[[], bytes]) -> Future:
+        """Get the job of key, start it in background if not cached."""
+        with self.lock:
+            job = self.jobs.get(key)
+            # retry failed jobs
+            if job is None or (job.done() and job.exception() is not None):
+                job = self.executor.submit(fn)
+                self.jobs[key] = job
+            self.jobs.move_to_end(key)
+            while len(self.jobs) > self.max_entries:
+                self.jobs.popitem(last=False)
+            return job
+
+
+@st.cache_resource
+def get_export_cache() -> ExportCache:
+    """Create export cache and its worker threads, shared by all sessions."""
+    return ExportCache(
+        ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+    )
+
+
+@track_function_usage
+def df_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Hash of index, columns and values, identifying the content of an export.
+
+    Values are hashed as well, as they can change in place, e.g. descriptions.
+    Columns of unhashable values (e.g. lists of lat/lon) are hashed as str.
+    """
+    h = hashlib.sha1(usedforsecurity=False)
+    h.update(pd.util.hash_pandas_object(df.index, index=False).to_numpy().tobytes())
+    h.update("\n".join(map(str, df.columns)).encode())
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        try:
+            values = pd.util.hash_pandas_object(col, index=False)
+        except TypeError:
+            values = pd.util.hash_pandas_object(col.astype(str), index=False)
+        h.update(values.to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _is_missing(value: object) -> bool:
+    return (
+        value is None
+        or value is pd.NaT
+        or (isinstance(value, float) and np.isnan(value))
+    )
+
+
+def _excel_value(value: object) -> object:
+    """Convert cell value to a type xlsxwriter can write, like pandas does."""
+    if _is_missing(value):
+        return None
+    if isinstance(value, (str, bool, int, dt.date, dt.datetime)):
+        return value
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    return str(value)
+
+
+@track_function_usage
+def excel_bytes(df: pd.DataFrame, *, exclude_index: bool) -> bytes:
+    """
+    Write DataFrame as Excel file, using xlsxwriter constant memory mode.
+
+    Rows are streamed to the worksheet one by one, so the workbook model is not
+    kept in memory.
+    """
+    if not exclude_index:
+        df = df.reset_index()
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(
+        buffer,
+        {
+            "constant_memory": True,
+            "remove_timezone": True,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
+        },
+    )
+    worksheet = workbook.add_worksheet("Sheet1")
+    header_format = workbook.add_format({"bold": True, "border": 1})
+    worksheet.write_row(0, 0, [str(c) for c in df.columns], header_format)
+    for row_no, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(row_no, 0, [_excel_value(v) for v in row])
+    workbook.close()
+    return buffer.getvalue()
+
+
+@track_function_usage
+def arrow_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Convert DataFrame without index to Arrow table.
+
+    Columns of mixed types, that Arrow can not convert, are converted to str.
+    """
+    arrays = []
+    for col in df.columns:
+        try:
+            arr = pa.Table.from_pandas(df[[col]], preserve_index=False).column(0)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arr = pa.array([None if _is_missing(v) else str(v) for v in df[col]])
+        arrays.append(arr)
+    return pa.table(arrays, names=[str(c) for c in df.columns])
+
+
+@track_function_usage
+def parquet_bytes(df: pd.DataFrame) -> bytes:
+    """Write DataFrame as Parquet file, via Arrow."""
+    sink = pa.BufferOutputStream()
+    pq.write_table(arrow_table(df), sink)
+    return sink.getvalue().to_pybytes()
+
+
+@track_function_usage
+def feather_bytes(df: pd.DataFrame) -> bytes:
+    """Write DataFrame as Feather (Arrow IPC) file."""
+    sink = pa.BufferOutputStream()
+    pa_feather.write_feather(arrow_table(df), sink)
+    return sink.getvalue().to_pybytes()
+
+
+@track_function_usage
+def csv_bytes(df: pd.DataFrame) -> bytes:
+    """
+    Write DataFrame as CSV file, streamed in record batches via Arrow.
+
+    Nested columns (e.g. lists of lat/lon) are written as str.
+    """
+    table = arrow_table(df)
+    for i, f in enumerate(table.schema):
+        if pa.types.is_nested(f.type):
+            values = [
+                None if v is None else str(v) for v in table.column(i).to_pylist()
+            ]
+            table = table.set_column(i, f.name, pa.array(values, type=pa.string()))
+    sink = pa.BufferOutputStream()
+    with pa_csv.CSVWriter(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=CSV_BATCH_SIZE):
+            writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+@track_function_usage
+def cached_export(
+    key: Hashable, fn: Callable[[], bytes], *, prebuild: bool = False
+) -> Callable[[], bytes]:
+    """
+    Get callable returning the cached export of key, for st.download_button.
+
+    With prebuild the export is started in background right away, else on click.
+    The DataFrame used by fn must not be modified afterwards.
+    """
+    cache = get_export_cache()
+    if prebuild:
+        cache.submit(key, fn)
+    return lambda: cache.submit(key, fn).result()
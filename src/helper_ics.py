@@ -0,0 +1,252 @@
+"""Helper: ICS calendar of activities and per-user subscribable feed file."""
+
+import datetime as dt
+import hashlib
+import hmac
+import os
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from helper import CACHE_TTL_ACTIVITIES
+from helper_activities_caching import (
+    get_activities_cache_key,
+    get_data_dir,
+)
+from helper_logging import get_logger_from_filename, track_function_usage
+
+_LOGGER = get_logger_from_filename(__file__)
+
+ICS_HEADER = """BEGIN:VCALENDAR
+CALSCALE:GREGORIAN
+VERSION:2.0
+X-WR-CALNAME:Strava Activity Export by entorb.net
+METHOD:PUBLISH
+"""
+ICS_FOOTER = "END:VCALENDAR"
+# number of events per yielded chunk
+ICS_CHUNK_SIZE = 500
+# lines that change on each generation, ignored when comparing events
+ICS_VOLATILE_LINES = ("DTSTAMP:", "LAST-MODIFIED:")
+ICS_UID_PREFIX = "UID:strava-id-"
+
+
+@track_function_usage
+def gen_ics_events(df: pd.DataFrame) -> pd.Series:
+    """
+    Generate VEVENT block per activity, dates in UTC.
+
+    Vectorized string operations, returns Series using activity id as index.
+    """
+    date_str_now = dt.datetime.now(tz=dt.UTC).strftime("%Y%m%dT%H%M%SZ")
+
+    # note I renamed Strava field start_date_local to start_date
+    start_date = df["start_date_local"] - pd.to_timedelta(df["utc_offset"], unit="s")
+    end_date = start_date + pd.to_timedelta(df["elapsed_time"], unit="s")
+    start_date_str = start_date.dt.strftime("%Y%m%dT%H%M%SZ")
+    end_date_str = end_date.dt.strftime("%Y%m%dT%H%M%SZ")
+
+    location = df["x_nearest_city_start"].fillna("").astype(str)
+    location = location.where(location != "", "unknown")
+    for col in ("location_city", "location_state", "location_country"):
+        values = df[col].fillna("").astype(str)
+        location += np.where(values != "", "," + values, "")
+
+    ids = df.index.astype(str)
+    minutes = df["x_min"].round().astype(int).astype(str)
+    # cspell:disable
+    return (
+        "BEGIN:VEVENT\n"
+        + ICS_UID_PREFIX
+        + ids
+        + "\nTRANSP:OPAQUE\nDTSTART:"
+        + start_date_str
+        + "\nDTEND:"
+        + end_date_str
+        + "\nCREATED:"
+        + end_date_str
+        + f"\nLAST-MODIFIED:{date_str_now}\nDTSTAMP:{date_str_now}\nSUMMARY:"
+        + df["type"]
+        + ": "
+        + df["name"]
+        + " ("
+        + minutes
+        + " min) (Strava)\nLOCATION:"
+        + location
+        + "\nURL;VALUE=URI:"
+        + df["x_url"]
+        + "\nDESCRIPTION:open at Strava: "
+        + df["x_url"]
+        + "\\n\\ngenerated via https://entorb.net/strava/\nSEQUENCE:0\nEND:VEVENT\n"
+    )  # cspell:enable
+
+
+@track_function_usage
+def iter_ics(events: pd.Series | list[str]) -> Iterator[str]:
+    """Yield calendar in ICS format in chunks of events."""
+    if isinstance(events, pd.Series):
+        events = events.tolist()
+    yield ICS_HEADER
+    for i in range(0, len(events), ICS_CHUNK_SIZE):
+        yield "".join(events[i : i + ICS_CHUNK_SIZE])
+    yield ICS_FOOTER
+
+
+@st.cache_resource(ttl=CACHE_TTL_ACTIVITIES, max_entries=100)
+@track_function_usage
+def cache_ics_events(cache_key: tuple[int, int, int], _df: pd.DataFrame) -> pd.Series:
+    """
+    Cache VEVENT blocks per activities cache key.
+
+    cache_resource: shared without copy, so callers must not modify it.
+    """
+    _LOGGER.info("cache_ics_events for %s", cache_key)
+    return gen_ics_events(_df)
+
+
+# feed file
+
+
+def ics_feed_configured() -> bool:
+    """Check if the ics_feed_secret is configured, feeds are disabled without it."""
+    return bool(st.secrets.get("ics_feed_secret"))
+
+
+@track_function_usage
+def get_ics_feed_path(user_id: int) -> Path:
+    """
+    Get path of the feed file of a user, in the (web-served) data dir.
+
+    The file name is a HMAC of the user id, so it can not be guessed.
+    Its key is a dedicated secret, so rotating the Strava client secret does not
+    change the subscribed URLs.
+    """
+    token = hmac.new(
+        str(st.secrets["ics_feed_secret"]).encode(),
+        str(user_id).encode(),
+        hashlib.sha256,
+    ).hexdigest()[:32]
+    return get_data_dir() / "ics" / f"{token}.ics"
+
+
+@track_function_usage
+def get_ics_feed_url(user_id: int) -> str | None:
+    """Get public URL of the feed file, None if no ics_feed_base_url is configured."""
+    base_url = st.secrets.get("ics_feed_base_url")
+    if not base_url:
+        return None
+    return f"{str(base_url).rstrip('/')}/ics/{get_ics_feed_path(user_id).name}"
+
+
+@track_function_usage
+def parse_ics_events(cont: str) -> dict[int, str]:
+    """Split ICS file content to VEVENT blocks per activity id, keeping the order."""
+    events = {}
+    for block in cont.split("BEGIN:VEVENT\n")[1:]:
+        block = "BEGIN:VEVENT\n" + block.split("END:VEVENT\n")[0] + "END:VEVENT\n"  # noqa: PLW2901
+        uid_line = next(
+            line for line in block.splitlines() if line.startswith(ICS_UID_PREFIX)
+        )
+        events[int(uid_line.removeprefix(ICS_UID_PREFIX))] = block
+    return events
+
+
+def _event_content(event: str) -> str:
+    return "\n".join(
+        line for line in event.splitlines() if not line.startswith(ICS_VOLATILE_LINES)
+    )
+
+
+@track_function_usage
+def patch_ics_events(events: dict[int, str], new_events: pd.Series) -> int:
+    """
+    Insert new and replace changed VEVENT blocks, in place.
+
+    Unchanged blocks are kept as they are, including their DTSTAMP.
+    Returns the number of inserted or replaced blocks.
+    """
+    num_changed = 0
+    for activity_id, event in new_events.items():
+        old = events.get(int(activity_id))  # type: ignore[arg-type]
+        if old is None or _event_content(old) != _event_content(event):
+            events[int(activity_id)] = event  # type: ignore[arg-type]
+            num_changed += 1
+    return num_changed
+
+
+@track_function_usage
+def write_ics_feed(path: Path, events: dict[int, str]) -> None:
+    """
+    Write feed file atomically, so subscribers never read a partial file.
+
+    The temp file has a unique name, as sessions of a user might write at once.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w",
+        encoding="utf-8",
+        newline="\n",
+        dir=path.parent,
+        prefix=f"{path.name}.",
+        suffix=".tmp",
+        delete=False,
+    ) as fh:
+        p_tmp = Path(fh.name)
+        try:
+            fh.writelines(iter_ics(list(events.values())))
+        except BaseException:
+            fh.close()
+            p_tmp.unlink()
+            raise
+    # readable by the web server, like files created by open()
+    p_tmp.chmod(0o644)
+    os.replace(p_tmp, path)  # noqa: PTH105
+
+
+@track_function_usage
+def enable_ics_feed(user_id: int, df: pd.DataFrame) -> None:
+    """Create the feed file of a user, from the loaded activities."""
+    events = cache_ics_events(get_activities_cache_key(), _df=df)
+    write_ics_feed(get_ics_feed_path(user_id), events.to_dict())  # type: ignore[arg-type]
+
+
+@track_function_usage
+def disable_ics_feed(user_id: int) -> None:
+    """Delete the feed file of a user."""
+    get_ics_feed_path(user_id).unlink(missing_ok=True)
+
+
+@st.cache_resource(ttl=CACHE_TTL_ACTIVITIES, max_entries=100)
+@track_function_usage
+def cache_ics_feed_update(cache_key: tuple[int, int, int], _df: pd.DataFrame) -> int:
+    """
+    Patch the feed file of a user, once per activities cache key.
+
+    Activities deleted at Strava are not removed from the feed.
+    Returns the number of changed events.
+    """
+    path = get_ics_feed_path(cache_key[0])
+    if not path.exists():
+        return 0
+    events = parse_ics_events(path.read_text(encoding="utf-8"))
+    num_changed = patch_ics_events(events, cache_ics_events(cache_key, _df=_df))
+    if num_changed:
+        _LOGGER.info("ics feed of %s: %d events changed", cache_key[0], num_changed)
+        write_ics_feed(path, events)
+    return num_changed
+
+
+@track_function_usage
+def update_ics_feed(user_id: int, df: pd.DataFrame) -> None:
+    """
+    Patch the feed file of a user, if the user has one.
+
+    Called with the just loaded activities by cache_all_activities_and_gears().
+    """
+    if not ics_feed_configured() or not get_ics_feed_path(user_id).exists():
+        return
+    cache_ics_feed_update(get_activities_cache_key(), _df=df)
@@ -0,0 +1,247 @@
+"""Helper: Import of activities, validation before posting to Strava."""
+
+import datetime as dt
+from pathlib import Path
+from typing import BinaryIO
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from helper_logging import get_logger_from_filename, track_function_usage
+
+_LOGGER = get_logger_from_filename(__file__)
+
+IMPORT_COLS = {
+    "Type": "object",
+    "Date": "datetime64[ns]",
+    "Duration (s)": "Int64",
+    "Distance (m)": "float64",
+    "Name": "object",
+    "Description": "object",
+    "Commute": "Int64",
+    "Elevation gain": "float64",
+    "Gear ID": "object",
+}
+REQUIRED_COLS = ("Type", "Date", "Duration (s)", "Name")
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# plausible value ranges, (min, max) inclusive
+VALUE_RANGES = {
+    "Duration (s)": (1, 7 * 24 * 3600),
+    "Distance (m)": (0, 2_000_000),
+    "Elevation gain": (0, 100_000),
+}
+_COMMUTE_TEXT = {"": 0, "0": 0, "1": 1, "false": 0, "true": 1, "no": 0, "yes": 1}
+
+# activities starting within this many seconds are exact duplicates
+DUPLICATE_TOLERANCE_S = 60
+# offset per activity type, to search all types in one sorted array
+_TYPE_OFFSET_S = 10**11
+
+
+def _type_keys(types: pd.Series, starts: pd.Series, categories: pd.Index) -> np.ndarray:
+    """Encode (type, start time in s) as int, ordered by type, then time."""
+    codes = pd.Categorical(types, categories=categories).codes.astype(np.int64)
+    seconds = starts.to_numpy(dtype="datetime64[s]").astype(np.int64)
+    return codes * _TYPE_OFFSET_S + seconds
+
+
+@track_function_usage
+def find_duplicates(
+    df_existing: pd.DataFrame,
+    types: pd.Series,
+    starts: pd.Series,
+    durations: pd.Series,
+) -> pd.DataFrame:
+    """
+    Check activities to import against existing ones of the same type.
+
+    df_existing: cached activities, with columns type, start_date_local and
+    elapsed_time
+    types, starts (local time), durations (s): the activities to import
+
+    Uses a sorted interval index of the existing activities and binary search
+    for all rows at once.
+    Returns DataFrame (index as of types) with columns
+    - Duplicate: "exact" (same start), "overlap" (overlapping time) or ""
+    - Existing: id of the matching existing activity
+    """
+    result = pd.DataFrame({"Duplicate": "", "Existing": pd.NA}, index=types.index)
+    result["Existing"] = result["Existing"].astype("Int64")
+    df_existing = df_existing[["type", "start_date_local", "elapsed_time"]].dropna()
+    if df_existing.empty or types.empty:
+        return result
+
+    categories = pd.Index(pd.unique(df_existing["type"]))
+    known = types.isin(categories).to_numpy() & starts.notna().to_numpy()
+
+    # interval index, sorted by start
+    ex_start = _type_keys(
+        df_existing["type"], df_existing["start_date_local"], categories
+    )
+    order = np.argsort(ex_start, kind="stable")
+    ex_start = ex_start[order]
+    ex_end = ex_start + df_existing["elapsed_time"].to_numpy(dtype=np.int64)[order]
+    ex_ids = df_existing.index.to_numpy()[order]
+    # position of max end of all intervals starting before, per type by offset
+    pos = np.arange(len(ex_end))
+    max_end_pos = np.maximum.accumulate(
+        np.where(ex_end == np.maximum.accumulate(ex_end), pos, 0)
+    )
+
+    start = _type_keys(types[known], starts[known].astype("datetime64[ns]"), categories)
+    end = start + durations[known].fillna(0).to_numpy(dtype=np.int64)
+
+    # exact: nearest existing start within tolerance
+    i = np.searchsorted(ex_start, start - DUPLICATE_TOLERANCE_S, side="left")
+    i_valid = np.minimum(i, len(ex_start) - 1)
+    exact = (i < len(ex_start)) & (
+        np.abs(ex_start[i_valid] - start) <= DUPLICATE_TOLERANCE_S
+    )
+
+    # overlap: an interval starting before our end, ending after our start
+    j = np.searchsorted(ex_start, end, side="left") - 1
+    j_valid = np.maximum(j, 0)
+    k = max_end_pos[j_valid]
+    overlap = (j >= 0) & (ex_end[k] > start) & ~exact
+
+    idx = types.index[known]
+    result.loc[idx[exact], "Duplicate"] = "exact"
+    result.loc[idx[exact], "Existing"] = ex_ids[i_valid[exact]]
+    result.loc[idx[overlap], "Duplicate"] = "overlap"
+    result.loc[idx[overlap], "Existing"] = ex_ids[k[overlap]]
+    return result
+
+
+@track_function_usage
+def read_import_workbook(file: BinaryIO | Path) -> pd.DataFrame:
+    """
+    Read first sheet of an import workbook, values as they are in the cells.
+
+    Uses openpyxl read-only mode, streaming the rows instead of loading the
+    workbook model. The header is in the first row, "*" marking required columns
+    is removed. Empty rows are skipped, the index is the row number in Excel.
+    Raises ValueError on missing columns.
+    """
+    wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(c or "").replace("*", "").strip() for c in next(rows, ())]
+        n = len(header)
+        data = []
+        row_nos = []
+        for row_no, row in enumerate(rows, start=2):
+            if any(v is not None and v != "" for v in row):
+                data.append((*row[:n], *(None,) * (n - len(row))))
+                row_nos.append(row_no)
+    finally:
+        wb.close()
+    missing = [c for c in IMPORT_COLS if c not in header]
+    if missing:
+        msg = f"Missing columns in Excel file: {missing}"
+        raise ValueError(msg)
+    df = pd.DataFrame(data, columns=header, index=pd.Index(row_nos, name="Row"))
+    return df[list(IMPORT_COLS)]
+
+
+def _text(s: pd.Series) -> pd.Series:
+    """Convert to stripped str, missing as ""."""
+    return s.where(s.notna(), "").astype(str).str.strip()
+
+
+def _dates(s: pd.Series) -> pd.Series:
+    """Parse Excel dates and texts of DATE_FORMAT, others as NaT."""
+    is_date = s.map(lambda v: isinstance(v, dt.datetime))
+    is_text = s.map(lambda v: isinstance(v, str))
+    parsed = pd.Series(pd.NaT, index=s.index, dtype="datetime64[ns]")
+    if is_date.any():
+        parsed[is_date] = pd.to_datetime(s[is_date])
+    if is_text.any():
+        parsed[is_text] = pd.to_datetime(
+            s[is_text].str.strip(), format=DATE_FORMAT, errors="coerce"
+        )
+    return parsed
+
+
+def _numbers(s: pd.Series) -> pd.Series:
+    """Convert to float, texts are parsed, bools are invalid (NaN)."""
+    s = s.mask(s.map(lambda v: isinstance(v, bool)), "invalid")
+    return pd.to_numeric(s, errors="coerce").astype("float64")
+
+
+@track_function_usage
+def validate_import(
+    df: pd.DataFrame, gear_ids: pd.Series | list[str]
+) -> tuple[pd.DataFrame, pd.Series]:
+    """
+    Validate and convert raw import rows, see read_import_workbook().
+
+    Checks required fields, types, date format, value ranges and gear ids,
+    each for all rows at once.
+    Returns DataFrame of IMPORT_COLS dtypes and per row errors, "" if valid.
+    """
+    checks: list[tuple[pd.Series, str]] = []
+    out = pd.DataFrame(index=df.index)
+    for col in ("Type", "Name", "Description", "Gear ID"):
+        out[col] = _text(df[col])
+    is_empty = {col: df[col].isna() | (_text(df[col]) == "") for col in df.columns}
+    checks.extend((is_empty[col], f"{col} missing") for col in REQUIRED_COLS)
+
+    out["Date"] = _dates(df["Date"])
+    checks.append(
+        (
+            out["Date"].isna() & ~is_empty["Date"],
+            "Date invalid, use 'YYYY-MM-DD HH:MM:SS'",
+        )
+    )
+
+    for col in ("Duration (s)", "Distance (m)", "Elevation gain"):
+        values = _numbers(df[col])
+        checks.append((values.isna() & ~is_empty[col], f"{col} is not a number"))
+        lo, hi = VALUE_RANGES[col]
+        checks.append(
+            (~values.between(lo, hi) & values.notna(), f"{col} not in {lo}..{hi}")
+        )
+        out[col] = values
+    out["Duration (s)"] = out["Duration (s)"].round().astype("Int64")
+
+    commute = _text(df["Commute"]).str.lower().map(_COMMUTE_TEXT)
+    commute = commute.fillna(_numbers(df["Commute"]).where(lambda x: x.isin([0, 1])))
+    checks.append((commute.isna(), "Commute must be 0 or 1"))
+    out["Commute"] = commute.fillna(0).astype("Int64")
+
+    checks.append(
+        (
+            (out["Gear ID"] != "") & ~out["Gear ID"].isin(list(gear_ids)),
+            "Gear ID unknown",
+        )
+    )
+
+    errors = pd.Series("", index=df.index)
+    for mask, msg in checks:
+        errors = errors.mask(mask.to_numpy(dtype=bool), errors + msg + "; ")
+    return out[list(IMPORT_COLS)], errors.str.removesuffix("; ")
+
+
+@track_function_usage
+def activity_params(df: pd.DataFrame) -> dict[object, dict]:
+    """Convert rows of IMPORT_COLS to post_activity() parameters, per index."""
+    commute = df["Commute"].fillna(0).astype(bool)
+    df = df.astype(object).where(df.notna(), None)
+    params = pd.DataFrame(
+        {
+            "act_type": df["Type"].astype(str),
+            "name": df["Name"].astype(str),
+            "date": pd.to_datetime(df["Date"]).dt.strftime(DATE_FORMAT),
+            "duration": df["Duration (s)"].astype(int),
+            "distance": df["Distance (m)"],
+            "desc": df["Description"].where(df["Description"] != "", None),
+            "commute": commute,
+            "gear_id": df["Gear ID"].where(df["Gear ID"] != "", None),
+            "elev_gain": df["Elevation gain"].map(
+                lambda v: int(v) if v else None  # type: ignore[arg-type]
+            ),
+        },
+        index=df.index,
+    )
+    return params.astype(object).where(params.notna(), None).to_dict(orient="index")
@@ -1,14 +1,28 @@
 """Helper: Logging."""
 
 import logging
-import time
-from collections import defaultdict
+import os
+import threading
 from collections.abc import Callable
 from functools import wraps
 from pathlib import Path
+from time import perf_counter_ns
 
 import streamlit as st
 
+from helper_metrics import get_histogram
+
+# set to "0" to not wrap functions by track_function_usage at all
+INSTRUMENTATION_ENABLED = os.environ.get("TRACK_FUNCTION_USAGE", "1") != "0"
+
+# per thread call counters: function name -> [calls, timed calls, time in ns]
+# each thread writes its own counters only, they are summed up on read
+_STATS_LOCK = threading.Lock()
+_thread_counters: list[tuple[threading.Thread, dict[str, list[int]]]] = []
+# counters of finished threads
+_retired_counters: dict[str, list[int]] = {}
+_local = threading.local()
+
 
 def init_logging() -> None:
     """Initialize and and configure the logging."""
@@ -31,10 +45,59 @@ def get_logger_from_filename(file: str) -> logging.Logger:
     return logging.getLogger(page)
 
 
-@st.cache_resource
-def get_call_stats() -> defaultdict[str, dict[str, int | float]]:
-    """Create cached dict of call stats."""
-    return defaultdict(lambda: {"calls": 0, "total_time": 0.0})
+def _merge_counters(
+    target: dict[str, list[int]], counters: dict[str, list[int]]
+) -> None:
+    for name, c in list(counters.items()):
+        t = target.setdefault(name, [0, 0, 0])
+        for i, v in enumerate(c):
+            t[i] += v
+
+
+def _retire_dead_threads() -> None:
+    """Fold counters of finished threads into the retired ones, needs lock."""
+    alive = []
+    for thread, counters in _thread_counters:
+        if thread.is_alive():
+            alive.append((thread, counters))
+        else:
+            _merge_counters(_retired_counters, counters)
+    _thread_counters[:] = alive
+
+
+def _get_thread_counters() -> dict[str, list[int]]:
+    """Get counters of current thread, registering them on first use."""
+    try:
+        return _local.counters
+    except AttributeError:
+        counters: dict[str, list[int]] = {}
+        with _STATS_LOCK:
+            # Streamlit starts a new thread per script run
+            _retire_dead_threads()
+            _thread_counters.append((threading.current_thread(), counters))
+        _local.counters = counters
+        return counters
+
+
+def get_call_stats() -> dict[str, dict[str, int | float]]:
+    """
+    Get call stats of all threads: calls and total_time (s) per function.
+
+    For sampled functions the total time is extrapolated from the timed calls.
+    """
+    with _STATS_LOCK:
+        _retire_dead_threads()
+        totals: dict[str, list[int]] = {}
+        _merge_counters(totals, _retired_counters)
+        for _thread, counters in _thread_counters:
+            _merge_counters(totals, counters)
+    return {
+        name: {
+            "calls": calls,
+            "total_time": ns / 1e9 * calls / timed if timed else 0.0,
+        }
+        for name, (calls, timed, ns) in totals.items()
+    }
 
 
 @st.cache_resource
@@ -49,17 +112,44 @@ def get_page_count() -> dict[str, int]:
     return {}
 
 
-def track_function_usage(func: Callable) -> Callable:
-    """Annotation for gathering runtime statistics."""
+def track_function_usage(
+    func: Callable | None = None, *, sample_every: int = 1, latency: bool = False
+) -> Callable:
+    """
+    Annotation for gathering runtime statistics.
+
+    All calls are counted, but only every sample_every-th call is timed, to keep
+    the overhead low for hot functions:
+    @track_function_usage(sample_every=100)
+    latency: record timed calls in a latency histogram as well, which takes a
+    lock, so only for reported functions, e.g. the Strava API calls
+    """
+    if func is None:
+        return lambda f: track_function_usage(
+            f, sample_every=sample_every, latency=latency
+        )
+    if not INSTRUMENTATION_ENABLED:
+        return func
+    name = func.__name__
+    hist = get_histogram("function", name) if latency else None
 
     @wraps(func)
     def wrapper(*args: object, **kwargs: object) -> object:
-        start_time = time.time()
-        result = func(*args, **kwargs)  # Call the original function
-        end_time = time.time()
-        call_stats = get_call_stats()
-        call_stats[func.__name__]["calls"] += 1
-        call_stats[func.__name__]["total_time"] += end_time - start_time
-        return result
+        counters = _get_thread_counters()
+        c = counters.get(name)
+        if c is None:
+            c = counters[name] = [0, 0, 0]
+        c[0] += 1
+        if c[0] % sample_every:
+            return func(*args, **kwargs)
+        start = perf_counter_ns()
+        try:
+            return func(*args, **kwargs)  # Call the original function
+        finally:
+            elapsed = perf_counter_ns() - start
+            c[2] += elapsed
+            c[1] += 1
+            if hist is not None:
+                hist.record(elapsed)
 
     return wrapper
@@ -0,0 +1,136 @@
+"""Helper: Memory accounting of page runs, process RSS and sampled tracemalloc."""
+
+import os
+import random
+import threading
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+
+from helper_cache_stats import get_cache_stats
+from helper_logging import get_logger_from_filename
+from helper_sessions import get_session_stats
+
+_LOGGER = get_logger_from_filename(__file__)
+
+# fraction of page runs traced by tracemalloc, as it slows down allocations
+TRACEMALLOC_FRACTION_ENV = "STRAVA_TRACEMALLOC_FRACTION"
+TRACEMALLOC_FRACTION = float(os.environ.get(TRACEMALLOC_FRACTION_ENV) or "0.02")
+
+# tracemalloc is per process, so only one run is traced at a time
+_TRACE_LOCK = threading.Lock()
+_STATS_LOCK = threading.Lock()
+_page_memory: dict[str, "PageMemory"] = {}
+
+
+def process_memory() -> dict[str, int]:
+    """Get current (VmRSS) and peak (VmHWM) resident memory in bytes, Linux only."""
+    p = Path("/proc/self/status")
+    if not p.exists():
+        return {}
+    d = {}
+    for line in p.read_text().splitlines():
+        key, _, value = line.partition(":")
+        if key in {"VmRSS", "VmHWM"}:
+            d[key] = int(value.split()[0]) * 1024
+    return d
+
+
+@dataclass
+class PageMemory:
+    """
+    Memory of the runs of a page, in bytes.
+
+    rss_growth: growth of process RSS during a run, of all threads
+    traced_peak: peak of Python allocations during a traced run, of all threads,
+    as tracemalloc is per process
+    """
+
+    runs: int = 0
+    traced_runs: int = 0
+    rss_growth_max: int = 0
+    traced_peak_max: int = 0
+    traced_peak_last: int = 0
+
+
+@dataclass
+class MemoryRun:
+    """Memory of one page run, traced_peak only for traced runs."""
+
+    rss_start: int
+    rss_end: int = 0
+    traced_peak: int | None = None
+
+
+def _record(page: str, run: MemoryRun) -> None:
+    with _STATS_LOCK:
+        m = _page_memory.setdefault(page, PageMemory())
+        m.runs += 1
+        m.rss_growth_max = max(m.rss_growth_max, run.rss_end - run.rss_start)
+        if run.traced_peak is not None:
+            m.traced_runs += 1
+            m.traced_peak_last = run.traced_peak
+            m.traced_peak_max = max(m.traced_peak_max, run.traced_peak)
+
+
+@contextmanager
+def measure_page_memory(page: str) -> Iterator[MemoryRun]:
+    """
+    Measure process RSS of a page run, and trace a fraction of the runs.
+
+    Traced runs record the peak of traced memory.
+    """
+    run = MemoryRun(process_memory().get("VmRSS", 0))
+    traced = (
+        random.random() < TRACEMALLOC_FRACTION  # noqa: S311
+        and not tracemalloc.is_tracing()
+        and _TRACE_LOCK.acquire(blocking=False)
+    )
+    if traced:
+        tracemalloc.start()
+    try:
+        yield run
+    finally:
+        if traced:
+            run.traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            _TRACE_LOCK.release()
+        run.rss_end = process_memory().get("VmRSS", 0)
+        _record(page, run)
+
+
+def get_page_memory() -> pd.DataFrame:
+    """Get memory per page, in MB."""
+    with _STATS_LOCK:
+        rows = [
+            {
+                "page": page,
+                "runs": m.runs,
+                "traced_runs": m.traced_runs,
+                "rss_growth_max": m.rss_growth_max / 1_048_576,
+                "traced_peak_max": m.traced_peak_max / 1_048_576,
+                "traced_peak_last": m.traced_peak_last / 1_048_576,
+            }
+            for page, m in _page_memory.items()
+        ]
+    return pd.DataFrame(rows).set_index("page") if rows else pd.DataFrame()
+
+
+def get_memory_attribution() -> pd.DataFrame:
+    """
+    Get estimated MB per user of cache entries and session_state.
+
+    cache: latest entry per cached function, see get_cache_stats()
+    session_state: all sessions of the user, see get_session_stats()
+    """
+    df = get_cache_stats()
+    cache = df.dropna(subset=["user"]).groupby("user")["size_bytes"].sum() / 1_048_576
+    df = get_session_stats()
+    session = df.dropna(subset=["user"]).groupby("user")["MB"].sum()
+    df = pd.DataFrame({"cache": cache, "session_state": session}).fillna(0)
+    df["total"] = df.sum(axis=1)
+    return df.sort_values("total", ascending=False)
@@ -0,0 +1,172 @@
+"""Helper: Latency histograms of functions and pages, over sliding windows."""
+
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from helper_tracing import span
+
+# log-linear buckets: 2**SUB_BITS buckets per power of 2, ~6% relative error
+SUB_BITS = 4
+_SUB = 1 << SUB_BITS
+# values are recorded in µs, larger ones (> 1 day) go into the last bucket
+MAX_BUCKET = ((36 - SUB_BITS) + 1) * _SUB + _SUB - 1
+# sliding windows are built from 1-min slots, kept for 1 h
+SLOT_S = 60
+NUM_SLOTS = 60
+WINDOWS = {"5 min": 300, "1 h": 3600}
+PERCENTILES = (50, 95, 99)
+# time of a page run not spent in any phase
+PHASE_RENDERING = "rendering"
+
+_REGISTRY_LOCK = threading.Lock()
+_histograms: dict[tuple[str, str], "LatencyHistogram"] = {}
+_local = threading.local()
+
+
+def bucket_index(value: int) -> int:
+    """Get bucket of value, exact below 2**(SUB_BITS+1)."""
+    if value < 2 * _SUB:
+        return max(value, 0)
+    shift = value.bit_length() - SUB_BITS - 1
+    return min((shift + 1) * _SUB + (value >> shift) - _SUB, MAX_BUCKET)
+
+
+def bucket_upper_bound(index: int) -> int:
+    """Get largest value of bucket."""
+    if index < 2 * _SUB:
+        return index
+    shift = index // _SUB - 1
+    return ((index % _SUB + _SUB + 1) << shift) - 1
+
+
+@dataclass
+class _Slot:
+    counts: dict[int, int] = field(default_factory=dict)
+    max_us: int = 0
+
+
+@dataclass
+class LatencyHistogram:
+    """HDR-style histogram of durations in µs, per 1-min slot."""
+
+    slots: dict[int, _Slot] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record(self, duration_ns: int, now: float | None = None) -> None:
+        """Add a duration."""
+        value = duration_ns // 1000
+        slot_no = int((time.monotonic() if now is None else now) // SLOT_S)
+        with self.lock:
+            slot = self.slots.get(slot_no)
+            if slot is None:
+                slot = self.slots[slot_no] = _Slot()
+                for old in [k for k in self.slots if k <= slot_no - NUM_SLOTS]:
+                    del self.slots[old]
+            i = bucket_index(value)
+            slot.counts[i] = slot.counts.get(i, 0) + 1
+            slot.max_us = max(slot.max_us, value)
+
+    def summary(self, window_s: int, now: float | None = None) -> dict[str, float]:
+        """Get count, p50, p95, p99 and max in ms of the last window_s seconds."""
+        slot_min = int((time.monotonic() if now is None else now) // SLOT_S) - (
+            window_s // SLOT_S
+        )
+        counts: dict[int, int] = {}
+        max_us = 0
+        with self.lock:
+            for slot_no, slot in self.slots.items():
+                if slot_no > slot_min:
+                    for i, n in slot.counts.items():
+                        counts[i] = counts.get(i, 0) + n
+                    max_us = max(max_us, slot.max_us)
+        total = sum(counts.values())
+        buckets = sorted(counts.items())
+        d: dict[str, float] = {"count": total}
+        for p in PERCENTILES:
+            d[f"p{p}"] = 0.0
+            cum = 0
+            for i, n in buckets:
+                cum += n
+                if cum >= total * p / 100:
+                    d[f"p{p}"] = min(bucket_upper_bound(i), max_us) / 1000
+                    break
+        d["max"] = max_us / 1000
+        return d
+
+
+def get_histogram(kind: str, name: str) -> LatencyHistogram:
+    """Get histogram of a function, page or phase, creating it if needed."""
+    key = (kind, name)
+    hist = _histograms.get(key)
+    if hist is None:
+        with _REGISTRY_LOCK:
+            hist = _histograms.setdefault(key, LatencyHistogram())
+    return hist
+
+
+def get_latency_stats(kind: str, window_s: int) -> dict[str, dict[str, float]]:
+    """Get summary per name of all histograms of kind, skipping empty ones."""
+    with _REGISTRY_LOCK:
+        hists = [(n, h) for (k, n), h in _histograms.items() if k == kind]
+    stats = {name: hist.summary(window_s) for name, hist in hists}
+    return {name: d for name, d in stats.items() if d["count"]}
+
+
+@dataclass
+class PageRun:
+    """Timing of one page run, phases in ns (self time, without nested phases)."""
+
+    page: str
+    start_ns: int
+    duration_ns: int = 0
+    phases: dict[str, int] = field(default_factory=dict)
+    # time in nested phases, per open phase
+    stack: list[list[int]] = field(default_factory=list)
+
+
+@contextmanager
+def track_page_run(page: str) -> Iterator[PageRun]:
+    """
+    Time a page run and its phases, recorded in the page and phase histograms.
+
+    The time not spent in a phase is recorded as rendering.
+    """
+    run = PageRun(page, time.perf_counter_ns())
+    _local.run = run
+    try:
+        yield run
+    finally:
+        _local.run = None
+        run.duration_ns = time.perf_counter_ns() - run.start_ns
+        run.phases[PHASE_RENDERING] = run.duration_ns - sum(run.phases.values())
+        get_histogram("page", page).record(run.duration_ns)
+        for phase, ns in run.phases.items():
+            get_histogram("phase", f"{page}: {phase}").record(ns)
+
+
+@contextmanager
+def measure_phase(phase: str) -> Iterator[None]:
+    """
+    Add time to a phase of the current page run, no-op outside of page runs.
+
+    Each phase is a span of the trace as well.
+    """
+    run: PageRun | None = getattr(_local, "run", None)
+    with span(phase):
+        if run is None:
+            yield
+            return
+        frame = [0]
+        run.stack.append(frame)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            run.stack.pop()
+            run.phases[phase] = run.phases.get(phase, 0) + elapsed - frame[0]
+            if run.stack:
+                run.stack[-1][0] += elapsed
@@ -0,0 +1,221 @@
+"""Helper: Export of app performance counters in Prometheus text format."""
+
+import datetime as dt
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import streamlit as st
+
+from helper_api import get_rate_budget
+from helper_cache_stats import get_cache_stats
+from helper_logging import (
+    get_call_stats,
+    get_logger_from_filename,
+    get_page_count,
+    get_user_login_count,
+    track_function_usage,
+)
+from helper_memory import get_page_memory, process_memory
+from helper_metrics import PERCENTILES, get_latency_stats
+
+_LOGGER = get_logger_from_filename(__file__)
+
+# file for the node-exporter textfile collector, outside of the web-served dirs
+METRICS_FILE_ENV = "STRAVA_METRICS_FILE"
+METRICS_FILE_DEFAULT = "./metrics/strava_app.prom"
+# window of the latency quantiles
+METRICS_WINDOW_S = 300
+PREFIX = "strava_app"
+API_FUNCTIONS = {"_api_get": "GET", "_api_post": "POST", "_api_put": "PUT"}
+
+
+def get_metrics_file_path() -> Path:
+    """Get path of metrics file, env STRAVA_METRICS_FILE overrides the default."""
+    return Path(os.environ.get(METRICS_FILE_ENV) or METRICS_FILE_DEFAULT)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+@dataclass
+class _MetricsWriter:
+    """Collect lines of metric families."""
+
+    lines: list[str] = field(default_factory=list)
+
+    def family(
+        self,
+        name: str,
+        metric_type: str,
+        help_text: str,
+        samples: list[tuple[dict[str, str], float]],
+    ) -> None:
+        """Add a metric family, counters get the suffix _total."""
+        name = f"{PREFIX}_{name}"
+        if metric_type == "counter":
+            name += "_total"
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            label_str = f"{{{label_str}}}" if label_str else ""
+            self.lines.append(f"{name}{label_str} {value}")
+
+    def text(self) -> str:
+        """Get exposition text, format 0.0.4 of the textfile collector."""
+        return "\n".join([*self.lines, ""])
+
+
+def _quantile_samples(
+    stats: dict[str, dict[str, float]], label: str
+) -> list[tuple[dict[str, str], float]]:
+    return [
+        ({label: name, "quantile": str(p / 100)}, d[f"p{p}"] / 1000)
+        for name, d in stats.items()
+        for p in PERCENTILES
+    ]
+
+
+@track_function_usage
+def prometheus_text() -> str:
+    """Get all counters, gauges and summaries in Prometheus text format."""
+    w = _MetricsWriter()
+    call_stats = get_call_stats()
+    w.family(
+        "function_calls",
+        "counter",
+        "Calls of tracked functions.",
+        [({"function": k}, v["calls"]) for k, v in call_stats.items()],
+    )
+    w.family(
+        "function_seconds",
+        "counter",
+        "Time spent in tracked functions.",
+        [({"function": k}, v["total_time"]) for k, v in call_stats.items()],
+    )
+    w.family(
+        "page_views",
+        "counter",
+        "Runs of report pages.",
+        [({"page": k}, v) for k, v in get_page_count().items()],
+    )
+    page_stats = get_latency_stats("page", METRICS_WINDOW_S)
+    w.family(
+        "page_latency_seconds",
+        "summary",
+        f"Quantiles of page run time over the last {METRICS_WINDOW_S}s.",
+        _quantile_samples(page_stats, "page"),
+    )
+    logins = get_user_login_count()
+    w.family("logins", "counter", "User logins.", [({}, sum(logins.values()))])
+    w.family("users", "gauge", "Distinct users logged in.", [({}, len(logins))])
+
+    df_cache = (
+        get_cache_stats()
+        .groupby("function")[["hits", "misses", "evictions", "compute_time"]]
+        .sum()
+    )
+    for col, help_text in (
+        ("hits", "Calls of cached functions served from cache."),
+        ("misses", "Calls of cached functions computed."),
+        ("evictions", "Re-computations after expiry or eviction."),
+    ):
+        w.family(
+            f"cache_{col}",
+            "counter",
+            help_text,
+            [({"function": k}, int(v)) for k, v in df_cache[col].items()],
+        )
+    w.family(
+        "cache_compute_seconds",
+        "counter",
+        "Time spent computing cache misses.",
+        [({"function": k}, v) for k, v in df_cache["compute_time"].items()],
+    )
+
+    # Strava API
+    w.family(
+        "api_calls",
+        "counter",
+        "Calls to the Strava API.",
+        [
+            ({"method": method}, call_stats[fct]["calls"])
+            for fct, method in API_FUNCTIONS.items()
+            if fct in call_stats
+        ],
+    )
+    api_stats = get_latency_stats("function", METRICS_WINDOW_S)
+    w.family(
+        "api_latency_seconds",
+        "summary",
+        f"Quantiles of Strava API call time over the last {METRICS_WINDOW_S}s.",
+        _quantile_samples(
+            {m: api_stats[f] for f, m in API_FUNCTIONS.items() if f in api_stats},
+            "method",
+        ),
+    )
+    budget = get_rate_budget()
+    if budget.updated is not None:
+        windows = ("15min", "daily")
+        w.family(
+            "api_rate_limit",
+            "gauge",
+            "Strava API rate limit of the app.",
+            [({"window": k}, v) for k, v in zip(windows, budget.limit, strict=True)],
+        )
+        w.family(
+            "api_rate_usage",
+            "gauge",
+            "Strava API rate limit usage of the app.",
+            [({"window": k}, v) for k, v in zip(windows, budget.usage, strict=True)],
+        )
+
+    mem = process_memory()
+    if mem:
+        w.family(
+            "memory_rss_bytes",
+            "gauge",
+            "Resident memory of the process.",
+            [({}, mem["VmRSS"])],
+        )
+        w.family(
+            "memory_rss_peak_bytes",
+            "gauge",
+            "Peak resident memory of the process.",
+            [({}, mem["VmHWM"])],
+        )
+    df_mem = get_page_memory()
+    if not df_mem.empty:
+        w.family(
+            "page_traced_peak_bytes",
+            "gauge",
+            "Max peak of traced Python allocations of the process during a page "
+            "run, sampled runs only.",
+            [
+                ({"page": k}, int(v * 1_048_576))
+                for k, v in df_mem["traced_peak_max"].items()
+                if v
+            ],
+        )
+    return w.text()
+
+
+@track_function_usage
+def write_metrics_file(p: Path) -> None:
+    """Write metrics file atomically, so the collector never reads partial files."""
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p_tmp = p.with_suffix(".tmp")
+    p_tmp.write_text(prometheus_text(), encoding="utf-8")
+    p_tmp.replace(p)
+
+
+@st.cache_resource(ttl="15s")
+def export_metrics() -> dt.datetime:
+    """Update the metrics file, at most every 15s per process."""
+    try:
+        write_metrics_file(get_metrics_file_path())
+    except OSError:
+        _LOGGER.exception("writing metrics file failed")
+    return dt.datetime.now(tz=dt.UTC)
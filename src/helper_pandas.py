@@ -14,3 +14,31 @@ def reorder_cols(df: pd.DataFrame, col_first: list[str]) -> pd.DataFrame:
     col_first = [col for col in col_first if col in cols]
     cols = [col for col in cols if col not in col_first]
     return df.loc[:, col_first + cols]
+
+
+@track_function_usage
+def paginate_df(  # noqa: PLR0913
+    df: pd.DataFrame,
+    cols: list[str],
+    sort_col: str | None,
+    *,
+    ascending: bool,
+    page: int,
+    page_size: int,
+) -> pd.DataFrame:
+    """
+    Sort by a single column and return the projected rows of one page.
+
+    Only the sort column is sorted, the projection is applied to the page rows only.
+    page starts at 1
+    """
+    start = (page - 1) * page_size
+    if sort_col is None:
+        positions = range(start, min(start + page_size, len(df)))
+        return df.iloc[positions].loc[:, cols]
+    index = (
+        df[sort_col]
+        .sort_values(ascending=ascending, na_position="last", kind="stable")
+        .index[start : start + page_size]
+    )
+    return df.loc[index, cols]
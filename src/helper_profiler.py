@@ -0,0 +1,222 @@
+"""Helper: On-demand profiling of a single page run, armed in r99."""
+
+import cProfile
+import datetime as dt
+import marshal
+import pstats
+import sys
+import threading
+from collections import Counter, deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import FrameType
+
+import pandas as pd
+import streamlit as st
+
+from helper_logging import get_logger_from_filename
+
+_LOGGER = get_logger_from_filename(__file__)
+
+PROFILE_MODES = ("cProfile", "sampling")
+SAMPLE_INTERVAL_S = 0.005
+# results kept, for all users
+MAX_RESULTS = 10
+TOP_N = 50
+
+
+@dataclass
+class ProfileRequest:
+    """Profile the next run of page, by user_id or by anyone if None."""
+
+    page: str
+    user_id: int | None
+    mode: str
+
+
+@dataclass
+class ProfileResult:
+    """
+    Result of a profiled page run.
+
+    top: functions by cumulative time (cProfile) or share of samples (sampling)
+    collapsed: stacks in collapsed format, for flamegraph.pl or speedscope
+    prof: pstats file (cProfile only), e.g. for snakeviz
+    """
+
+    page: str
+    user_id: int | None
+    mode: str
+    started: dt.datetime
+    duration_s: float = 0.0
+    top: pd.DataFrame = field(default_factory=pd.DataFrame)
+    collapsed: str = ""
+    prof: bytes = b""
+
+
+@dataclass
+class ProfilerState:
+    """Pending requests and latest results, shared by all sessions."""
+
+    requests: list[ProfileRequest] = field(default_factory=list)
+    results: deque[ProfileResult] = field(
+        default_factory=lambda: deque(maxlen=MAX_RESULTS)
+    )
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # only one profiler at a time per process
+    busy: threading.Lock = field(default_factory=threading.Lock)
+
+
+@st.cache_resource
+def get_profiler_state() -> ProfilerState:
+    """Create cached profiler state."""
+    return ProfilerState()
+
+
+def request_profile(page: str, user_id: int | None, mode: str) -> None:
+    """Arm the profiler for the next run of page."""
+    state = get_profiler_state()
+    with state.lock:
+        state.requests.append(ProfileRequest(page, user_id, mode))
+
+
+def _take_request(page: str, user_id: int | None) -> ProfileRequest | None:
+    state = get_profiler_state()
+    with state.lock:
+        for req in state.requests:
+            if req.page == page and req.user_id in {None, user_id}:
+                state.requests.remove(req)
+                return req
+    return None
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).stem}:{code.co_name}"
+
+
+def _collapse(frame: FrameType | None) -> str:
+    """Stack of frame as 'outer;...;inner'."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+@dataclass
+class StackSampler:
+    """Sample the stack of a thread periodically, in a background thread."""
+
+    thread_id: int
+    interval_s: float = SAMPLE_INTERVAL_S
+    stacks: Counter[str] = field(default_factory=Counter)
+    stop: threading.Event = field(default_factory=threading.Event)
+
+    def run(self) -> None:
+        """Sample until stopped."""
+        while not self.stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)  # noqa: SLF001
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def collapsed(self) -> str:
+        """Get stacks in collapsed format: 'outer;...;inner count' per line."""
+        return "".join(f"{s} {n}\n" for s, n in self.stacks.most_common())
+
+    def top(self) -> pd.DataFrame:
+        """Get functions by share of samples they are on the stack (cumulative)."""
+        total = sum(self.stacks.values())
+        cumulative: Counter[str] = Counter()
+        own: Counter[str] = Counter()
+        for stack, n in self.stacks.items():
+            names = stack.split(";")
+            for name in set(names):
+                cumulative[name] += n
+            own[names[-1]] += n
+        df = pd.DataFrame(
+            {
+                "function": list(cumulative),
+                "samples": list(cumulative.values()),
+                "own_samples": [own[name] for name in cumulative],
+            }
+        )
+        df["cumulative_%"] = (100 * df["samples"] / max(total, 1)).round(1)
+        return df.sort_values("samples", ascending=False).head(TOP_N)
+
+
+def pstats_top(stats: pstats.Stats) -> pd.DataFrame:
+    """Get functions by cumulative time."""
+    rows = [
+        {
+            "function": f"{Path(file).stem}:{line}({name})",
+            "calls": nc,
+            "tottime": tt,
+            "cumtime": ct,
+        }
+        for (file, line, name), (_cc, nc, tt, ct, _callers) in (
+            stats.stats.items()  # type: ignore[attr-defined]
+        )
+    ]
+    df = pd.DataFrame(rows, columns=["function", "calls", "tottime", "cumtime"])
+    return df.sort_values("cumtime", ascending=False).head(TOP_N).round(4)
+
+
+@contextmanager
+def _cprofile(result: ProfileResult) -> Iterator[None]:
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        stats = pstats.Stats(profiler)
+        result.top = pstats_top(stats)
+        # same format as pstats.Stats.dump_stats()
+        result.prof = marshal.dumps(stats.stats)  # type: ignore[attr-defined]
+
+
+@contextmanager
+def _sample(result: ProfileResult) -> Iterator[None]:
+    sampler = StackSampler(threading.get_ident())
+    thread = threading.Thread(target=sampler.run, name="profiler", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        sampler.stop.set()
+        thread.join(timeout=1)
+        result.top = sampler.top()
+        result.collapsed = sampler.collapsed()
+
+
+@contextmanager
+def profile_page_run(page: str, user_id: int | None) -> Iterator[None]:
+    """
+    Profile this run of page, if requested, and store the result.
+
+    Results are stored on st.stop() and st.rerun() as well.
+    """
+    req = _take_request(page, user_id)
+    state = get_profiler_state()
+    if req is None or not state.busy.acquire(blocking=False):
+        if req is not None:
+            # another run is profiled, retry next time
+            with state.lock:
+                state.requests.append(req)
+        yield
+        return
+    _LOGGER.info("profiling %s of %s (%s)", page, user_id, req.mode)
+    result = ProfileResult(page, user_id, req.mode, dt.datetime.now(tz=dt.UTC))
+    try:
+        with _cprofile(result) if req.mode == "cProfile" else _sample(result):
+            yield
+    finally:
+        result.duration_s = (
+            dt.datetime.now(tz=dt.UTC) - result.started
+        ).total_seconds()
+        with state.lock:
+            state.results.appendleft(result)
+        state.busy.release()
@@ -0,0 +1,142 @@
+"""Helper: Registry of sessions, memory estimates and reclaiming of idle ones."""
+
+import datetime as dt
+import threading
+from dataclasses import dataclass
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from helper_cache_stats import estimate_size
+from helper_logging import get_logger_from_filename, track_function_usage
+
+_LOGGER = get_logger_from_filename(__file__)
+
+# objects of at least this size are released after the session is idle
+LARGE_OBJECT_BYTES = 1_048_576
+SESSION_IDLE_RECLAIM = dt.timedelta(minutes=30)
+# session_state key listing the released keys, shown on the next run
+RECLAIMED_KEY = "_reclaimed"
+
+_SESSIONS_LOCK = threading.Lock()
+_sessions: dict[str, "SessionEntry"] = {}
+
+
+@dataclass
+class SessionEntry:
+    """
+    Session of a user, state is the thread-safe session_state of Streamlit.
+
+    bytes/largest_key: estimate of the latest sweep
+    """
+
+    user_id: int | None
+    last_active: dt.datetime
+    state: object
+    bytes: int = 0
+    largest_key: str = ""
+    reclaimed_bytes: int = 0
+
+
+def register_session() -> None:
+    """Mark the session as active, show which objects were released, if any."""
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    now = dt.datetime.now(tz=dt.UTC)
+    with _SESSIONS_LOCK:
+        entry = _sessions.get(ctx.session_id)
+        if entry is None:
+            entry = _sessions[ctx.session_id] = SessionEntry(
+                st.session_state.get("USER_ID"), now, ctx.session_state
+            )
+        entry.user_id = st.session_state.get("USER_ID")
+        entry.last_active = now
+    reclaimed = st.session_state.pop(RECLAIMED_KEY, None)
+    if reclaimed:
+        st.info(
+            "Unsaved data was released after "
+            f"{int(SESSION_IDLE_RECLAIM.total_seconds() // 60)} min of inactivity: "
+            f"{', '.join(reclaimed)}"
+        )
+
+
+def _is_active(session_id: str) -> bool:
+    return not Runtime.exists() or Runtime.instance().is_active_session(session_id)
+
+
+@track_function_usage
+def sweep_sessions(now: dt.datetime | None = None) -> int:
+    """
+    Estimate size of all sessions, release large objects of idle ones.
+
+    Sessions that were closed are removed from the registry.
+    Returns number of released bytes.
+    """
+    now = now or dt.datetime.now(tz=dt.UTC)
+    with _SESSIONS_LOCK:
+        for session_id in [s for s in _sessions if not _is_active(s)]:
+            del _sessions[session_id]
+        entries = list(_sessions.values())
+    total = 0
+    for entry in entries:
+        state = entry.state
+        sizes = {
+            k: estimate_size(v)
+            for k, v in state.filtered_state.items()  # type: ignore[attr-defined]
+        }
+        if now - entry.last_active > SESSION_IDLE_RECLAIM:
+            large = [
+                k
+                for k, size in sizes.items()
+                if size >= LARGE_OBJECT_BYTES and k != RECLAIMED_KEY
+            ]
+            for k in large:
+                del state[k]  # type: ignore[attr-defined]
+                size = sizes.pop(k)
+                entry.reclaimed_bytes += size
+                total += size
+            if large:
+                state[RECLAIMED_KEY] = large  # type: ignore[index]
+                _LOGGER.info("released %s of idle session", large)
+        entry.bytes = sum(sizes.values())
+        entry.largest_key = max(sizes, key=sizes.__getitem__) if sizes else ""
+    return total
+
+
+@st.cache_resource(ttl="5m")
+def run_session_maintenance() -> dt.datetime:
+    """Sweep sessions, at most every 5 min per process."""
+    sweep_sessions()
+    return dt.datetime.now(tz=dt.UTC)
+
+
+def get_session_stats(now: dt.datetime | None = None) -> pd.DataFrame:
+    """Get sessions with user, idle minutes and MB of the latest sweep."""
+    now = now or dt.datetime.now(tz=dt.UTC)
+    with _SESSIONS_LOCK:
+        rows = [
+            {
+                "session": session_id[:8],
+                "user": e.user_id,
+                "idle_min": (now - e.last_active).total_seconds() / 60,
+                "MB": e.bytes / 1_048_576,
+                "largest_key": e.largest_key,
+                "reclaimed_MB": e.reclaimed_bytes / 1_048_576,
+            }
+            for session_id, e in _sessions.items()
+        ]
+    df = pd.DataFrame(
+        rows,
+        columns=["session", "user", "idle_min", "MB", "largest_key", "reclaimed_MB"],
+    )
+    return df.astype(
+        {
+            "user": "Int64",
+            "idle_min": "float64",
+            "MB": "float64",
+            "reclaimed_MB": "float64",
+        }
+    )
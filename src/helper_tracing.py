@@ -0,0 +1,158 @@
+"""Helper: Tracing of script runs, spans written as JSON lines."""
+
+import datetime as dt
+import json
+import logging
+import os
+import threading
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from logging.handlers import WatchedFileHandler
+from pathlib import Path
+from time import perf_counter_ns
+
+# outside of the web-served dirs, env STRAVA_TRACE_FILE overrides it
+TRACE_FILE_ENV = "STRAVA_TRACE_FILE"
+TRACE_FILE_DEFAULT = "./logs/traces.jsonl"
+
+_TRACE_LOGGER = logging.getLogger("trace")
+_TRACE_LOGGER.propagate = False
+_local = threading.local()
+
+
+@dataclass
+class TraceContext:
+    """Trace of a script run (or background batch), shared with its threads."""
+
+    trace_id: str
+    name: str
+    user_id: int | None
+
+
+@dataclass
+class Span:
+    """Timed operation, attrs are written as they are, e.g. status and bytes."""
+
+    name: str
+    span_id: str
+    parent_id: str | None
+    start: dt.datetime
+    start_ns: int
+    attrs: dict[str, object] = field(default_factory=dict)
+
+
+def init_tracing() -> None:
+    """Write spans to the trace file, once per process."""
+    if _TRACE_LOGGER.handlers:
+        return
+    p = Path(os.environ.get(TRACE_FILE_ENV) or TRACE_FILE_DEFAULT)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    # watched: reopened after logrotate
+    handler = WatchedFileHandler(p, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _TRACE_LOGGER.addHandler(handler)
+    _TRACE_LOGGER.setLevel(logging.INFO)
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _write_span(ctx: TraceContext, s: Span, error: BaseException | None) -> None:
+    if not _TRACE_LOGGER.isEnabledFor(logging.INFO):
+        return
+    d = {
+        "ts": s.start.isoformat(timespec="milliseconds"),
+        "trace_id": ctx.trace_id,
+        "span_id": s.span_id,
+        "parent_id": s.parent_id,
+        "trace": ctx.name,
+        "user_id": ctx.user_id,
+        "name": s.name,
+        "duration_ms": round((perf_counter_ns() - s.start_ns) / 1e6, 3),
+        "error": type(error).__name__ if error is not None else None,
+        **s.attrs,
+    }
+    _TRACE_LOGGER.info(json.dumps(d, default=str))
+
+
+@contextmanager
+def span(name: str, **attrs: object) -> Iterator[Span | None]:
+    """
+    Open a span in the trace of the current thread, no-op without trace.
+
+    Usable as decorator as well: @span("geo calc")
+    """
+    ctx: TraceContext | None = getattr(_local, "ctx", None)
+    if ctx is None:
+        yield None
+        return
+    stack: list[Span] = _local.stack
+    s = Span(
+        name,
+        _new_id(),
+        stack[-1].span_id if stack else getattr(_local, "parent_id", None),
+        dt.datetime.now(tz=dt.UTC),
+        perf_counter_ns(),
+        attrs,
+    )
+    stack.append(s)
+    error = None
+    try:
+        yield s
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        stack.pop()
+        _write_span(ctx, s, error)
+
+
+def set_span_attrs(**attrs: object) -> None:
+    """Add attributes to the innermost span of the current thread."""
+    stack: list[Span] | None = getattr(_local, "stack", None)
+    if stack:
+        stack[-1].attrs.update(attrs)
+
+
+@contextmanager
+def start_trace(name: str, user_id: int | None) -> Iterator[str]:
+    """Start a new trace in the current thread, with a root span of name."""
+    ctx = TraceContext(_new_id() + _new_id(), name, user_id)
+    _local.ctx, _local.stack, _local.parent_id = ctx, [], None
+    try:
+        with span(name):
+            yield ctx.trace_id
+    finally:
+        _local.ctx = None
+
+
+def traced(fn: Callable) -> Callable:
+    """
+    Bind fn to the trace and span of the calling thread, for worker threads.
+
+    Spans of fn become children of the current span.
+    """
+    ctx: TraceContext | None = getattr(_local, "ctx", None)
+    if ctx is None:
+        return fn
+    stack: list[Span] = _local.stack
+    parent_id = stack[-1].span_id if stack else None
+
+    @wraps(fn)
+    def wrapper(*args: object, **kwargs: object) -> object:
+        outer = (
+            getattr(_local, "ctx", None),
+            getattr(_local, "stack", None),
+            getattr(_local, "parent_id", None),
+        )
+        _local.ctx, _local.stack, _local.parent_id = ctx, [], parent_id
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.ctx, _local.stack, _local.parent_id = outer
+
+    return wrapper
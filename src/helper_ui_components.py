@@ -1,6 +1,7 @@
 """Helper functions: UI components."""
 
-import io
+import math
+from collections.abc import Callable
 from pathlib import Path
 
 import pandas as pd
@@ -8,20 +9,36 @@ import streamlit as st
 from streamlit.delta_generator import DeltaGenerator
 from streamlit.navigation.page import StreamlitPage
 
+from helper_export import (
+    PREBUILD_MIN_ROWS,
+    cached_export,
+    csv_bytes,
+    df_fingerprint,
+    excel_bytes,
+    feather_bytes,
+    parquet_bytes,
+)
 from helper_logging import get_logger_from_filename, track_function_usage
+from helper_pandas import paginate_df
 
 _LOGGER = get_logger_from_filename(__file__)
 
 
+@track_function_usage
+def list_report_pages() -> dict[str, str]:
+    """Get file stem -> title of the report pages."""
+    return {
+        p.stem: p.stem[4:].replace("_", " ").title()
+        for p in sorted(Path("src/reports").glob("*.py"))
+        if not p.stem.startswith("_")
+    }
+
+
 @track_function_usage
 def create_navigation_menu() -> StreamlitPage:
     """Create and populate navigation menu."""
     lst: list[StreamlitPage] = []
-    for p in sorted(Path("src/reports").glob("*.py")):
-        f = p.stem
-        if f.startswith("_"):
-            continue
-        t = f[4:].replace("_", " ").title()
+    for f, t in list_report_pages().items():
         # stats page for debugging only visible for me
         if (
             f.startswith("r99")
@@ -36,24 +53,123 @@ def create_navigation_menu() -> StreamlitPage:
 
 @track_function_usage
 def excel_download_buttons(
-    df: pd.DataFrame, file_name: str, *, exclude_index: bool
+    df: pd.DataFrame,
+    file_name: str,
+    *,
+    exclude_index: bool,
+    cache_key: tuple | None = None,
 ) -> None:
-    """Download Excel — generated on click via callable data."""
+    """
+    Download Excel — generated on click via callable data.
+
+    With cache_key (user, data version, ...) the file is cached per row and
+    column selection, and large ones are pre-built in background.
+    """
 
     def _make_excel() -> bytes:
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:  # type: ignore[arg-type]
-            df.to_excel(writer, sheet_name="Sheet1", index=not exclude_index)
-        return buffer.getvalue()
+        return excel_bytes(df, exclude_index=exclude_index)
+
+    data = _make_excel
+    if cache_key is not None:
+        data = cached_export(
+            ("xlsx", cache_key, df_fingerprint(df), exclude_index),
+            _make_excel,
+            prebuild=len(df) >= PREBUILD_MIN_ROWS,
+        )
 
     st.download_button(
         label="Download Excel",
-        data=_make_excel,
+        data=data,
         file_name=file_name.replace(" ", "_"),
         mime="application/vnd.ms-excel",
     )
 
 
+# format: (label, file extension, writer, mime type)
+COLUMNAR_FORMATS = (
+    ("Parquet", "parquet", parquet_bytes, "application/vnd.apache.parquet"),
+    ("Feather", "feather", feather_bytes, "application/vnd.apache.arrow.file"),
+    ("CSV", "csv", csv_bytes, "text/csv"),
+)
+
+
+@track_function_usage
+def columnar_download_buttons(
+    df: pd.DataFrame, file_stem: str, *, cache_key: tuple | None = None
+) -> None:
+    """
+    Download Parquet, Feather and CSV — generated on click, without index.
+
+    For large lists, these are much faster and smaller than Excel.
+    """
+    fingerprint = df_fingerprint(df) if cache_key is not None else None
+    cols = st.columns((1, 1, 1, 3))
+    for col, (label, ext, writer, mime) in zip(cols, COLUMNAR_FORMATS, strict=False):
+
+        def _make_file(writer: Callable[[pd.DataFrame], bytes] = writer) -> bytes:
+            return writer(df)
+
+        data = _make_file
+        if cache_key is not None:
+            data = cached_export((ext, cache_key, fingerprint), _make_file)
+        col.download_button(
+            label=f"Download {label}",
+            data=data,
+            file_name=f"{file_stem.replace(' ', '_')}.{ext}",
+            mime=mime,
+        )
+
+
+PAGE_SIZES = (100, 500, 1000)
+
+
+@track_function_usage
+def paginated_dataframe(
+    df: pd.DataFrame, column_order: list[str], column_config: dict, key: str
+) -> None:
+    """
+    Display a page of the DataFrame, sorted server-side.
+
+    Only the visible columns of the current page are sent to the browser.
+    """
+    cols = st.columns((2, 1, 1, 1, 3))
+    sort_col = cols[0].selectbox(
+        label="Sort by",
+        options=column_order,
+        index=None,
+        placeholder="original order",
+        key=f"{key}_sort",
+    )
+    ascending = cols[1].selectbox(
+        label="Order", options=("desc", "asc"), key=f"{key}_order"
+    )
+    page_size = cols[2].selectbox(
+        label="Rows per page", options=PAGE_SIZES, key=f"{key}_page_size"
+    )
+    num_pages = max(1, math.ceil(len(df) / page_size))
+    # filters might have reduced the number of pages
+    if st.session_state.get(f"{key}_page", 1) > num_pages:
+        st.session_state[f"{key}_page"] = 1
+    page = cols[3].number_input(
+        label=f"Page (of {num_pages})",
+        min_value=1,
+        max_value=num_pages,
+        step=1,
+        key=f"{key}_page",
+    )
+    df_page = paginate_df(
+        df,
+        cols=column_order,
+        sort_col=sort_col,
+        ascending=ascending == "asc",
+        page=int(page),
+        page_size=page_size,
+    )
+    st.dataframe(df_page, width="stretch", hide_index=True, column_config=column_config)
+    first = (int(page) - 1) * page_size
+    st.caption(f"Rows {first + 1} - {first + len(df_page)} of {len(df)}")
+
+
 @track_function_usage
 def list_sports(df: pd.DataFrame) -> list:
     """Return list of sport types."""
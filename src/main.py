@@ -1,25 +1,29 @@
 """Main file."""
 # ruff: noqa: E402
 
-import tracemalloc
-from time import time
-
 import streamlit as st
 
 # needs to be first streamlit command, so placed before the imports
 st.set_page_config(page_title="Strava Äpp V2", page_icon=None, layout="wide")
 
 from helper import get_env
+from helper_descriptions import run_description_maintenance
 from helper_logging import get_logger_from_filename, init_logging
 from helper_login import (
     init_dev_session_state,
     perform_login,
     token_refresh_if_needed,
 )
+from helper_memory import measure_page_memory
+from helper_metrics import track_page_run
+from helper_openmetrics import export_metrics
+from helper_profiler import profile_page_run
+from helper_sessions import register_session, run_session_maintenance
+from helper_tracing import init_tracing, start_trace
 from helper_ui_components import create_navigation_menu
 
-MEASURE_MEMORY = True
 init_logging()
+init_tracing()
 _LOGGER = get_logger_from_filename(__file__)
 
 
@@ -76,22 +80,35 @@ def main() -> None:  # noqa: D103
         st.logo(
             "src/strava-resources/api_logo_pwrdBy_strava_stack_light.svg", size="large"
         )
-        if MEASURE_MEMORY:
-            tracemalloc.start()
-        time_start = time()
         page = create_navigation_menu()
         pagename = page.url_path or "main"
         st.title(page.title)
-
-        page.run()
-
-        time_end = time()
-        log_line = f"stats: {pagename},{round(time_end - time_start, 1)}s"
-
-        if MEASURE_MEMORY:
-            max_bytes = tracemalloc.get_traced_memory()[0]
-            tracemalloc.stop()
-            log_line += f",{round(max_bytes / 1_048_576, 1)}MB"
+        # last activity, and notice of objects released after inactivity
+        register_session()
+
+        with (
+            start_trace(pagename, st.session_state.get("USER_ID")),
+            track_page_run(pagename) as run,
+            measure_page_memory(pagename) as mem,
+            profile_page_run(page.title, st.session_state.get("USER_ID")),
+        ):
+            page.run()
+            # periodic cleanup, cached for a day
+            run_description_maintenance()
+        # performance counters for the textfile collector, at most every 15s
+        export_metrics()
+        # release large objects of idle sessions, at most every 5 min
+        run_session_maintenance()
+
+        log_line = (
+            f"stats: {pagename},{round(run.duration_ns / 1e9, 1)}s,"
+            f"{round(mem.rss_end / 1_048_576, 1)}MB RSS"
+        )
+        if mem.traced_peak is not None:
+            # process-wide, includes other sessions running at the same time
+            log_line += (
+                f",{round(mem.traced_peak / 1_048_576, 1)}MB traced peak of process"
+            )
         _LOGGER.info(log_line)
 
 
@@ -2,14 +2,19 @@
 
 import datetime as dt
 
+import altair as alt
+import pandas as pd
 import streamlit as st
 
-from helper_activities_caching import (
-    cache_all_activities_and_gears,
-    reduce_and_rename_activity_df_for_stats,
+from helper_activities_caching import get_activities_stats_df
+from helper_daily_index import (
+    DailyIndex,
+    get_daily_index,
+    sports_in_range,
+    year_to_date,
+    year_to_date_at,
 )
 from helper_logging import get_logger_from_filename
-from helper_ui_components import list_sports
 
 _LOGGER = get_logger_from_filename(__file__)
 
@@ -24,27 +29,27 @@ def calc_days_in_year(year: int) -> int:
 DATE_TODAY = dt.datetime.now(tz=dt.UTC).date()
 
 
-def main() -> None:  # noqa: D103, PLR0915
-    df = cache_all_activities_and_gears()[0]
-    df = reduce_and_rename_activity_df_for_stats(df)
-
-    col1, col2, _ = st.columns((1, 2, 3))
+def main() -> None:  # noqa: D103
+    df = get_activities_stats_df()
+    idx = get_daily_index(df)
 
     # list of years with min 3 activities
-    df2 = (
-        df[["year", "Count"]]
-        .groupby("year")
-        .agg(Count=("Count", "count"))
-        .sort_index(ascending=False)
-        .loc[lambda x: x["Count"] >= 3]  # noqa: PLR2004
-    )
+    df_year = year_to_date_at(year_to_date(idx), day_of_year=366)
+    years = df_year.loc[df_year["Count"] >= 3].index.sort_values(ascending=False)  # noqa: PLR2004
 
-    if len(df2) == 0:
+    if len(years) == 0:
         st.write("No data found.")
         st.stop()
 
-    sel_year = col1.selectbox(label="Year", options=df2.index)
-    df = df[df["year"] == sel_year]
+    year_summary(idx, years=years.to_list())
+
+
+@st.fragment
+def year_summary(idx: DailyIndex, years: list[int]) -> None:  # noqa: PLR0915
+    """Display summary of selected year, reruns without reloading activities."""
+    col1, col2, _ = st.columns((1, 2, 3))
+
+    sel_year = col1.selectbox(label="Year", options=years)
     past_days_in_year = calc_days_in_year(int(sel_year))
     today_day_no = 1 + (DATE_TODAY - dt.date(DATE_TODAY.year, 1, 1)).days
     total_days_in_this_year = (
@@ -54,16 +59,21 @@ def main() -> None:  # noqa: D103, PLR0915
 
     # optionally filter on sports
     sel_types = col2.multiselect(
-        label="Sports", options=list_sports(df), key="sel_types"
+        label="Sports",
+        options=sports_in_range(
+            idx, start=dt.date(int(sel_year), 1, 1), end=dt.date(int(sel_year), 12, 31)
+        ),
+        key="sel_types",
     )
-    if sel_types:
-        df = df.query("type in @sel_types")
 
-    cnt_activities = len(df)
-    hour_sum = df["Hour-sum"].sum()
-    km_sum = df["Kilometer-sum"].sum()
-    elev_km_sum = df["Elevation-sum"].sum() / 1000
-    active_days = df[["date"]].drop_duplicates().count().iloc[0]
+    # cumulated values of all years, in one pass
+    df_ytd = year_to_date(idx, sports=sel_types)
+    row = year_to_date_at(df_ytd, day_of_year=366).loc[sel_year]
+    cnt_activities = int(row["Count"])
+    hour_sum = row["Hours"]
+    km_sum = row["Kilometer"]
+    elev_km_sum = row["Elevation"] / 1000
+    active_days = int(row["Active Days"])
 
     cols = st.columns(5)
     # headers
@@ -152,6 +162,51 @@ def main() -> None:  # noqa: D103, PLR0915
             label_visibility="hidden",
         )
 
+    compare_years(df_ytd, day_of_year=today_day_no)
+
+
+@st.fragment
+def compare_years(df_ytd: pd.DataFrame, day_of_year: int) -> None:
+    """Compare all years at the same day of year."""
+    st.header("Year to Date Comparison")
+    st.write(f"All years at {DATE_TODAY.strftime('%d.%m.')} (day {day_of_year})")
+
+    df = year_to_date_at(df_ytd, day_of_year=day_of_year).sort_index(ascending=False)
+    df["Elevation"] = df["Elevation"] / 1000
+    df = df.rename(
+        columns={
+            "Count": "Activities",
+            "Kilometer": "Distance (km)",
+            "Elevation": "Elevation (km)",
+        }
+    )
+    st.dataframe(
+        df.round(1).reset_index(),
+        hide_index=True,
+        column_config={"year": st.column_config.NumberColumn("Year", format="%d")},
+    )
+
+    col1, _ = st.columns((1, 5))
+    sel_measure = col1.selectbox(
+        label="Measure", options=df_ytd.columns, key="sel_measure_ytd"
+    )
+    df2 = df_ytd[[sel_measure]].round(1).reset_index()
+    c = (
+        alt.Chart(df2, title=alt.TitleParams(f"Cumulated {sel_measure}"))
+        .mark_line()
+        .encode(
+            x=alt.X("day_of_year:Q", title="Day of Year"),
+            y=alt.Y(f"{sel_measure}:Q", title=None),
+            color="year:N",
+            tooltip=[
+                alt.Tooltip("year:N", title="Year"),
+                alt.Tooltip("day_of_year:Q", title="Day"),
+                alt.Tooltip(f"{sel_measure}:Q"),
+            ],
+        )
+    )
+    st.altair_chart(c, width="stretch")
+
 
 if __name__ == "__main__":
     main()
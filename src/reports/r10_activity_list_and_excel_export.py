@@ -1,7 +1,5 @@
 """Activity List and Excel Export."""
 
-import datetime as dt
-import json
 from math import isnan
 
 import pandas as pd
@@ -9,123 +7,158 @@ import streamlit as st
 
 from helper_activities_caching import (
     cache_all_activities_and_gears,
-    get_act_desc_cache_file_path,
+    get_activities_cache_key,
+    get_activities_display_df,
+    get_display_col_names,
     refresh_activities_cache,
 )
-from helper_api import StravaRateLimitError, fetch_activity_description
+from helper_activity_filter import filter_mask, get_filter_index, masked_min_max
+from helper_cache_stats import record_cache_access
+from helper_descriptions import (
+    description_job_status,
+    get_description_jobs,
+    load_descriptions,
+    start_description_job,
+)
 from helper_logging import get_logger_from_filename
-from helper_ui_components import excel_download_buttons, select_sport, select_years
+from helper_ui_components import (
+    columnar_download_buttons,
+    excel_download_buttons,
+    paginated_dataframe,
+    select_sport,
+    select_years,
+)
 
 _LOGGER = get_logger_from_filename(__file__)
 
 
-def next_rate_limit_reset(now: dt.datetime) -> dt.datetime:
+def fetch_and_attach_descriptions(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Return the next time Strava's 15-min rate-limit window resets.
+    Add the cached activity descriptions as the x_description column.
 
-    Strava's short-term limit resets at :00/:15/:30/:45; a few seconds of buffer
-    are added to account for clock skew.
+    Missing ones are fetched by a background job of the user, that continues
+    after reruns and resumes on its own after hitting the rate limit.
+    Descriptions persist in a SQLite store and are re-fetched after 3 months.
     """
-    base = now.replace(second=0, microsecond=0)
-    minutes_to_next = 15 - (now.minute % 15)
-    return base + dt.timedelta(minutes=minutes_to_next, seconds=5)
-
-
-def _load_descriptions() -> dict[int, str]:
-    p = get_act_desc_cache_file_path()
-    three_months_ago = dt.datetime.now(tz=dt.UTC) - dt.timedelta(days=90)
-    # sweep all cached description files older than 3 months
-    for f in p.parent.glob("*.json"):
-        if dt.datetime.fromtimestamp(f.stat().st_mtime, tz=dt.UTC) < three_months_ago:
-            f.unlink()
-    if not p.exists():
-        return {}
-    return {int(k): v for k, v in json.loads(p.read_text()).items()}
-
+    user_id = st.session_state["USER_ID"]
+    descriptions: dict[int, str] = load_descriptions(user_id)
+    ids = [int(i) for i in df.index]
+    total = len(ids)
 
-def _save_descriptions(descriptions: dict[int, str]) -> None:
-    p = get_act_desc_cache_file_path()
-    p.parent.mkdir(parents=True, exist_ok=True)
-    p.write_text(json.dumps(descriptions, ensure_ascii=False))
+    job = get_description_jobs().get(user_id)
+    failed = job.failed if job is not None else set()
+    missing = [i for i in ids if i not in descriptions and i not in failed]
+    # cache hits, misses are recorded by the job
+    record_cache_access(
+        "fetch_activity_description", user_id, calls=total - len(missing)
+    )
+    if missing:
+        job = start_description_job(user_id, st.session_state["TOKEN"], missing)
 
+    df = df.copy()
+    df["x_description"] = [descriptions.get(i, "") for i in ids]
 
-@st.fragment(run_every="10s")
-def description_retry_status(ids: list[int]) -> None:
-    """Show fetch progress and a Retry button that re-enables after the cooldown."""
-    descriptions: dict[int, str] = _load_descriptions()
-    total = len(ids)
-    fetched = sum(1 for i in ids if i in descriptions)
-    cooldown_until = st.session_state.get("desc_cooldown_until")
-    now = dt.datetime.now(tz=dt.UTC)
-    if cooldown_until is not None and now < cooldown_until:
-        mins, secs = divmod(int((cooldown_until - now).total_seconds()), 60)
+    if missing:
+        description_job_status(job, ids=missing)
+    elif all(i in descriptions for i in ids):
+        st.success(f"All {total} activity descriptions fetched.")
+    else:
         st.warning(
-            f"Strava API rate limit reached: {fetched} of {total} descriptions "
-            f"fetched. Retry available in {mins:02d}:{secs:02d}."
+            f"{sum(1 for i in ids if i in failed)} of {total} descriptions could "
+            "not be fetched."
         )
-        st.button("Retry fetch", disabled=True)
-    else:
-        st.info(f"{fetched} of {total} descriptions fetched, some are still missing.")
-        if st.button("Retry fetch"):
-            st.rerun()
+    return df
 
 
-def fetch_and_attach_descriptions(df: pd.DataFrame) -> pd.DataFrame:
+@st.fragment
+def activity_table(df: pd.DataFrame, df_display: pd.DataFrame) -> None:
     """
-    Fetch missing activity descriptions and add them as the x_description column.
+    Display the filtered activities and Excel download.
 
-    Descriptions persist in a JSON file (per user) and are pruned after 3 months.
-    On hitting the rate limit, fetching pauses until the next Strava reset; the
-    retry status/button is rendered by description_retry_status().
+    Reruns on its own, e.g. on km/mi toggle or paging, without re-filtering.
     """
-    user_id = st.session_state["USER_ID"]
-    descriptions: dict[int, str] = _load_descriptions()
-    ids = [int(i) for i in df.index]
-    total = len(ids)
-
-    now = dt.datetime.now(tz=dt.UTC)
-    cooldown_until = st.session_state.get("desc_cooldown_until")
-    in_cooldown = cooldown_until is not None and now < cooldown_until
-
-    missing = [i for i in ids if i not in descriptions]
-    if missing and not in_cooldown:
-        rate_limited = False
-        progress = st.progress(0.0, text="Fetching activity descriptions ...")
-        for n, activity_id in enumerate(missing):
-            try:
-                descriptions[activity_id] = fetch_activity_description(
-                    activity_id=activity_id, user_id=user_id
-                )
-            except StravaRateLimitError:
-                rate_limited = True
-                st.session_state["desc_cooldown_until"] = next_rate_limit_reset(
-                    dt.datetime.now(tz=dt.UTC)
-                )
-                break
-            progress.progress((n + 1) / len(missing))
-        progress.empty()
-        _save_descriptions(descriptions)
-        if not rate_limited:
-            st.session_state.pop("desc_cooldown_until", None)
+    col1, _ = st.columns((1, 5))
+    sel_km = col1.selectbox(label="km/mi", options=["km", "mi"])
 
-    df = df.copy()
-    df["x_description"] = [descriptions.get(i, "") for i in ids]
-
-    fetched = sum(1 for i in ids if i in descriptions)
-    if fetched < total:
-        description_retry_status(ids)
+    # some we do not display in web table, but keep for Excel export
+    col_hide = [
+        "distance",
+        "elapsed_time",
+        "gear_id",
+        "id",
+        "max_speed",
+        "moving_time",
+        "speed_av",
+        "start_date_local",
+        "timezone",
+        "utc_offset",
+        "week",
+        "year",
+        "month",
+        "quarter",
+        "start_h",
+    ]
+    if sel_km == "km":
+        col_hide.extend(("min/mi", "mi", "mph", "max_mph"))
     else:
-        st.success(f"All {total} activity descriptions fetched.")
-    return df
+        col_hide.extend(("min/km", "km", "km/h", "max_km/h"))
+    col_order = [col for col in df_display.columns if col not in col_hide]
+
+    column_config = {
+        # "start_date_local": st.column_config.DateColumn(format=FORMAT_DATETIME),
+        # no pinning, as taking too much space on mobile
+        # "name": st.column_config.Column(pinned=False),
+        "url": st.column_config.LinkColumn("ID", display_text=r"/(\d+)$"),
+        "dl": st.column_config.LinkColumn("DL", display_text="DL"),
+    }
+    if st.toggle(
+        "Paginated table",
+        value=True,
+        help="Send only the current page to the browser, sorting is done on server.",
+    ):
+        paginated_dataframe(
+            df_display,
+            column_order=col_order,
+            column_config=column_config,
+            key="activity_table",
+        )
+    else:
+        st.dataframe(
+            df_display,
+            width="stretch",
+            hide_index=True,
+            column_order=col_order,
+            column_config=column_config,
+        )
+    # Excel export of all filtered rows
+    # fetched descriptions change the content, but not the rows and columns
+    # (missing ones are ""), so their values are part of the key
+    desc_hash = (
+        int(pd.util.hash_pandas_object(df["x_description"], index=False).sum())
+        if "x_description" in df.columns
+        else -1
+    )
+    excel_download_buttons(
+        df=df,
+        file_name="Strava_Activity_List.xlsx",
+        exclude_index=True,
+        cache_key=(get_activities_cache_key(), desc_hash),
+    )
+    columnar_download_buttons(
+        df=df.rename(columns=get_display_col_names(df.columns.tolist())),
+        file_stem="Strava_Activity_List",
+        cache_key=(get_activities_cache_key(), desc_hash),
+    )
 
 
-def main() -> None:  # noqa: C901, D103, PLR0912, PLR0915
+def main() -> None:  # noqa: C901, D103, PLR0915
     st.markdown("Edit at [Strava](https://www.strava.com/athlete/training)")
 
     cols = st.columns((1, 5))
     select_years(cols[0])
 
-    df, df_gear = cache_all_activities_and_gears()
+    df_all, df_gear = cache_all_activities_and_gears()
+    df = df_all
 
     min_year = df["x_year"].min()
     max_year = df["x_year"].max()
@@ -139,48 +172,55 @@ def main() -> None:  # noqa: C901, D103, PLR0912, PLR0915
         st.session_state.sel_km = 0
         st.session_state.sel_elev = 0
 
-    col1, col2, col3, col4, col5, col6, col7 = st.columns((1, 1, 1, 1, 1, 0.5, 0.5))
+    col1, col2, col3, col4, col5, col6 = st.columns((1, 1, 1, 1, 1, 0.5))
 
-    sel_type = select_sport(df, col1)
+    # filters are combined as cached boolean masks, the DataFrame is sliced once
+    fi = get_filter_index(df)
 
-    if sel_type:
-        df = df.query("type in @sel_type")
+    sel_type = select_sport(df, col1)
+    mask = filter_mask(fi, sel_type=sel_type)
 
+    year_from, year_to = masked_min_max(fi, "x_year", mask)
     sel_year = col2.slider(
         "Year",
         min_value=min_year,
         max_value=max_year,
-        value=(df["x_year"].min(), df["x_year"].max()),
+        value=(int(year_from), int(year_to)),
         key="sel_year",
     )
-    if sel_year:
-        df = df.query("x_year >= @sel_year[0] and x_year <= @sel_year[1]")
-
-    if df.empty:
+    mask = filter_mask(fi, sel_type=sel_type, sel_year=sel_year)
+    if not mask.any():
         st.stop()
 
-    max_value = int(df["x_min"].max())
+    sel_duration = 0
+    max_value = int(masked_min_max(fi, "x_min", mask)[1])
     if max_value > 0:
         sel_duration = col3.slider(
             "Minutes", min_value=0, max_value=max_value, key="sel_duration"
         )
-        if sel_duration:
-            df = df.query("x_min > @sel_duration")
-    if df.empty:
+        mask = filter_mask(
+            fi, sel_type=sel_type, sel_year=sel_year, min_minutes=sel_duration
+        )
+    if not mask.any():
         st.stop()
 
-    max_value = int(df["x_km"].max())
+    sel_km = 0
+    max_value = int(masked_min_max(fi, "x_km", mask)[1])
     if max_value > 0:
         sel_km = col4.slider(
             "Kilometer", min_value=0, max_value=max_value, key="sel_km"
         )
-        if sel_km:
-            df = df.query("x_km > @sel_km")
-    if df.empty:
+        mask = filter_mask(
+            fi,
+            sel_type=sel_type,
+            sel_year=sel_year,
+            min_minutes=sel_duration,
+            min_km=sel_km,
+        )
+    if not mask.any():
         st.stop()
 
-    max_value = df["total_elevation_gain"].max()
-
+    max_value = masked_min_max(fi, "total_elevation_gain", mask)[1]
     if not isnan(max_value):
         max_value = int(max_value)
         sel_elev = col5.slider(
@@ -189,13 +229,19 @@ def main() -> None:  # noqa: C901, D103, PLR0912, PLR0915
             max_value=max_value,
             key="sel_elev",
         )
-        if sel_elev:
-            df = df.query("total_elevation_gain > @sel_elev")
-    if df.empty:
+        mask = filter_mask(
+            fi,
+            sel_type=sel_type,
+            sel_year=sel_year,
+            min_minutes=sel_duration,
+            min_km=sel_km,
+            min_elev=sel_elev,
+        )
+    if not mask.any():
         st.stop()
-    sel_km = col6.selectbox(label="km/mi", options=["km", "mi"])
+    df = df.loc[mask]
 
-    col7.button("Reset", on_click=reset_filters)
+    col6.button("Reset", on_click=reset_filters)
 
     st.columns(1)
 
@@ -208,69 +254,12 @@ def main() -> None:  # noqa: C901, D103, PLR0912, PLR0915
     if fetch_desc:
         df = fetch_and_attach_descriptions(df)
 
-    # to rename "x_" prefix
-    col_names = {}
-    for col in df.columns.to_list():
-        if col.startswith("x_"):
-            col_names[col] = col[2:]
-        elif col.startswith("average_"):
-            col_names[col] = col[8:] + "_av"
-        else:
-            col_names[col] = col  # unchanged
-    col_names["average_heartrate"] = "HR_av"
-    col_names["average_watts"] = "W_av"
-    col_names["device_watts"] = "W_device"
-    col_names["display_hide_heartrate_option"] = "HR_hide"
-    col_names["heartrate_opt_out"] = "HR_opt_out"
-    col_names["location_country"] = "country"
-    col_names["max_heartrate"] = "HR_max"
-    col_names["max_watts"] = "W_max"
-    col_names["total_elevation_gain"] = "elev_gain"
-    col_names["weighted_average_watts"] = "W_weight_avg"
-    col_names["x_gear_name"] = "gear"
-    col_names["x_min"] = "minutes"
-    col_names["x_nearest_city_start"] = "nearest_city"
+    # renamed for display, cached per user and data version
+    df_display = get_activities_display_df(df_all).loc[df.index]
+    if "x_description" in df.columns:
+        df_display = df_display.assign(description=df["x_description"])
 
-    # some we do not display in web table, but keep for Excel export
-    col_hide = [
-        "distance",
-        "elapsed_time",
-        "gear_id",
-        "id",
-        "max_speed",
-        "moving_time",
-        "speed_av",
-        "start_date_local",
-        "timezone",
-        "utc_offset",
-        "week",
-        "year",
-        "month",
-        "quarter",
-        "start_h",
-    ]
-    if sel_km == "km":
-        col_hide.extend(("min/mi", "mi", "mph", "max_mph"))
-    else:
-        col_hide.extend(("min/km", "km", "km/h", "max_km/h"))
-    col_order = [new for new in col_names.values() if new not in col_hide]
-
-    st.dataframe(
-        df.rename(columns=col_names, errors="raise"),
-        width="stretch",
-        hide_index=True,
-        column_order=col_order,
-        column_config={
-            # "start_date_local": st.column_config.DateColumn(format=FORMAT_DATETIME),
-            # no pinning, as taking too much space on mobile
-            # "name": st.column_config.Column(pinned=False),
-            "url": st.column_config.LinkColumn("ID", display_text=r"/(\d+)$"),
-            "dl": st.column_config.LinkColumn("DL", display_text="DL"),
-        },
-    )
-    excel_download_buttons(
-        df=df, file_name="Strava_Activity_List.xlsx", exclude_index=True
-    )
+    activity_table(df=df, df_display=df_display)
 
     if st.button("Re-Fetch from Strava", help="Re-fetch activities from Strava"):
         refresh_activities_cache()
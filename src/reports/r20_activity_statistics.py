@@ -7,13 +7,25 @@ import altair as alt
 import pandas as pd
 import streamlit as st
 
-from helper_activities_caching import (
-    cache_all_activities_and_gears,
-    reduce_and_rename_activity_df_for_stats,
+from helper import CACHE_TTL_ACTIVITIES
+from helper_activities_caching import get_activities_cache_key, get_activities_stats_df
+from helper_charts import base_chart, chart_data, chart_spec, show_chart
+from helper_daily_index import (
+    DailyIndex,
+    active_days_per_year,
+    ewma,
+    get_daily_index,
+    rolling_sum,
+    streaks,
 )
 from helper_logging import get_logger_from_filename, track_function_usage
 from helper_pandas import reorder_cols
-from helper_ui_components import excel_download_buttons, list_sports, select_sport
+from helper_ui_components import (
+    columnar_download_buttons,
+    excel_download_buttons,
+    list_sports,
+    select_sport,
+)
 
 _LOGGER = get_logger_from_filename(__file__)
 
@@ -33,6 +45,13 @@ AGGREGATIONS = {
     "Heartrate-max": "max",
 }
 
+TIME_UNITS = {
+    "Year": "utcyear(date):T",
+    "Quarter": "utcyearquarter(date):T",
+    "Month": "utcyearmonth(date):T",
+    "Week": "utcyearmonthdate(date):T",
+}
+
 FREQ_CFG = {
     "Week": {
         "groupby": ["year", "week", "type"],
@@ -216,8 +235,8 @@ def get_cell(
 
 
 def main() -> None:  # noqa: D103
-    df = cache_all_activities_and_gears()[0]
-    df = reduce_and_rename_activity_df_for_stats(df)
+    df = get_activities_stats_df()
+    idx = get_daily_index(df)
 
     cols = st.columns((1, 1, 3, 1))
 
@@ -241,53 +260,76 @@ def main() -> None:  # noqa: D103
     if sel_year:
         df = df.query("year >= @sel_year[0] and year <= @sel_year[1]")
 
-    # TODO: to streamlit-examples
-    # altair time units https://altair-viz.github.io/user_guide/transform/timeunit.html
-    if sel_freq == "Year":
-        time_unit = "year(date):T"
-    elif sel_freq == "Quarter":
-        time_unit = "yearquarter(date):T"
-    elif sel_freq == "Month":
-        time_unit = "yearmonth(date):T"
-    elif sel_freq == "Week":
-        time_unit = "date:T"
-    else:
-        time_unit = "date:T"
+    # selection the cached groupings and charts depend on
+    data_key = (get_activities_cache_key(), tuple(sel_year))
 
-    all_act(df=df, sel_freq=sel_freq, time_unit=time_unit)
-    compare_to_prev(df=df, sel_freq=sel_freq, sel_agg=sel_agg)
-    per_sport(df=df, sel_freq=sel_freq, sel_agg=sel_agg, time_unit=time_unit)
-    active_days(df)
+    all_act(df=df, data_key=data_key, sel_freq=sel_freq)
+    compare_to_prev(df=df, data_key=data_key, sel_freq=sel_freq, sel_agg=sel_agg)
+    per_sport(df=df, data_key=data_key, sel_freq=sel_freq, sel_agg=sel_agg)
+    active_days(df=df, idx=idx, sel_year=sel_year)
+    training_load(df=df, idx=idx, sel_year=sel_year)
 
 
-def all_act(df: pd.DataFrame, sel_freq: str, time_unit: str) -> None:
-    """Count for all activities."""
-    st.header(f"All Activity {sel_freq} Count")
-    st.write("Note: in the following, 'VirtualRide' is counted as 'Ride'.")
-    aggregation = "Count"
-    df2 = activity_stats_grouping(
-        df, freq=sel_freq, sport="ALL", aggregation=aggregation
-    )
+@st.cache_data(ttl=CACHE_TTL_ACTIVITIES, max_entries=500)
+@track_function_usage
+def cache_stats_grouping(
+    data_key: tuple, freq: str, sport: str, aggregation: str, _df: pd.DataFrame
+) -> pd.DataFrame:
+    """Cache activity_stats_grouping() per activities cache key and year range."""
+    _ = data_key  # part of the cache key only
+    return activity_stats_grouping(_df, freq=freq, sport=sport, aggregation=aggregation)
+
 
+@st.cache_resource(ttl=CACHE_TTL_ACTIVITIES, max_entries=500)
+@track_function_usage
+def cache_stats_chart_spec(
+    data_key: tuple, freq: str, sport: str, aggregation: str, _df2: pd.DataFrame
+) -> dict:
+    """
+    Cache bar chart spec of activity_stats_grouping() result.
+
+    sport == ALL: stacked by sport
+    """
+    _ = data_key  # part of the cache key only
+    # altair time units https://altair-viz.github.io/user_guide/transform/timeunit.html
+    # utc, since chart_data() converts the dates to UTC timestamps
+    time_unit = TIME_UNITS[freq]
+    fields = [freq, "date", aggregation]
+    tooltip = [alt.Tooltip(f"{freq}:N"), alt.Tooltip(f"{aggregation}:Q")]
+    if sport == "ALL":
+        fields.append("Sport")
+        tooltip.insert(1, alt.Tooltip("Sport:N"))
+        title = f"Strava Stats: All Activity {freq} {aggregation}"
+        encoding = {"color": alt.Color("Sport:N")}
+    else:
+        title = f"Strava Stats: {sport} {freq} {aggregation}"
+        encoding = {}
     c = (
-        alt.Chart(
-            df2,
-            title=alt.TitleParams(f"Strava Stats: All Activity {sel_freq} Count"),
-        )
+        base_chart(title=alt.TitleParams(title))
         .mark_bar()
         .encode(
             x=alt.X(time_unit, title=None),
             y=alt.Y(f"{aggregation}:Q", title=None),
-            color="Sport:N",
-            tooltip=[
-                # alt.Tooltip(time_unit, title="Date"),
-                alt.Tooltip(sel_freq),
-                alt.Tooltip("Sport:N"),
-                alt.Tooltip(f"{aggregation}:Q"),
-            ],
+            tooltip=tooltip,
+            **encoding,
+        )
+    )
+    return chart_spec(c, chart_data(_df2, fields))
+
+
+def all_act(df: pd.DataFrame, data_key: tuple, sel_freq: str) -> None:
+    """Count for all activities."""
+    st.header(f"All Activity {sel_freq} Count")
+    st.write("Note: in the following, 'VirtualRide' is counted as 'Ride'.")
+    aggregation = "Count"
+    df2 = cache_stats_grouping(
+        data_key, freq=sel_freq, sport="ALL", aggregation=aggregation, _df=df
+    )
+    show_chart(
+        cache_stats_chart_spec(
+            data_key, freq=sel_freq, sport="ALL", aggregation=aggregation, _df2=df2
         )
     )
-    st.altair_chart(c, width="stretch")
 
     df2b = (
         df2.pivot_table(
@@ -300,12 +342,16 @@ def all_act(df: pd.DataFrame, sel_freq: str, time_unit: str) -> None:
     st.dataframe(df2b, hide_index=True)
 
 
-def compare_to_prev(df: pd.DataFrame, sel_freq: str, sel_agg: str) -> None:
+def compare_to_prev(
+    df: pd.DataFrame, data_key: tuple, sel_freq: str, sel_agg: str
+) -> None:
     """Compare to previous time period."""
     st.header("Compare to Previous Period")
 
     df2c = (
-        activity_stats_grouping(df, freq=sel_freq, sport="ALL", aggregation=sel_agg)
+        cache_stats_grouping(
+            data_key, freq=sel_freq, sport="ALL", aggregation=sel_agg, _df=df
+        )
         .drop(columns=["date"])
         .sort_values([sel_freq, "Sport"], ascending=(False, True))
     )
@@ -339,7 +385,8 @@ def compare_to_prev(df: pd.DataFrame, sel_freq: str, sel_agg: str) -> None:
             # col.metric(label=periods[2], value=prev2, delta=round(prev2 - prev3, 1))
 
 
-def per_sport(df: pd.DataFrame, sel_freq: str, sel_agg: str, time_unit: str) -> None:
+@st.fragment
+def per_sport(df: pd.DataFrame, data_key: tuple, sel_freq: str, sel_agg: str) -> None:
     """Statistics per sport/activity type."""
     st.header("Per Sport")
     col1, _ = st.columns((1, 5))
@@ -348,26 +395,14 @@ def per_sport(df: pd.DataFrame, sel_freq: str, sel_agg: str, time_unit: str) ->
     assert sel_type is not None
 
     # df2 has 1 sport and all aggregations
-    df2 = activity_stats_grouping(
-        df, freq=sel_freq, sport=sel_type, aggregation="ALL"
+    df2 = cache_stats_grouping(
+        data_key, freq=sel_freq, sport=sel_type, aggregation="ALL", _df=df
     ).drop(columns="Sport")
-
-    c = (
-        alt.Chart(
-            df2,
-            title=alt.TitleParams(f"Strava Stats: {sel_type} {sel_freq} {sel_agg}"),
-        )
-        .mark_bar()
-        .encode(
-            x=alt.X(time_unit, title=None),
-            y=alt.Y(f"{sel_agg}:Q", title=None),
-            tooltip=[
-                alt.Tooltip(sel_freq),
-                alt.Tooltip(f"{sel_agg}:Q"),
-            ],
+    show_chart(
+        cache_stats_chart_spec(
+            data_key, freq=sel_freq, sport=sel_type, aggregation=sel_agg, _df2=df2
         )
     )
-    st.altair_chart(c, width="stretch")
 
     column_order = [sel_freq]  # date frequency
     column_order.extend(AGGREGATIONS.keys())
@@ -383,28 +418,28 @@ def per_sport(df: pd.DataFrame, sel_freq: str, sel_agg: str, time_unit: str) ->
         df2[column_order],
         file_name=f"Strava {title}.xlsx",
         exclude_index=True,
+        cache_key=(data_key, sel_freq, sel_type),
+    )
+    columnar_download_buttons(
+        df2[column_order],
+        file_stem=f"Strava {title}",
+        cache_key=(data_key, sel_freq, sel_type),
     )
 
 
-def active_days(df: pd.DataFrame) -> None:
-    """Active days in selected time resolution."""
+@st.fragment
+def active_days(df: pd.DataFrame, idx: DailyIndex, sel_year: tuple[int, int]) -> None:
+    """Active days per year and streaks."""
     st.header("Active Days")
     sel_types = st.multiselect(label="Sports", options=list_sports(df))
-    if sel_types:
-        df = df.query("type in @sel_types")
-
-    year_min, year_max = int(df["year"].min()), int(df["year"].max())  # type: ignore
 
     df3 = (
-        df.loc[:, ["year", "date"]]
-        .drop_duplicates()
-        .groupby("year")
-        .count()
-        .rename(columns={"date": "Count"})  # type: ignore[arg-type]
-        .reindex(list(range(year_min, year_max + 1)), fill_value=0)
+        active_days_per_year(idx, sports=sel_types)
+        .loc[sel_year[0] : sel_year[1]]
+        .rename("Count")
+        .rename_axis("year")
         .reset_index()
     )
-
     df3["date"] = df3.apply(lambda row: dt.date(row["year"], 1, 1), axis=1)
 
     c = (
@@ -421,6 +456,49 @@ def active_days(df: pd.DataFrame) -> None:
     )
     st.altair_chart(c, width="stretch")
 
+    streak_current, streak_longest = streaks(idx, sports=sel_types)
+    cols = st.columns(4)
+    cols[0].metric(label="Current Streak", value=f"{streak_current} d")
+    cols[1].metric(label="Longest Streak", value=f"{streak_longest} d")
+
+
+@st.fragment
+def training_load(df: pd.DataFrame, idx: DailyIndex, sel_year: tuple[int, int]) -> None:
+    """Display rolling and exponentially weighted training hours per week."""
+    st.header("Training Load")
+    sel_types = st.multiselect(
+        label="Sports", options=list_sports(df), key="sel_types_load"
+    )
+
+    df4 = pd.DataFrame(
+        {
+            "7 days": rolling_sum(idx, "Minutes", window=7, sports=sel_types) / 60,
+            "42 days EWMA": ewma(idx, "Minutes", span=42, sports=sel_types) * 7 / 60,
+        }
+    )
+    df4 = df4.loc[str(sel_year[0]) : str(sel_year[1])].round(1)
+    df4 = (
+        df4.rename_axis("date")
+        .reset_index()
+        .melt(id_vars="date", var_name="Window", value_name="Hours")
+    )
+
+    c = (
+        alt.Chart(df4, title=alt.TitleParams("Hours per Week"))
+        .mark_line()
+        .encode(
+            x=alt.X("date:T", title=None),
+            y=alt.Y("Hours:Q", title=None),
+            color="Window:N",
+            tooltip=[
+                alt.Tooltip("date:T", title="Date"),
+                alt.Tooltip("Window:N"),
+                alt.Tooltip("Hours:Q"),
+            ],
+        )
+    )
+    st.altair_chart(c, width="stretch")
+
 
 # Add download button
 # No because the required lib vl-convert-python is quite huge
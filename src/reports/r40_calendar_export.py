@@ -1,14 +1,25 @@
 """Calendar Export."""
 
-import datetime as dt
-
 import pandas as pd
 import streamlit as st
 
+from helper import CACHE_TTL_ACTIVITIES
 from helper_activities_caching import (
     cache_all_activities_and_gears,
+    get_activities_cache_key,
+)
+from helper_ics import (
+    cache_ics_events,
+    disable_ics_feed,
+    enable_ics_feed,
+    gen_ics_events,
+    get_ics_feed_path,
+    get_ics_feed_url,
+    ics_feed_configured,
+    iter_ics,
 )
 from helper_logging import get_logger_from_filename, track_function_usage
+from helper_ui_components import list_sports
 
 _LOGGER = get_logger_from_filename(__file__)
 
@@ -16,75 +27,89 @@ FILE_NAME = "Strava_Activity_Calendar.ics"
 
 
 @track_function_usage
-def gen_ics(df: pd.DataFrame) -> str:  # type: ignore[attr-defined,misc]
-    """Generate calender in ICS format, dates in UTC."""
-    date_str_now = dt.datetime.now(tz=dt.UTC).strftime("%Y%m%dT%H%M%SZ")
-
-    ics_header = """BEGIN:VCALENDAR
-CALSCALE:GREGORIAN
-VERSION:2.0
-X-WR-CALNAME:Strava Activity Export by entorb.net
-METHOD:PUBLISH
-"""
-    ics_footer = "END:VCALENDAR"
-
-    cont = ics_header
-
-    df = df.reset_index()  # id as column
-
-    for row in df.itertuples():  # type: ignore[attr-defined]
-        assert type(row.start_date_local) is pd.Timestamp, type(row.start_date_local)  # type: ignore[attr-defined]
-        assert type(row.utc_offset) is int, type(row.utc_offset)  # type: ignore[attr-defined]
-        assert type(row.elapsed_time) is int, type(row.elapsed_time)  # type: ignore[attr-defined]
-        assert type(row.x_min) is float, type(row.x_min)  # type: ignore[attr-defined]
-
-        # note I renamed Strava field start_date_local to start_date
-        start_date = row.start_date_local - dt.timedelta(seconds=row.utc_offset)  # type: ignore[attr-defined]
-        end_date = start_date + dt.timedelta(seconds=row.elapsed_time)  # type: ignore[attr-defined]
-        start_date_str = start_date.strftime("%Y%m%dT%H%M%SZ")
-        end_date_str = end_date.strftime("%Y%m%dT%H%M%SZ")
-
-        location = row.x_nearest_city_start or "unknown"  # type: ignore[attr-defined]
-        for col in ("location_city", "location_state", "location_country"):
-            if getattr(row, col):
-                location += "," + getattr(row, col)
-
-        row_id = row.id  # type: ignore[attr-defined]
-        row_type = row.type  # type: ignore[attr-defined]
-        row_name = row.name  # type: ignore[attr-defined]
-        row_x_min = row.x_min  # type: ignore[attr-defined]
-        row_x_url = row.x_url  # type: ignore[attr-defined]
-        # cspell:disable
-        cont += f"""BEGIN:VEVENT
-UID:strava-id-{row_id}
-TRANSP:OPAQUE
-DTSTART:{start_date_str}
-DTEND:{end_date_str}
-CREATED:{end_date_str}
-LAST-MODIFIED:{date_str_now}
-DTSTAMP:{date_str_now}
-SUMMARY:{row_type}: {row_name} ({round(row_x_min)} min) (Strava)
-LOCATION:{location}
-URL;VALUE=URI:{row_x_url}
-DESCRIPTION:open at Strava: {row_x_url}\\n\\ngenerated via https://entorb.net/strava/
-SEQUENCE:0
-END:VEVENT
-"""  # cspell:enable
-
-    cont += ics_footer
-    return cont
+def gen_ics(df: pd.DataFrame, events: pd.Series | None = None) -> str:
+    """
+    Generate calender in ICS format, dates in UTC.
+
+    events: precomputed VEVENT blocks of df, see cache_ics_events()
+    """
+    if events is None:
+        events = gen_ics_events(df)
+    return "".join(iter_ics(events))
+
+
+@st.cache_resource(ttl=CACHE_TTL_ACTIVITIES, max_entries=20)
+@track_function_usage
+def cache_ics_bytes(
+    cache_key: tuple[int, int, int],
+    sel_types: tuple[str, ...],
+    sel_year: tuple[int, int],
+    _df: pd.DataFrame,
+) -> bytes:
+    """Cache filtered calendar file, joined from the cached events."""
+    mask = _df["x_year"].between(sel_year[0], sel_year[1])
+    if sel_types:
+        mask &= _df["type"].isin(sel_types)
+    events = cache_ics_events(cache_key, _df=_df)
+    return gen_ics(_df.loc[mask], events=events.loc[mask]).encode("utf-8")
+
+
+def feed_subscription(df: pd.DataFrame) -> None:
+    """Enable/disable the subscribable feed and show its URL."""
+    st.subheader("Calendar Subscription")
+    if not ics_feed_configured():
+        st.caption("Not configured, ics_feed_secret is missing in the secrets.")
+        return
+    user_id = st.session_state["USER_ID"]
+    has_feed = get_ics_feed_path(user_id).exists()
+    sel_feed = st.toggle(
+        "Subscribable calendar, updated when the app loads new activities",
+        value=has_feed,
+    )
+    if sel_feed and not has_feed:
+        enable_ics_feed(user_id, df)
+    elif not sel_feed and has_feed:
+        disable_ics_feed(user_id)
+    if sel_feed:
+        url = get_ics_feed_url(user_id)
+        if url:
+            st.code(url, language=None)
+        else:
+            st.caption(f"Feed file: {get_ics_feed_path(user_id).name}")
 
 
 def main() -> None:  # noqa: D103
     df = cache_all_activities_and_gears()[0]
+    cache_key = get_activities_cache_key()
+
+    col1, col2, _ = st.columns((2, 2, 2))
+    sel_types = col1.multiselect(label="Sports", options=list_sports(df))
+    year_min, year_max = int(df["x_year"].min()), int(df["x_year"].max())
+    sel_year = col2.slider(
+        "Year",
+        min_value=year_min,
+        max_value=year_max if year_max != year_min else year_min + 1,
+        value=(year_min, year_max),
+    )
+
+    def _make_ics() -> bytes:
+        # generated on click only, events are cached and filtered
+        return cache_ics_bytes(
+            cache_key,
+            tuple(sel_types),
+            tuple(sel_year),
+            _df=df,
+        )
 
     st.download_button(
         label="Download ICS",
-        data=gen_ics(df).encode("utf-8"),
+        data=_make_ics,
         file_name=FILE_NAME,
         mime="text/calendar",
     )
 
+    feed_subscription(df)
+
 
 if __name__ == "__main__":
     main()
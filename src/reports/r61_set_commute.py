@@ -1,11 +1,16 @@
 """Set Commute."""
 
+from functools import partial
 from zoneinfo import ZoneInfo
 
 import streamlit as st
 
-from helper_activities_caching import cache_all_activities_and_gears
+from helper_activities_caching import (
+    cache_all_activities_and_gears,
+    patch_activities_commute,
+)
 from helper_api import set_commute
+from helper_bulk_write import bulk_write, results_df
 from helper_logging import (
     get_logger_from_filename,
 )
@@ -15,6 +20,35 @@ TZ_DE = ZoneInfo("Europe/Berlin")
 _LOGGER = get_logger_from_filename(__file__)
 
 
+def set_commute_bulk(ids: list[int]) -> None:
+    """Set commute flag concurrently, show progress and per activity errors."""
+    token = st.session_state["TOKEN"]
+    total = len(ids)
+    bar = st.progress(0.0, text=f"Updating {total} activities ...")
+
+    def on_progress(done: int, total: int) -> None:
+        bar.progress(done / total, text=f"{done} of {total} activities updated")
+
+    results = bulk_write(
+        {i: partial(set_commute, i, token=token, raise_errors=True) for i in ids},
+        on_progress=on_progress,
+    )
+    bar.empty()  # remove bar when done
+    failed = [r.key for r in results if not r.ok]
+    if len(failed) < total:
+        # update the cached activities as well
+        patch_activities_commute(
+            st.session_state["USER_ID"], [r.key for r in results if r.ok]
+        )
+        st.success(f"Updated {total - len(failed)} activity/activities on Strava.")
+    if failed:
+        st.error(f"Failed to update {len(failed)} activity/activities.")
+        st.dataframe(results_df([r for r in results if not r.ok]))
+        st.session_state["commute_failed"] = failed
+    else:
+        st.session_state.pop("commute_failed", None)
+
+
 def main() -> None:
     """Set commute flag for multiple ride activities."""
     if "activity:write" not in st.session_state["API_SCOPE"]:
@@ -49,15 +83,12 @@ def main() -> None:
         selected = edited[edited["select"]]
         if st.form_submit_button("Set Commute"):
             ids = selected.index.tolist()
-            total = len(ids)
-            if total:
-                bar = st.progress(0)
-                for i, activity_id in enumerate(ids, start=1):
-                    set_commute(activity_id)
-                    bar.progress(i / total)
-                bar.empty()  # remove bar when done, or replace with success message
-                st.success(f"Updated {total} activity/activities on Strava.")
-                st.info("Data here is cached for 2h, so now outdated.")
+            if ids:
+                set_commute_bulk(ids)
+
+    failed = st.session_state.get("commute_failed")
+    if failed and st.button(f"Retry {len(failed)} failed"):
+        set_commute_bulk(failed)
 
 
 if __name__ == "__main__":
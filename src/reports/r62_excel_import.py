@@ -1,32 +1,33 @@
 """Excel Import."""
 
+from functools import partial
 from zoneinfo import ZoneInfo
 
 import pandas as pd
 import streamlit as st
+from streamlit.runtime.uploaded_file_manager import UploadedFile
 
-from helper_activities_caching import cache_all_activities_and_gears
+from helper_activities_caching import (
+    cache_all_activities_and_gears,
+    patch_activities_new,
+)
 from helper_api import post_activity
+from helper_bulk_write import bulk_write
+from helper_import import (
+    IMPORT_COLS,
+    activity_params,
+    find_duplicates,
+    read_import_workbook,
+    validate_import,
+)
 from helper_logging import get_logger_from_filename
 
 TZ_DE = ZoneInfo("Europe/Berlin")
 
 _LOGGER = get_logger_from_filename(__file__)
 
-COLS = {
-    "Type": "object",
-    "Date": "datetime64[ns]",
-    "Duration (s)": "Int64",
-    "Distance (m)": "float64",
-    "Name": "object",
-    "Description": "object",
-    "Commute": "Int64",
-    "Elevation gain": "float64",
-    "Gear ID": "object",
-}
 
-
-def main() -> None:  # noqa: C901, PLR0912, PLR0915
+def main() -> None:
     """Upload activities from Excel."""
     if "activity:write" not in st.session_state["API_SCOPE"]:
         # TODO: sync with r61
@@ -38,9 +39,8 @@ def main() -> None:  # noqa: C901, PLR0912, PLR0915
 
     st.header("List of all your gear to be used in the import.")
 
-    df_gear = cache_all_activities_and_gears()[1].reset_index()[
-        ["id", "name", "nickname"]
-    ]
+    df_activities, df_gear = cache_all_activities_and_gears()
+    df_gear = df_gear.reset_index()[["id", "name", "nickname"]]
     st.dataframe(df_gear, hide_index=True)
 
     st.markdown("""
@@ -74,32 +74,26 @@ def main() -> None:  # noqa: C901, PLR0912, PLR0915
     }
 
     # --- Excel upload ---
-    uploaded = st.file_uploader("Import activities from Excel", type=["xlsx", "xls"])
-    if uploaded:
-        try:
-            imported = pd.read_excel(
-                uploaded,
-                dtype={k: v for k, v in COLS.items() if v == "object"},
-            )
-            imported.columns = imported.columns.str.replace("*", "", regex=False)
-            missing = [c for c in COLS if c not in imported.columns]
-            if missing:
-                st.error(f"Missing columns in Excel file: {missing}")
-            else:
-                imported = imported[list(COLS)]
-                imported["Date"] = pd.to_datetime(imported["Date"])
-                for col in (k for k, v in COLS.items() if v == "Int64"):
-                    imported[col] = imported[col].astype("Int64")
-                for col in (k for k, v in COLS.items() if v == "object"):
-                    imported[col] = imported[col].fillna("").astype(str)  # type: ignore[union-attr]
-                st.session_state.df = imported
-                st.success(f"Loaded {len(imported)} rows.")
-        except Exception as e:  # noqa: BLE001
-            st.error(f"Failed to read Excel file: {e}")
+    uploaded = st.file_uploader("Import activities from Excel", type=["xlsx"])
+    # parse each uploaded file once, keeping edits in the editor on reruns,
+    # again if the table was released after inactivity, see helper_sessions
+    if uploaded and (
+        st.session_state.get("import_file_id") != uploaded.file_id
+        or "df" not in st.session_state
+    ):
+        st.session_state["import_file_id"] = uploaded.file_id
+        load_workbook(uploaded, gear_ids=df_gear["id"])
+    df_errors = st.session_state.get("import_errors")
+    if uploaded and df_errors is not None and not df_errors.empty:
+        st.error(
+            f"{len(df_errors)} rows have errors and were not loaded. "
+            "Please fix them in Excel and upload again:"
+        )
+        st.dataframe(df_errors)
 
     if "df" not in st.session_state:
         st.session_state.df = pd.DataFrame(
-            {col: pd.Series(dtype=t) for col, t in COLS.items()}
+            {col: pd.Series(dtype=t) for col, t in IMPORT_COLS.items()}
         )
 
     edited_df = st.data_editor(
@@ -115,77 +109,145 @@ def main() -> None:  # noqa: C901, PLR0912, PLR0915
     if rows_to_submit.empty:
         return
 
+    # pre-flight: check for existing activities
+    rows_to_submit = check_duplicates(df_activities, rows_to_submit)  # type: ignore[arg-type]
+    if rows_to_submit.empty:
+        return
+
     st.write(f"Ready to submit {len(rows_to_submit)} activities.")
 
     if st.button("Submit to Strava", type="primary"):
-        errors = []
-        responses = []
-        for _, row in rows_to_submit.iterrows():
-            name = str(row["Name"])  # type: ignore
-            try:
-                distance = row["Distance (m)"]  # type: ignore
-                gear_id = str(row["Gear ID"]) or None  # type: ignore
-                elev_gain_val = row["Elevation gain"]  # type: ignore
-                # Convert to float or None - handle pd.NA and None
-                if elev_gain_val is None:  # type: ignore[arg-type]
-                    elev_gain = None
-                else:
-                    try:
-                        elev_gain = float(elev_gain_val)
-                    except (TypeError, ValueError):
-                        elev_gain = None
-                commute = bool(row["Commute"])  # type: ignore
-
-                date_str = pd.Timestamp(row["Date"]).strftime("%Y-%m-%d %H:%M:%S")  # type: ignore
-
-                resp = post_activity(
-                    act_type=str(row["Type"]),  # type: ignore
-                    name=name,
-                    date=date_str,
-                    duration=int(row["Duration (s)"]),  # type: ignore
-                    distance=float(distance) if pd.notna(distance) else None,  # type: ignore[arg-type]
-                    desc=str(row["Description"]) or None,  # type: ignore
-                    commute=commute,
-                    gear_id=gear_id,
-                    elev_gain=int(elev_gain) if elev_gain else None,  # type: ignore[arg-type]
-                )
-                responses.append(
-                    {
-                        # "id": resp.get("id"),
-                        "URL": f"https://www.strava.com/activities/{resp.get('id')}",
-                        "Type": resp.get("type"),
-                        "Date": pd.to_datetime(
-                            resp.get("start_date_local", "").rstrip("Z")
-                        ),
-                        "Name": resp.get("name"),
-                        "Description": resp.get("description"),
-                        "Duration": resp.get("elapsed_time"),
-                        "Distance": resp.get("distance"),
-                        "Elevation Gain": resp.get("total_elevation_gain"),
-                        "Gear ID": resp.get("gear_id"),
-                        "Gear Name": (resp.get("gear") or {}).get("name"),
-                    }
-                )
-            except Exception as e:
-                errors.append(name)
-                st.error(f"Failed to post '{name}': {e}")
-                _LOGGER.exception("Failed to post activity '%s'", name)
-
-        if responses:
-            st.success(f"'{len(responses)}' activities created successfully:")
-
-            st.dataframe(
-                pd.DataFrame(responses),
-                column_config={
-                    "URL": st.column_config.LinkColumn("URL", display_text="🔗"),
-                },
-                hide_index=True,
-            )
-
-        if not errors:
-            st.session_state.df = pd.DataFrame(
-                {col: pd.Series(dtype=t) for col, t in COLS.items()}
-            )
+        submit_activities(rows_to_submit)  # type: ignore[arg-type]
+
+
+def load_workbook(uploaded: UploadedFile, gear_ids: pd.Series) -> None:
+    """Read and validate workbook, load valid rows into the editor."""
+    st.session_state.pop("import_errors", None)
+    try:
+        raw = read_import_workbook(uploaded)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    except Exception as e:  # noqa: BLE001
+        st.error(f"Failed to read Excel file: {e}")
+        return
+    imported, errors = validate_import(raw, gear_ids=gear_ids)
+    is_invalid = errors != ""
+    st.session_state.df = imported.loc[~is_invalid].reset_index(drop=True)
+    st.success(f"Loaded {(~is_invalid).sum()} of {len(imported)} rows.")
+    # per row error report, index is the row number in Excel
+    df_errors = raw.loc[is_invalid, ["Date", "Name"]].astype(str)
+    df_errors["Error"] = errors[is_invalid]
+    st.session_state["import_errors"] = df_errors
+
+
+def check_duplicates(
+    df_activities: pd.DataFrame, rows_to_submit: pd.DataFrame
+) -> pd.DataFrame:
+    """Show rows matching existing activities, return rows to submit."""
+    dups = find_duplicates(
+        df_activities,
+        types=rows_to_submit["Type"],
+        starts=rows_to_submit["Date"],
+        durations=rows_to_submit["Duration (s)"],
+    )
+    is_dup = dups["Duplicate"] != ""
+    if not is_dup.any():
+        return rows_to_submit
+    st.warning(
+        f"{is_dup.sum()} activities already exist at Strava "
+        "(checked against the loaded years only):"
+    )
+    df_dups = rows_to_submit.loc[is_dup, ["Type", "Date", "Name"]].join(dups)
+    df_dups["Existing"] = "https://www.strava.com/activities/" + df_dups[
+        "Existing"
+    ].astype(str)
+    st.dataframe(
+        df_dups,
+        column_config={
+            "Existing": st.column_config.LinkColumn(
+                "Existing", display_text=r"/(\d+)$"
+            ),
+        },
+        hide_index=True,
+    )
+    if st.checkbox("Skip these duplicates", value=True):
+        return rows_to_submit.loc[~is_dup]
+    return rows_to_submit
+
+
+def submit_activities(rows_to_submit: pd.DataFrame) -> None:
+    """Post activities concurrently, show created ones and per row errors."""
+    token = st.session_state["TOKEN"]
+    items = {
+        row_no: partial(post_activity, **params, token=token, raise_errors=True)
+        for row_no, params in activity_params(rows_to_submit).items()
+    }
+
+    total = len(rows_to_submit)
+    bar = st.progress(0.0, text=f"Creating {total} activities ...")
+
+    def on_progress(done: int, total: int) -> None:
+        bar.progress(done / total, text=f"{done} of {total} activities created")
+
+    # creates are not idempotent, so timeouts and 5xx are not retried
+    results = bulk_write(
+        items,  # type: ignore[arg-type]
+        on_progress=on_progress,
+        idempotent=False,
+    )
+    bar.empty()
+
+    responses = []
+    errors = {}
+    for res in results:
+        if not res.ok:
+            errors[res.key] = res.error
+            continue
+        resp: dict = res.result  # type: ignore[assignment]
+        responses.append(
+            {
+                # "id": resp.get("id"),
+                "URL": f"https://www.strava.com/activities/{resp.get('id')}",
+                "Type": resp.get("type"),
+                "Date": pd.to_datetime(resp.get("start_date_local", "").rstrip("Z")),
+                "Name": resp.get("name"),
+                "Description": resp.get("description"),
+                "Duration": resp.get("elapsed_time"),
+                "Distance": resp.get("distance"),
+                "Elevation Gain": resp.get("total_elevation_gain"),
+                "Gear ID": resp.get("gear_id"),
+                "Gear Name": (resp.get("gear") or {}).get("name"),
+            }
+        )
+
+    if responses:
+        # add them to the cached activities as well
+        patch_activities_new(
+            st.session_state["USER_ID"],
+            [r.result for r in results if r.ok],  # type: ignore[misc]
+        )
+        st.success(f"'{len(responses)}' activities created successfully:")
+
+        st.dataframe(
+            pd.DataFrame(responses),
+            column_config={
+                "URL": st.column_config.LinkColumn("URL", display_text="🔗"),
+            },
+            hide_index=True,
+        )
+
+    if errors:
+        df_errors = rows_to_submit.loc[list(errors), ["Name"]]
+        df_errors["Error"] = df_errors.index.map(errors)
+        st.error(f"Failed to post {len(errors)} activities, they are kept for retry:")
+        st.dataframe(df_errors, hide_index=True)
+        # keep failed rows only, so they can be submitted again
+        st.session_state.df = st.session_state.df.loc[list(errors)]
+    else:
+        st.session_state.df = pd.DataFrame(
+            {col: pd.Series(dtype=t) for col, t in IMPORT_COLS.items()}
+        )
 
 
 if __name__ == "__main__":
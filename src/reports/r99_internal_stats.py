@@ -3,12 +3,28 @@
 import pandas as pd
 import streamlit as st
 
+from helper_cache_stats import get_cache_stats
 from helper_logging import (
     get_call_stats,
     get_logger_from_filename,
     get_page_count,
     get_user_login_count,
 )
+from helper_memory import (
+    TRACEMALLOC_FRACTION,
+    get_memory_attribution,
+    get_page_memory,
+    process_memory,
+)
+from helper_metrics import WINDOWS, get_latency_stats
+from helper_profiler import PROFILE_MODES, get_profiler_state, request_profile
+from helper_sessions import (
+    LARGE_OBJECT_BYTES,
+    SESSION_IDLE_RECLAIM,
+    get_session_stats,
+    sweep_sessions,
+)
+from helper_ui_components import list_report_pages
 
 _LOGGER = get_logger_from_filename(__file__)
 
@@ -46,6 +62,169 @@ def main() -> None:  # noqa: D103
     df["total_time"] = df["total_time"].round(3)
     st.dataframe(df, hide_index=True)
 
+    cache_stats()
+    latency_stats()
+    memory_stats()
+    profiler()
+
+
+def cache_stats() -> None:
+    """Show hits and misses of cached functions, total and per user."""
+    st.header("Cache Stats")
+    df = get_cache_stats()
+    if df.empty:
+        return
+    df["size_MB"] = df.pop("size_bytes") / 1_048_576
+    df_fct = df.groupby("function").agg(
+        {
+            "calls": "sum",
+            "hits": "sum",
+            "misses": "sum",
+            "evictions": "sum",
+            "compute_time": "sum",
+            "size_MB": "max",
+        }
+    )
+    df_fct["hit_ratio"] = df_fct["hits"] / df_fct["calls"]
+    df_fct["ms_per_miss"] = 1000 * df_fct["compute_time"] / df_fct["misses"]
+    st.caption(
+        "evictions: re-computed after TTL expiry or max_entries eviction, "
+        "size_MB: latest entry, max of all users"
+    )
+    st.dataframe(df_fct.sort_values("compute_time", ascending=False).round(3))
+    with st.expander("Per user"):
+        st.dataframe(
+            df.sort_values(["function", "calls"], ascending=[True, False]).round(3),
+            hide_index=True,
+            column_config={"user": st.column_config.TextColumn()},
+        )
+
+
+def latency_df(kind: str, window_s: int) -> pd.DataFrame:
+    """Percentiles in ms per name, slowest p95 first."""
+    df = pd.DataFrame(get_latency_stats(kind, window_s)).T
+    if df.empty:
+        return df
+    df["count"] = df["count"].astype(int)
+    return df.sort_values("p95", ascending=False).round(1)
+
+
+def latency_stats() -> None:
+    """Show latency percentiles of pages, page phases and functions."""
+    st.header("Latency (ms)")
+    sel_window = st.radio("Window", options=list(WINDOWS), horizontal=True)
+    window_s = WINDOWS[sel_window]  # type: ignore[index]
+
+    st.subheader("Pages")
+    st.dataframe(latency_df("page", window_s))
+
+    st.subheader("Page Phases")
+    st.caption(
+        "Time per run, excluding nested phases, e.g. the Strava API calls of a "
+        "cache load. Rendering is the remaining time of the page."
+    )
+    df = latency_df("phase", window_s)
+    if not df.empty:
+        df.index = pd.MultiIndex.from_tuples(
+            [tuple(i.split(": ", 1)) for i in df.index], names=["page", "phase"]
+        )
+        df = df.sort_index()
+    st.dataframe(df)
+
+    st.subheader("Functions")
+    st.caption("Functions tracked with latency=True, e.g. the Strava API calls.")
+    st.dataframe(latency_df("function", window_s))
+
+
+def memory_stats() -> None:
+    """Show process memory, peak per page and per user attribution."""
+    st.header("Memory (MB)")
+    mem = process_memory()
+    if mem:
+        col1, col2 = st.columns(2)
+        col1.metric("RSS", round(mem["VmRSS"] / 1_048_576, 1))
+        col2.metric("Peak RSS", round(mem["VmHWM"] / 1_048_576, 1))
+    st.subheader("Pages")
+    st.caption(
+        f"{TRACEMALLOC_FRACTION:.0%} of runs are traced by tracemalloc. "
+        "RSS growth and traced peak are process-wide, so they include other "
+        "sessions running at the same time."
+    )
+    st.dataframe(get_page_memory().round(1))
+    st.subheader("Users")
+    st.caption(
+        "cache: latest entry per cached function, "
+        "session_state: all sessions of the user, as of the latest sweep"
+    )
+    st.dataframe(
+        get_memory_attribution().round(1),
+        column_config={"_index": st.column_config.TextColumn("user")},
+    )
+    st.subheader("Sessions")
+    st.caption(
+        f"Objects of at least {LARGE_OBJECT_BYTES / 1_048_576:.0f} MB are released "
+        f"after {SESSION_IDLE_RECLAIM.total_seconds() / 60:.0f} min of inactivity."
+    )
+    if st.button("Sweep now"):
+        sweep_sessions()
+    df = get_session_stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Sessions", len(df))
+    col2.metric("Session state MB", round(df["MB"].sum(), 1))
+    col3.metric("Released MB", round(df["reclaimed_MB"].sum(), 1))
+    st.dataframe(
+        df.sort_values("MB", ascending=False).round(2),
+        hide_index=True,
+        column_config={"user": st.column_config.TextColumn()},
+    )
+
+
+def profiler() -> None:
+    """Arm the profiler for the next run of a page, show the results."""
+    st.header("Profiler")
+    with st.form("profiler"):
+        cols = st.columns(3)
+        sel_page = cols[0].selectbox("Page", options=list_report_pages().values())
+        sel_user = cols[1].number_input(
+            "User ID (0: anyone)", min_value=0, step=1, value=0
+        )
+        sel_mode = cols[2].radio("Mode", options=PROFILE_MODES, horizontal=True)
+        if st.form_submit_button("Profile next run"):
+            request_profile(str(sel_page), int(sel_user) or None, str(sel_mode))
+
+    state = get_profiler_state()
+    with state.lock:
+        requests = list(state.requests)
+        results = list(state.results)
+    if requests:
+        st.write("Pending:", [f"{r.page} ({r.user_id or 'anyone'})" for r in requests])
+        if st.button("Cancel pending"):
+            with state.lock:
+                state.requests.clear()
+            st.rerun()
+
+    for i, res in enumerate(results):
+        with st.expander(
+            f"{res.started:%Y-%m-%d %H:%M:%S} {res.page}, user {res.user_id}, "
+            f"{res.mode}, {res.duration_s:.1f}s"
+        ):
+            st.dataframe(res.top, hide_index=True)
+            stem = f"profile_{res.started:%Y%m%d_%H%M%S}"
+            if res.prof:
+                st.download_button(
+                    "Download pstats (.prof)",
+                    data=res.prof,
+                    file_name=f"{stem}.prof",
+                    key=f"prof_{i}",
+                )
+            if res.collapsed:
+                st.download_button(
+                    "Download collapsed stacks (flamegraph.pl, speedscope)",
+                    data=res.collapsed,
+                    file_name=f"{stem}.txt",
+                    key=f"collapsed_{i}",
+                )
+
 
 if __name__ == "__main__":
     main()
@@ -1,3 +1,4 @@
+import json
 import sys
 from math import isnan
 from pathlib import Path
@@ -8,12 +9,20 @@ from streamlit.testing.v1 import AppTest
 sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
 from helper import get_env
 from helper_activities_caching import (
+    ACTIVITY_PATCHES_TTL,
     cache_all_activities_and_gears,
     check_is_known_location,
     cities_into_1deg_geo_boxes,
     fetch_all_activities,
     geo_distance_haversine,
+    get_activities_cache_key,
+    get_activities_display_df,
+    get_activities_stats_df,
+    get_activity_patches,
+    get_display_col_names,
     get_known_locations,
+    patch_activities_commute,
+    patch_activities_new,
     read_city_db,
     reduce_geo_precision,
     search_closest_city,
@@ -89,3 +98,64 @@ def test_cache_all_activities_and_gears_2() -> None:
     assert df["x_mi"].iat[1] * 10 == 189, df["x_mi"].iat[1]
     # swim
     assert isnan(df["x_elev_%"].iat[2]) is True, df["x_elev_%"].iat[2]
+
+
+def test_get_display_col_names() -> None:
+    d = get_display_col_names(["x_km", "average_speed", "name", "x_gear_name"])
+    assert d == {
+        "x_km": "km",
+        "average_speed": "speed_av",
+        "name": "name",
+        "x_gear_name": "gear",
+    }
+
+
+def test_derived_views() -> None:
+    df = get_activities_stats_df()
+    assert "Hour-sum" in df.columns
+    # cached, so same object on next call
+    assert get_activities_stats_df() is df
+    # with the already loaded activities
+    assert get_activities_stats_df(cache_all_activities_and_gears()[0]) is df
+    df = get_activities_display_df()
+    assert "km" in df.columns
+    assert "x_km" not in df.columns
+
+
+def test_activity_patches() -> None:
+    user_id = st.session_state["USER_ID"]
+    df = cache_all_activities_and_gears()[0]
+    version = get_activities_cache_key()[2]
+    activity_id = df.index[0]
+    # a created activity, as returned by the API
+    new = json.loads(
+        (
+            Path(__file__).parent / "testdata/api-cache/activities-page-0-1.json"
+        ).read_text()
+    )[0]
+    new["id"] = 1
+    new["commute"] = False
+    new["gear"] = {"id": new["gear_id"], "name": "My Gear"}
+
+    patch_activities_commute(user_id, [activity_id])
+    patch_activities_new(user_id, [new])
+    df2 = cache_all_activities_and_gears()[0]
+    assert get_activities_cache_key()[2] == version + 2
+    assert df2.loc[activity_id, "commute"]
+    assert len(df2) == len(df) + 1
+    assert df2.loc[1, "x_gear_name"] == "My Gear"
+    assert df2.columns.tolist() == df.columns.tolist()
+    # applying again does not add it twice
+    assert len(cache_all_activities_and_gears()[0]) == len(df) + 1
+    # each write expires on its own
+    patches = get_activity_patches()[user_id]
+    patches.commute_ids[activity_id] -= ACTIVITY_PATCHES_TTL * 2
+    df3 = cache_all_activities_and_gears()[0]
+    assert df3.loc[activity_id, "commute"] == df.loc[activity_id, "commute"]
+    assert len(df3) == len(df) + 1
+    patches.new_activities[0] = (
+        patches.new_activities[0][0] - ACTIVITY_PATCHES_TTL * 2,
+        new,
+    )
+    assert len(cache_all_activities_and_gears()[0]) == len(df)
+    assert user_id not in get_activity_patches()
@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+from helper_activity_filter import (
+    build_filter_index,
+    filter_mask,
+    masked_min_max,
+    range_mask,
+)
+
+DF = pd.DataFrame(
+    {
+        "type": ["Run", "Ride", "Swim", "Run", "Ride"],
+        "x_year": [2022, 2023, 2023, 2024, 2024],
+        "x_min": [30.0, 90.0, 45.0, 60.0, 120.0],
+        "x_km": [5.0, 40.0, 2.0, 10.0, 60.0],
+        "total_elevation_gain": [50.0, 400.0, None, 100.0, 800.0],
+    },
+    index=[11, 12, 13, 14, 15],
+)
+FI = build_filter_index(DF, cache_key=(1, 0, 1))
+
+
+def test_range_mask() -> None:
+    assert range_mask(FI, "x_km", 10).tolist() == [False, True, False, False, True]
+    assert range_mask(FI, "x_km", 10, lower_inclusive=True).tolist() == [
+        False,
+        True,
+        False,
+        True,
+        True,
+    ]
+    assert range_mask(FI, "x_year", 2023, 2023, lower_inclusive=True).sum() == 2
+    # NaN is never matched
+    assert range_mask(FI, "total_elevation_gain", 0).sum() == 4
+
+
+def test_filter_mask() -> None:
+    mask = filter_mask(FI)
+    assert mask.all()
+    mask = filter_mask(FI, sel_type="Ride", sel_year=(2024, 2024))
+    assert DF.index[mask].tolist() == [15]
+    mask = filter_mask(FI, min_minutes=45, min_elev=100)
+    assert DF.index[mask].tolist() == [12, 15]
+    mask = filter_mask(FI, sel_type="Hike")
+    assert not mask.any()
+    # cached
+    assert filter_mask(FI, min_minutes=45, min_elev=100) is filter_mask(
+        FI, min_minutes=45, min_elev=100
+    )
+
+
+def test_masked_min_max() -> None:
+    mask = filter_mask(FI, sel_type="Run")
+    assert masked_min_max(FI, "x_km", mask) == (5.0, 10.0)
+    mask = filter_mask(FI, sel_type="Swim")
+    assert all(np.isnan(masked_min_max(FI, "total_elevation_gain", mask)))
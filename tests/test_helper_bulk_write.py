@@ -0,0 +1,98 @@
+import datetime as dt
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+import helper_bulk_write
+from helper_api import RateBudget, StravaRateLimitError
+from helper_bulk_write import bulk_write, results_df
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(helper_bulk_write, "BULK_RETRY_DELAY", 0)
+
+
+def test_bulk_write() -> None:
+    calls = []
+
+    def write(i: int) -> int:
+        calls.append(i)
+        if i == 2 and calls.count(2) == 1:
+            raise requests.ConnectionError
+        if i == 3:
+            msg = "bad request"
+            raise ValueError(msg)
+        return i * 10
+
+    progress = []
+    results = bulk_write(
+        {i: lambda i=i: write(i) for i in range(5)},
+        on_progress=lambda done, total: progress.append((done, total)),
+    )
+    assert [r.key for r in results] == [0, 1, 2, 3, 4]
+    assert [r.ok for r in results] == [True, True, True, False, True]
+    assert results[1].result == 10
+    # transient error retried, others not
+    assert results[2].attempts == 2
+    assert results[3].attempts == 1
+    assert results[3].error == "ValueError: bad request"
+    assert progress[-1] == (5, 5)
+    df = results_df(results)
+    assert df["OK"].tolist() == [True, True, True, False, True]
+
+
+def test_bulk_write_not_idempotent() -> None:
+    errors = {
+        0: requests.ConnectTimeout(),
+        1: requests.ConnectionError(
+            MaxRetryError(None, "/", NewConnectionError(None, "x"))
+        ),
+        2: requests.ReadTimeout(),
+        3: requests.ConnectionError(),
+    }
+    calls = []
+
+    def write(i: int) -> int:
+        calls.append(i)
+        if calls.count(i) == 1:
+            raise errors[i]
+        return i
+
+    results = bulk_write({i: lambda i=i: write(i) for i in errors}, idempotent=False)
+    # retried only if the request was not sent
+    assert [r.ok for r in results] == [True, True, False, False]
+    assert [r.attempts for r in results] == [2, 2, 1, 1]
+
+
+def test_bulk_write_rate_limit() -> None:
+    def write(i: int) -> int:
+        if i == 1:
+            raise StravaRateLimitError
+        return i
+
+    results = bulk_write({i: lambda i=i: write(i) for i in range(4)}, workers=1)
+    assert [r.ok for r in results] == [True, False, False, False]
+    assert results[1].rate_limited
+    # not submitted after hitting the rate limit
+    assert results[3].attempts == 0
+    assert "try again later" in results[3].error
+
+
+def test_rate_budget() -> None:
+    now = dt.datetime(2024, 1, 1, 10, 20, tzinfo=dt.UTC)
+    assert RateBudget().remaining(now) is None
+    budget = RateBudget(
+        limit=(200, 2000),
+        usage=(150, 1000),
+        updated=dt.datetime(2024, 1, 1, 10, 16, tzinfo=dt.UTC),
+    )
+    assert budget.remaining(now) == 50
+    # new 15-min window
+    assert budget.remaining(now + dt.timedelta(minutes=15)) == 200
+    budget.usage = (10, 1990)
+    assert budget.remaining(now) == 10
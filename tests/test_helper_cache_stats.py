@@ -0,0 +1,62 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+from helper_cache_stats import (
+    estimate_size,
+    get_cache_stats,
+    record_cache_access,
+    track_cache_usage,
+)
+
+
+def _dict_cache(func):
+    """Minimal stand-in of st.cache_data, without ttl."""
+    cache = {}
+
+    def cached(*args: object) -> object:
+        if args not in cache:
+            cache[args] = func(*args)
+        return cache[args]
+
+    cached.clear = cache.clear  # type: ignore[attr-defined]
+    return cached
+
+
+@track_cache_usage(_dict_cache)
+def _load(user_id: int, year: int, _df: object = None) -> pd.DataFrame:  # noqa: ARG001
+    return pd.DataFrame({"x": range(year)})
+
+
+def test_track_cache_usage() -> None:
+    _load(1, 10)
+    _load(1, 10)
+    _load(1, 20)
+    _load(2, 10)
+    _load.clear()  # type: ignore[attr-defined]
+    _load(1, 10)  # re-computed
+    df = get_cache_stats().set_index(["function", "user"])
+    s1 = df.loc[("_load", 1)]
+    assert s1["calls"] == 4
+    assert s1["hits"] == 1
+    assert s1["misses"] == 3
+    assert s1["evictions"] == 1
+    assert s1["size_bytes"] == estimate_size(pd.DataFrame({"x": range(10)}))
+    s2 = df.loc[("_load", 2)]
+    assert (s2["calls"], s2["misses"], s2["evictions"]) == (1, 1, 0)
+
+
+def test_record_cache_access() -> None:
+    record_cache_access("_store", 1, calls=5)
+    record_cache_access("_store", 1, calls=2, misses=2, compute_ns=10**9)
+    s = get_cache_stats().set_index(["function", "user"]).loc[("_store", 1)]
+    assert (s["calls"], s["hits"], s["misses"]) == (7, 5, 2)
+    assert s["compute_time"] == 1.0
+
+
+def test_estimate_size() -> None:
+    assert estimate_size("x" * 1000) > 1000
+    d = {"a": ["x" * 1000, "y" * 1000]}
+    assert estimate_size(d) > 2000
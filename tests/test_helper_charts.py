@@ -0,0 +1,32 @@
+import datetime as dt
+import sys
+from pathlib import Path
+
+import altair as alt
+import pandas as pd
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+from helper_charts import DATASET, base_chart, chart_data, chart_spec
+
+DF = pd.DataFrame(
+    {
+        "Month": ["2024-01", "2024-02"],
+        "date": [dt.date(2024, 1, 1), dt.date(2024, 2, 1)],
+        "Count": [3, 5],
+        "Hour-sum": [1.5, 2.5],
+    }
+)
+
+
+def test_chart_data() -> None:
+    df = chart_data(DF, ["date", "Count"])
+    assert df.columns.tolist() == ["date", "Count"]
+    assert df["date"].tolist() == [1704067200000, 1706745600000]
+
+
+def test_chart_spec() -> None:
+    c = base_chart().mark_bar().encode(x="utcyearmonth(date):T", y=alt.Y("Count:Q"))
+    spec = chart_spec(c, chart_data(DF, ["date", "Count"]))
+    assert spec["data"] == {"name": DATASET}
+    assert isinstance(spec["datasets"][DATASET], bytes)
+    assert "config" not in spec
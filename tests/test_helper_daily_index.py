@@ -0,0 +1,117 @@
+import datetime as dt
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+from helper_daily_index import (
+    active_days_per_year,
+    build_daily_index,
+    daily_values,
+    ewma,
+    rolling_sum,
+    sports_in_range,
+    streaks,
+    year_to_date,
+    year_to_date_at,
+)
+
+# stats DataFrame as from reduce_and_rename_activity_df_for_stats()
+DF = pd.DataFrame(
+    {
+        "date": [
+            dt.date(2023, 12, 30),
+            dt.date(2023, 12, 31),
+            dt.date(2024, 1, 1),
+            dt.date(2024, 1, 1),
+            dt.date(2024, 1, 5),
+            dt.date(2024, 1, 6),
+        ],
+        "type": ["Run", "Run", "Run", "Ride", "Swim", "Run"],
+        "Hour-sum": [1.0, 0.5, 1.0, 2.0, 0.5, 1.0],
+        "Kilometer-sum": [10.0, 5.0, 10.0, 50.0, 1.0, 10.0],
+        "Elevation-sum": [100.0, None, 50.0, 500.0, None, 0.0],
+    }
+)
+LAST_DAY = dt.date(2024, 1, 6)
+
+
+def test_build_daily_index() -> None:
+    idx = build_daily_index(DF, last_day=LAST_DAY)
+    # starts at Jan 1st
+    assert idx.first_day == dt.date(2023, 1, 1)
+    assert idx.sports == ("Run", "Ride", "Swim")
+    assert idx.data.shape == (365 + 6, 3, 4)
+    assert daily_values(idx, "Count").sum() == 6
+    assert daily_values(idx, "Minutes").sum() == 360
+    assert daily_values(idx, "Kilometer", ["Ride"]).sum() == 50
+    assert daily_values(idx, "Elevation", ["Run"]).sum() == 150
+
+
+def test_build_daily_index_till_today() -> None:
+    idx = build_daily_index(DF, last_day=dt.date(2024, 1, 10))
+    assert len(idx.days) == 365 + 10
+    assert idx.days[-1] == pd.Timestamp(2024, 1, 10)
+
+
+def test_active_days() -> None:
+    idx = build_daily_index(DF, last_day=LAST_DAY)
+    assert active_days_per_year(idx).to_dict() == {2023: 2, 2024: 3}
+    assert active_days_per_year(idx, sports=["Run"]).to_dict() == {2023: 2, 2024: 2}
+
+
+def test_streaks() -> None:
+    idx = build_daily_index(DF, last_day=LAST_DAY)
+    assert streaks(idx) == (2, 3)
+    assert streaks(idx, sports=["Ride"]) == (0, 1)
+    # today not active yet, streak continues from yesterday
+    idx = build_daily_index(DF, last_day=dt.date(2024, 1, 7))
+    assert streaks(idx) == (2, 3)
+    idx = build_daily_index(DF, last_day=dt.date(2024, 1, 8))
+    assert streaks(idx) == (0, 3)
+
+
+def test_rolling_sum_and_ewma() -> None:
+    idx = build_daily_index(DF, last_day=LAST_DAY)
+    s = rolling_sum(idx, "Kilometer", window=2)
+    assert s.tolist()[-8:] == [10, 15, 65, 60, 0, 0, 1, 11]
+    s = rolling_sum(idx, "Count", window=30)
+    assert s.iloc[-1] == 6
+    s = ewma(idx, "Minutes", span=3)
+    assert s.iloc[0] == 0
+    assert s[pd.Timestamp(2023, 12, 30)] == 30
+
+
+def test_sports_in_range() -> None:
+    idx = build_daily_index(DF, last_day=LAST_DAY)
+    assert sports_in_range(idx, dt.date(2023, 1, 1), dt.date(2023, 12, 31)) == ["Run"]
+    assert sports_in_range(idx, dt.date(2024, 1, 1), dt.date(2024, 12, 31)) == [
+        "Run",
+        "Ride",
+        "Swim",
+    ]
+
+
+def test_year_to_date() -> None:
+    idx = build_daily_index(DF, last_day=LAST_DAY)
+    df = year_to_date(idx)
+    assert df.columns.tolist() == [
+        "Count",
+        "Active Days",
+        "Hours",
+        "Kilometer",
+        "Elevation",
+    ]
+    assert df.loc[(2023, 365), "Kilometer"] == 15
+    assert df.loc[(2024, 1), "Count"] == 2
+    assert df.loc[(2024, 6), "Active Days"] == 3
+    # same day of year in all years
+    df2 = year_to_date_at(df, day_of_year=2)
+    assert df2["Count"].to_dict() == {2023: 0, 2024: 2}
+    # end of year, 2024 is till last day only
+    df2 = year_to_date_at(df, day_of_year=366)
+    assert df2["Count"].to_dict() == {2023: 2, 2024: 4}
+    assert df2["Hours"].to_dict() == {2023: 1.5, 2024: 4.5}
+    df2 = year_to_date_at(year_to_date(idx, sports=["Run"]), day_of_year=366)
+    assert df2["Kilometer"].to_dict() == {2023: 15, 2024: 20}
@@ -0,0 +1,102 @@
+import datetime as dt
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+import helper_descriptions
+from helper_api import StravaRateLimitError
+from helper_descriptions import (
+    DescriptionJob,
+    connect_descriptions_db,
+    load_descriptions,
+    next_rate_limit_reset,
+    run_description_job,
+    save_descriptions,
+    sweep_descriptions,
+)
+
+
+@pytest.fixture(autouse=True)
+def desc_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        helper_descriptions,
+        "get_act_desc_cache_file_path",
+        lambda user_id: tmp_path / f"{user_id}.json",
+    )
+    monkeypatch.setattr(
+        helper_descriptions, "get_act_desc_db_path", lambda: tmp_path / "desc.sqlite"
+    )
+
+
+def test_next_rate_limit_reset() -> None:
+    now = dt.datetime(2024, 1, 1, 10, 7, 30, tzinfo=dt.UTC)
+    assert next_rate_limit_reset(now) == dt.datetime(
+        2024, 1, 1, 10, 15, 5, tzinfo=dt.UTC
+    )
+
+
+def test_description_store(tmp_path: Path) -> None:
+    save_descriptions(1, {10: "a", 11: "b"})
+    save_descriptions(2, {10: "other user"})
+    save_descriptions(1, {11: "b2"})
+    assert load_descriptions(1) == {10: "a", 11: "b2"}
+    # expired ones are not loaded and swept
+    with connect_descriptions_db() as con:
+        con.execute("UPDATE descriptions SET fetched_at = 0 WHERE activity_id = 10")
+    assert load_descriptions(1) == {11: "b2"}
+    assert sweep_descriptions() == 2
+    assert load_descriptions(2) == {}
+    # migration of legacy JSON file
+    (tmp_path / "3.json").write_text(json.dumps({"20": "c"}))
+    assert load_descriptions(3) == {20: "c"}
+    assert not (tmp_path / "3.json").exists()
+
+
+def test_run_description_job() -> None:
+    job = DescriptionJob(1, "token", pending=list(range(25)))
+    run_description_job(job, fetch=lambda i, _: f"desc {i}")
+    assert job.status == "done"
+    assert job.pending == []
+    d = load_descriptions(1)
+    assert len(d) == 25
+    assert d[24] == "desc 24"
+
+
+def test_run_description_job_rate_limit_and_error() -> None:
+    calls = []
+    sleeps = []
+
+    def fetch(activity_id: int, token: str) -> str:
+        assert token == job.token
+        calls.append(activity_id)
+        if activity_id == 3 and calls.count(3) == 1:
+            raise StravaRateLimitError
+        if activity_id == 5:
+            msg = "not found"
+            raise ValueError(msg)
+        return f"desc {activity_id}"
+
+    job = DescriptionJob(2, "token", pending=list(range(10)))
+    run_description_job(job, fetch=fetch, sleep=sleeps.append)
+    assert job.status == "done"
+    assert len(sleeps) == 1
+    # resumed after rate limit
+    assert calls.count(3) == 2
+    assert job.failed == {5}
+    assert sorted(load_descriptions(2).keys()) == [0, 1, 2, 3, 4, 6, 7, 8, 9]
+
+
+def test_run_description_job_store_error(monkeypatch: pytest.MonkeyPatch) -> None:
+    def save(user_id: int, descriptions: dict[int, str]) -> None:  # noqa: ARG001
+        msg = "database is locked"
+        raise sqlite3.OperationalError(msg)
+
+    monkeypatch.setattr(helper_descriptions, "save_descriptions", save)
+    job = DescriptionJob(3, "token", pending=[1, 2])
+    run_description_job(job, fetch=lambda i, _: f"desc {i}")
+    assert job.status == "failed"
+    assert job.pending == [1, 2]
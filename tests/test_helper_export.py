@@ -0,0 +1,96 @@
+import datetime as dt
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+from helper_export import (
+    ExportCache,
+    csv_bytes,
+    df_fingerprint,
+    excel_bytes,
+    feather_bytes,
+    parquet_bytes,
+)
+
+DF = pd.DataFrame(
+    {
+        "name": ["Run 1", "Ride 1", None],
+        "km": [10.5, np.nan, 3],
+        "count": np.array([1, 2, 3], dtype=np.int64),
+        "date": pd.to_datetime(["2024-01-01 10:00", "2024-01-02 11:30", None]),
+        "day": [dt.date(2024, 1, 1), dt.date(2024, 1, 2), dt.date(2024, 1, 3)],
+        "latlng": [[49.5, 11.0], [], None],
+    },
+    index=[11, 12, 13],
+)
+
+
+def test_excel_bytes() -> None:
+    df = pd.read_excel(io.BytesIO(excel_bytes(DF, exclude_index=True)))
+    assert df.columns.tolist() == DF.columns.tolist()
+    assert df["name"].tolist()[:2] == ["Run 1", "Ride 1"]
+    assert df["km"].tolist()[0] == 10.5
+    assert np.isnan(df["km"].tolist()[1])
+    assert df["count"].tolist() == [1, 2, 3]
+    assert df["date"].tolist()[1] == pd.Timestamp("2024-01-02 11:30")
+    assert df["latlng"].tolist()[0] == "[49.5, 11.0]"
+
+
+def test_excel_bytes_with_index() -> None:
+    df = pd.read_excel(io.BytesIO(excel_bytes(DF, exclude_index=False)))
+    assert df.iloc[:, 0].tolist() == [11, 12, 13]
+
+
+def test_columnar_bytes() -> None:
+    for df in (
+        pd.read_parquet(io.BytesIO(parquet_bytes(DF))),
+        pd.read_feather(io.BytesIO(feather_bytes(DF))),
+    ):
+        assert df.columns.tolist() == DF.columns.tolist()
+        assert df["count"].tolist() == [1, 2, 3]
+        assert df["date"].tolist()[1] == pd.Timestamp("2024-01-02 11:30")
+        assert df["latlng"].tolist()[0].tolist() == [49.5, 11.0]
+    df = pd.read_csv(io.BytesIO(csv_bytes(DF)))
+    assert df.columns.tolist() == DF.columns.tolist()
+    assert df["name"].tolist()[:2] == ["Run 1", "Ride 1"]
+    assert df["latlng"].tolist()[0] == "[49.5, 11.0]"
+
+
+def test_mixed_types() -> None:
+    df = pd.DataFrame({"mixed": [1, "a", [2], None]})
+    assert pd.read_parquet(io.BytesIO(parquet_bytes(df)))["mixed"].tolist() == [
+        "1",
+        "a",
+        "[2]",
+        None,
+    ]
+
+
+def test_df_fingerprint() -> None:
+    assert df_fingerprint(DF) == df_fingerprint(DF.copy())
+    assert df_fingerprint(DF) != df_fingerprint(DF.iloc[:2])
+    assert df_fingerprint(DF) != df_fingerprint(DF[["name", "km"]])
+    df = DF.copy()
+    df.loc[13, "name"] = "Walk 1"
+    assert df_fingerprint(DF) != df_fingerprint(df)
+
+
+def test_export_cache() -> None:
+    calls = []
+
+    def job() -> bytes:
+        calls.append(1)
+        return b"x"
+
+    cache = ExportCache(ThreadPoolExecutor(max_workers=1), max_entries=2)
+    assert cache.submit("a", job).result() == b"x"
+    assert cache.submit("a", job).result() == b"x"
+    assert len(calls) == 1
+    cache.submit("b", job).result()
+    cache.submit("c", job).result()
+    assert list(cache.jobs.keys()) == ["b", "c"]
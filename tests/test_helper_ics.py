@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+from helper import get_env
+from helper_activities_caching import cache_all_activities_and_gears
+from helper_ics import (
+    ICS_VOLATILE_LINES,
+    gen_ics_events,
+    iter_ics,
+    parse_ics_events,
+    patch_ics_events,
+    write_ics_feed,
+)
+
+_ = get_env()
+st.session_state["USER_ID"] = 7656541
+
+
+def event(activity_id: int, summary: str, stamp: str = "20240101T000000Z") -> str:
+    return (
+        f"BEGIN:VEVENT\nUID:strava-id-{activity_id}\nDTSTAMP:{stamp}\n"
+        f"SUMMARY:{summary}\nEND:VEVENT\n"
+    )
+
+
+def test_parse_ics_events() -> None:
+    cont = "".join(iter_ics([event(1, "Run"), event(2, "Ride")]))
+    events = parse_ics_events(cont)
+    assert list(events.keys()) == [1, 2]
+    assert events[2] == event(2, "Ride")
+
+
+def test_patch_ics_events() -> None:
+    events = {1: event(1, "Run"), 2: event(2, "Ride")}
+    new_events = pd.Series(
+        {
+            # unchanged, only new time stamp
+            1: event(1, "Run", stamp="20250101T000000Z"),
+            # changed
+            2: event(2, "Ride 2", stamp="20250101T000000Z"),
+            # new
+            3: event(3, "Swim", stamp="20250101T000000Z"),
+        }
+    )
+    assert patch_ics_events(events, new_events) == 2
+    assert events[1] == event(1, "Run")
+    assert events[2] == event(2, "Ride 2", stamp="20250101T000000Z")
+    assert list(events.keys()) == [1, 2, 3]
+    assert patch_ics_events(events, new_events) == 0
+
+
+def test_write_ics_feed(tmp_path: Path) -> None:
+    p = tmp_path / "ics" / "feed.ics"
+    events = {1: event(1, "Run"), 2: event(2, "Ride")}
+    write_ics_feed(p, events)
+    assert parse_ics_events(p.read_text()) == events
+    # no temp files left
+    assert list(p.parent.iterdir()) == [p]
+
+
+def _stable_lines(cont: str) -> list[str]:
+    return [
+        line for line in cont.splitlines() if not line.startswith(ICS_VOLATILE_LINES)
+    ]
+
+
+def test_gen_ics_events_golden() -> None:
+    # activities.ics: output of the former row-by-row gen_ics() of r40
+    golden = (Path(__file__).parent / "testdata/activities.ics").read_text(
+        encoding="utf-8"
+    )
+    df = cache_all_activities_and_gears()[0]
+    cont = "".join(iter_ics(gen_ics_events(df)))
+    assert _stable_lines(cont) == _stable_lines(golden)
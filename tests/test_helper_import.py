@@ -0,0 +1,148 @@
+import datetime as dt
+import sys
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+from helper_import import (
+    IMPORT_COLS,
+    activity_params,
+    find_duplicates,
+    read_import_workbook,
+    validate_import,
+)
+
+DF_EXISTING = pd.DataFrame(
+    {
+        "type": ["Run", "Ride", "Run", "Swim"],
+        "start_date_local": pd.to_datetime(
+            [
+                "2024-01-01 10:00",
+                "2024-01-01 10:30",
+                "2024-01-02 08:00",
+                "2024-01-03 07:00",
+            ]
+        ),
+        "elapsed_time": [3600, 7200, 1800, 1800],
+    },
+    index=[11, 12, 13, 14],
+)
+
+
+def test_find_duplicates() -> None:
+    df = pd.DataFrame(
+        {
+            "Type": ["Run", "Run", "Ride", "Run", "Walk", "Ride", "Run"],
+            "Date": pd.to_datetime(
+                [
+                    "2024-01-01 10:00:30",  # exact
+                    "2024-01-01 10:45:00",  # overlap with 11
+                    "2024-01-01 09:00:00",  # overlap with 12 (end after 12 start)
+                    "2024-01-01 11:00:00",  # right after 11
+                    "2024-01-01 10:00:00",  # unknown type
+                    "2024-01-02 08:00:00",  # other type than 13
+                    None,
+                ]
+            ),
+            "Duration (s)": [3600, 600, 7200, 600, 600, 600, 600],
+        },
+        index=[0, 1, 2, 3, 4, 5, 6],
+    )
+    res = find_duplicates(DF_EXISTING, df["Type"], df["Date"], df["Duration (s)"])
+    assert res["Duplicate"].tolist() == ["exact", "overlap", "overlap", "", "", "", ""]
+    assert res["Existing"].tolist()[:3] == [11, 11, 12]
+    assert res["Existing"].isna().tolist()[3:] == [True] * 4
+
+
+def test_find_duplicates_long_interval() -> None:
+    # a short activity after a long one is still within the long one
+    df_existing = pd.DataFrame(
+        {
+            "type": ["Ride", "Ride"],
+            "start_date_local": pd.to_datetime(
+                ["2024-01-01 08:00", "2024-01-01 09:00"]
+            ),
+            "elapsed_time": [6 * 3600, 600],
+        },
+        index=[1, 2],
+    )
+    res = find_duplicates(
+        df_existing,
+        pd.Series(["Ride"]),
+        pd.Series(pd.to_datetime(["2024-01-01 12:00"])),
+        pd.Series([600]),
+    )
+    assert res["Duplicate"].tolist() == ["overlap"]
+    assert res["Existing"].tolist() == [1]
+
+
+def test_read_and_validate_import(tmp_path: Path) -> None:
+    header = [f"{c}*" if c in ("Type", "Name") else c for c in IMPORT_COLS]
+    rows = [
+        # valid, Excel date
+        ["Run", dt.datetime(2024, 1, 1, 10), 3600, 10000, "A", None, 1, 50, "g1"],  # noqa: DTZ001
+        # valid, date as text, empty optional values
+        ["Ride", "2024-01-02 08:00:00", "1800", None, "B", "desc", None, None],
+        [None] * 9,  # empty row
+        # invalid date, duration out of range, unknown gear
+        ["Run", "02.01.2024", 0, None, "C", None, 0, None, "g9"],
+        # missing name and type, text as number, commute invalid
+        [None, dt.datetime(2024, 1, 3), 60, "far", None, None, 2, None, None],  # noqa: DTZ001
+    ]
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(header)  # type: ignore[union-attr]
+    for row in rows:
+        ws.append(row)  # type: ignore[union-attr]
+    p = tmp_path / "import.xlsx"
+    wb.save(p)
+
+    raw = read_import_workbook(p)
+    assert raw.index.tolist() == [2, 3, 5, 6]
+    assert list(raw.columns) == list(IMPORT_COLS)
+
+    df, errors = validate_import(raw, gear_ids=["g1", "g2"])
+    assert list(df.columns) == list(IMPORT_COLS)
+    assert errors.loc[2] == ""
+    assert errors.loc[3] == ""
+    assert errors.loc[5] == (
+        "Date invalid, use 'YYYY-MM-DD HH:MM:SS'; "
+        "Duration (s) not in 1..604800; Gear ID unknown"
+    )
+    assert errors.loc[6] == (
+        "Type missing; Name missing; "
+        "Distance (m) is not a number; Commute must be 0 or 1"
+    )
+    assert df.loc[3, "Date"] == pd.Timestamp("2024-01-02 08:00")
+    assert df.loc[3, "Duration (s)"] == 1800
+
+    params = activity_params(df.loc[errors == ""])
+    assert params[2] == {
+        "act_type": "Run",
+        "name": "A",
+        "date": "2024-01-01 10:00:00",
+        "duration": 3600,
+        "distance": 10000.0,
+        "desc": None,
+        "commute": True,
+        "gear_id": "g1",
+        "elev_gain": 50,
+    }
+    assert params[3]["distance"] is None
+    assert params[3]["desc"] == "desc"
+    assert params[3]["commute"] is False
+
+
+def test_read_import_workbook_missing_cols(tmp_path: Path) -> None:
+    wb = openpyxl.Workbook()
+    wb.active.append(["Type", "Date"])  # type: ignore[union-attr]
+    p = tmp_path / "import.xlsx"
+    wb.save(p)
+    try:
+        read_import_workbook(p)
+    except ValueError as e:
+        assert "Duration (s)" in str(e)  # noqa: PT017
+    else:
+        raise AssertionError
@@ -0,0 +1,74 @@
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+import helper_logging
+from helper_logging import get_call_stats, track_function_usage
+from helper_metrics import get_latency_stats
+
+
+@track_function_usage
+def _tracked_fct(x: int) -> int:
+    return x + 1
+
+
+@track_function_usage(sample_every=10)
+def _sampled_fct(x: int) -> int:
+    return x * 2
+
+
+def test_track_function_usage_threads() -> None:
+    calls_before = get_call_stats().get("_tracked_fct", {"calls": 0})["calls"]
+    n_threads, n_calls = 8, 1000
+
+    def run() -> None:
+        for i in range(n_calls):
+            _tracked_fct(i)
+
+    threads = [threading.Thread(target=run) for _ in range(n_threads)]
+    for t in threads:
+        t.start()
+    # read while threads are running
+    get_call_stats()
+    for t in threads:
+        t.join()
+    stats = get_call_stats()["_tracked_fct"]
+    assert stats["calls"] == calls_before + n_threads * n_calls
+    assert stats["total_time"] > 0
+    # counters of finished threads are folded in
+    assert all(t.is_alive() for t, _ in helper_logging._thread_counters)  # noqa: SLF001
+
+
+def test_track_function_usage_sampling() -> None:
+    assert _sampled_fct(2) == 4
+    for i in range(99):
+        _sampled_fct(i)
+    stats = get_call_stats()["_sampled_fct"]
+    assert stats["calls"] == 100
+    assert stats["total_time"] > 0
+
+
+def test_track_function_usage_disabled(monkeypatch) -> None:
+    def fct() -> None:
+        pass
+
+    monkeypatch.setattr(helper_logging, "INSTRUMENTATION_ENABLED", False)
+    assert track_function_usage(fct) is fct
+    assert track_function_usage(sample_every=10)(fct) is fct
+
+
+def test_track_function_usage_latency() -> None:
+    @track_function_usage
+    def _plain_fct() -> None:
+        pass
+
+    @track_function_usage(latency=True)
+    def _latency_fct() -> None:
+        pass
+
+    _plain_fct()
+    _latency_fct()
+    stats = get_latency_stats("function", 300)
+    assert "_plain_fct" not in stats
+    assert stats["_latency_fct"]["count"] == 1
@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+import helper_memory
+from helper_cache_stats import record_cache_access
+from helper_memory import (
+    get_memory_attribution,
+    get_page_memory,
+    measure_page_memory,
+)
+
+
+def test_measure_page_memory(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(helper_memory, "TRACEMALLOC_FRACTION", 1.0)
+    with measure_page_memory("mem_page") as run:
+        data = [bytes(1000) for _ in range(10_000)]
+    del data
+    assert run.traced_peak is not None
+    assert run.traced_peak > 10_000_000
+
+    monkeypatch.setattr(helper_memory, "TRACEMALLOC_FRACTION", 0.0)
+    with measure_page_memory("mem_page") as run:
+        pass
+    assert run.traced_peak is None
+
+    m = get_page_memory().loc["mem_page"]
+    assert (m["runs"], m["traced_runs"]) == (2, 1)
+    assert m["traced_peak_max"] > 9  # MB
+
+
+def test_memory_attribution() -> None:
+    record_cache_access("_mem_test", 42, calls=1)
+    df = get_memory_attribution()
+    assert list(df.columns) == ["cache", "session_state", "total"]
+    assert 42 in df.index
@@ -0,0 +1,61 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+from helper_metrics import (
+    SLOT_S,
+    LatencyHistogram,
+    bucket_index,
+    bucket_upper_bound,
+    get_latency_stats,
+    measure_phase,
+    track_page_run,
+)
+
+
+def test_buckets() -> None:
+    assert bucket_index(0) == 0
+    assert bucket_index(31) == 31
+    for value in (32, 100, 1_000, 123_456, 10**9):
+        i = bucket_index(value)
+        assert bucket_upper_bound(i - 1) < value <= bucket_upper_bound(i)
+        # relative error of bucket <= 1/16
+        assert bucket_upper_bound(i) <= value * 17 / 16
+
+
+def test_histogram_percentiles_and_window() -> None:
+    hist = LatencyHistogram()
+    now = 1000.0 * SLOT_S
+    # 1..100 ms
+    for ms in range(1, 101):
+        hist.record(ms * 1_000_000, now=now)
+    d = hist.summary(300, now=now)
+    assert d["count"] == 100
+    assert 50 <= d["p50"] <= 53
+    assert 95 <= d["p95"] <= 100
+    assert d["max"] == 100
+    # 1 slow call 10 min later
+    hist.record(2_000_000_000, now=now + 600)
+    d = hist.summary(300, now=now + 600)
+    assert d["count"] == 1
+    assert d["p50"] == d["max"] == 2000
+    assert hist.summary(3600, now=now + 600)["count"] == 101
+
+
+def test_page_run_phases() -> None:
+    with track_page_run("test_page") as run:
+        with measure_phase("cache load"):
+            time.sleep(0.02)
+            with measure_phase("strava api"):
+                time.sleep(0.03)
+        time.sleep(0.01)
+    assert set(run.phases) == {"cache load", "strava api", "rendering"}
+    assert sum(run.phases.values()) == run.duration_ns
+    assert 0.02e9 <= run.phases["cache load"] < 0.03e9
+    assert run.phases["strava api"] >= 0.03e9
+    assert get_latency_stats("page", 300)["test_page"]["count"] == 1
+    assert get_latency_stats("phase", 300)["test_page: rendering"]["count"] == 1
+    # no-op outside of page runs
+    with measure_phase("cache load"):
+        pass
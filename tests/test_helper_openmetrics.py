@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+from helper_logging import track_function_usage
+from helper_metrics import get_histogram
+from helper_openmetrics import (
+    get_metrics_file_path,
+    prometheus_text,
+    write_metrics_file,
+)
+
+
+@track_function_usage(latency=True)
+def _api_get() -> None:
+    pass
+
+
+def test_prometheus_text() -> None:
+    _api_get()
+    get_histogram("page", 'page "x"').record(1_500_000_000)
+    text = prometheus_text()
+    lines = text.splitlines()
+    assert "# EOF" not in lines
+    assert "# TYPE strava_app_function_calls_total counter" in lines
+    assert "# TYPE strava_app_page_latency_seconds summary" in lines
+    assert any(
+        line.startswith('strava_app_function_calls_total{function="_api_get"} ')
+        for line in lines
+    )
+    assert any(
+        line.startswith('strava_app_api_calls_total{method="GET"} ') for line in lines
+    )
+    assert (
+        'strava_app_page_latency_seconds{page="page \\"x\\"",quantile="0.5"} 1.5'
+        in lines
+    )
+    # samples are "name{labels} value"
+    for line in lines:
+        if not line.startswith("#"):
+            float(line.rsplit(" ", 1)[1])
+
+
+def test_write_metrics_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    p = tmp_path / "metrics" / "app.prom"
+    monkeypatch.setenv("STRAVA_METRICS_FILE", str(p))
+    assert get_metrics_file_path() == p
+    write_metrics_file(p)
+    assert p.read_text().endswith("\n")
+    assert list(p.parent.iterdir()) == [p]
@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+from helper_pandas import paginate_df, reorder_cols
+
+DF = pd.DataFrame(
+    {"name": ["a", "b", "c", "d", "e"], "km": [5.0, None, 2.0, 10.0, 1.0]},
+    index=[11, 12, 13, 14, 15],
+)
+
+
+def test_reorder_cols() -> None:
+    df = reorder_cols(DF, ["km", "xyz"])
+    assert df.columns.tolist() == ["km", "name"]
+
+
+def test_paginate_df_original_order() -> None:
+    df = paginate_df(DF, ["name"], None, ascending=True, page=2, page_size=2)
+    assert df.index.tolist() == [13, 14]
+    assert df.columns.tolist() == ["name"]
+    df = paginate_df(DF, ["name"], None, ascending=True, page=3, page_size=2)
+    assert df.index.tolist() == [15]
+
+
+def test_paginate_df_sorted() -> None:
+    df = paginate_df(DF, ["name", "km"], "km", ascending=True, page=1, page_size=3)
+    assert df["name"].tolist() == ["e", "c", "a"]
+    # NaN last
+    df = paginate_df(DF, ["name", "km"], "km", ascending=False, page=2, page_size=3)
+    assert df["name"].tolist() == ["e", "b"]
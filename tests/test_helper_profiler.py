@@ -0,0 +1,55 @@
+import io
+import pstats
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+from helper_profiler import get_profiler_state, profile_page_run, request_profile
+
+
+def _busy_work() -> int:
+    end = time.perf_counter() + 0.1
+    n = 0
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+
+def _failing_work() -> None:
+    _busy_work()
+    _ = 1 / 0
+
+
+def test_profile_page_run(tmp_path: Path) -> None:
+    state = get_profiler_state()
+    request_profile("Page A", 1, "cProfile")
+    request_profile("Page A", None, "sampling")
+
+    # not requested for user 2
+    with profile_page_run("Page B", 2):
+        _busy_work()
+    assert not state.results
+
+    with profile_page_run("Page A", 1):
+        _busy_work()
+    res = state.results[0]
+    assert (res.page, res.user_id, res.mode) == ("Page A", 1, "cProfile")
+    assert "_busy_work" in " ".join(res.top["function"])
+    assert res.duration_s >= 0.1
+    # .prof is loadable by pstats
+    p = tmp_path / "profile.prof"
+    p.write_bytes(res.prof)
+    assert pstats.Stats(str(p)).total_calls > 0  # type: ignore[attr-defined]
+
+    # stored on exceptions as well, e.g. st.stop()
+    with pytest.raises(ZeroDivisionError), profile_page_run("Page A", 2):
+        _failing_work()
+    res = state.results[0]
+    assert res.mode == "sampling"
+    assert "test_helper_profiler:_failing_work" in res.top["function"].tolist()
+    line = io.StringIO(res.collapsed).readline()
+    assert line.rsplit(" ", 1)[1].strip().isdigit()
+    assert not state.requests
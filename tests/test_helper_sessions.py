@@ -0,0 +1,51 @@
+import datetime as dt
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+import helper_sessions
+from helper_sessions import (
+    RECLAIMED_KEY,
+    SESSION_IDLE_RECLAIM,
+    SessionEntry,
+    get_session_stats,
+    sweep_sessions,
+)
+
+
+class FakeState(dict):
+    """Like SafeSessionState: dict access plus filtered_state."""
+
+    @property
+    def filtered_state(self) -> dict:
+        return dict(self)
+
+
+def test_sweep_sessions() -> None:
+    now = dt.datetime.now(tz=dt.UTC)
+    df = pd.DataFrame({"a": range(200_000)})
+    active = FakeState(USER_ID=1, df=df)
+    idle = FakeState(USER_ID=2, df=df.copy(), years=[2025])
+    helper_sessions._sessions.clear()  # noqa: SLF001
+    helper_sessions._sessions["active"] = SessionEntry(1, now, active)  # noqa: SLF001
+    helper_sessions._sessions["idle"] = SessionEntry(  # noqa: SLF001
+        2, now - SESSION_IDLE_RECLAIM * 2, idle
+    )
+
+    released = sweep_sessions(now)
+    assert released >= df.memory_usage(deep=True).sum()
+    assert "df" in active
+    assert "df" not in idle
+    assert idle["years"] == [2025]
+    assert idle[RECLAIMED_KEY] == ["df"]
+    # nothing left to release
+    assert sweep_sessions(now) == 0
+
+    stats = get_session_stats(now).set_index("user")
+    assert stats.loc[1, "largest_key"] == "df"
+    assert stats.loc[1, "MB"] > 1
+    assert stats.loc[2, "MB"] < 1
+    assert stats.loc[2, "reclaimed_MB"] > 1
+    helper_sessions._sessions.clear()  # noqa: SLF001
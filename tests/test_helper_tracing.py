@@ -0,0 +1,55 @@
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, (Path(__file__).parent.parent / "src").as_posix())
+import helper_tracing
+from helper_metrics import measure_phase
+from helper_tracing import set_span_attrs, span, start_trace, traced
+
+
+def test_spans(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    p = tmp_path / "traces.jsonl"
+    logger = logging.getLogger("trace_test")
+    logger.propagate = False
+    handler = logging.FileHandler(p)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    monkeypatch.setattr(helper_tracing, "_TRACE_LOGGER", logger)
+
+    def api_call(i: int) -> int:
+        with measure_phase("strava api"):
+            set_span_attrs(status=200, bytes=i)
+        return i
+
+    with start_trace("page", 123) as trace_id:
+        with span("cache load"), ThreadPoolExecutor(2) as pool:
+            assert list(pool.map(traced(api_call), [1, 2])) == [1, 2]
+        with pytest.raises(ZeroDivisionError), span("failing"):
+            _ = 1 / 0
+    # outside of traces, nothing is written
+    with span("no trace") as s:
+        assert s is None
+    handler.close()
+
+    spans = [json.loads(line) for line in p.read_text().splitlines()]
+    assert [s["name"] for s in spans] == [
+        "strava api",
+        "strava api",
+        "cache load",
+        "failing",
+        "page",
+    ]
+    assert {s["trace_id"] for s in spans} == {trace_id}
+    assert {s["user_id"] for s in spans} == {123}
+    by_name = {s["name"]: s for s in spans}
+    root = by_name["page"]
+    assert root["parent_id"] is None
+    assert by_name["cache load"]["parent_id"] == root["span_id"]
+    assert by_name["strava api"]["parent_id"] == by_name["cache load"]["span_id"]
+    assert sorted(s.get("bytes", 0) for s in spans) == [0, 0, 0, 1, 2]
+    assert by_name["failing"]["error"] == "ZeroDivisionError"